@@ -1,9 +1,60 @@
+import aggregation
+import chardet
+import cli
+import csv
+import data_model
+import file_keys
+import datetime
+import glob
+import importlib.util
+import json
+import os
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
-from main import Repository
+from unittest import mock
+import git
+import git_metadata
+import instrumentation
+import main
+import pdf_cache
+import pdf_signature
+import project_table
+import sharding
+import synthetic_root
+import text_decoding
+import tree_walk
+import watcher
+from synthetic_root import build_pdf, PAGES, SIGNATURE
+from main import Repository, parse_readme
+from project_index import ProjectIndex
 
 class TestExtractFieldFromReadme(unittest.TestCase):
     def setUp(self):
-        self.repo = Repository('C:\\Users\\Pau\\Documents\\abpresclin\\')
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        synthetic_root.write_readme(tmp.name, [
+            ('- Codi:', '22011'), ('- Data inici:', '01/12/2022'),
+            ('- Sol·licitud:', 'SSPT_20240206B_PRISIB_Alfonso Leiva - còpia.pdf'), ('- Contacte:', ''),
+            ('- Nom:', 'JavierArranz'), ('- Correu:', 'fcsdfc@fdf.cs')],
+            status='Pendent validacions finals', encoding='windows-1252', newline='\r\n', title='abpresclin')
+        self.repo = Repository(tmp.name)
+
+    def test_check_for_file_runs_the_scan_plan(self):
+        open(os.path.join(self.repo.path, 'Data Model 22011.xlsx'), 'wb').close()
+        self.repo.check_for_file('Data Model')
+        self.repo.check_for_file('SSPT')
+        self.assertEqual({'Data Model': 'YES', 'SSPT': 'NO'}, self.repo.statuses)
+        with self.assertRaises(TypeError):
+            self.repo.check_for_file('SSPT*', 'SSPT Status')
+        with self.assertRaises(TypeError):
+            self.repo.check_for_file(r'SSPT_\d{8}.*\.pdf')
 
     def test_Status(self):
         expected_output = 'Pendent validacions finals'
@@ -44,5 +95,1069 @@ class TestExtractFieldFromReadme(unittest.TestCase):
         actual_output = self.repo.extract_field_from_readme('- Data inici:')
         self.assertEqual(expected_output, actual_output)
 
+
+class TestParseReadme(unittest.TestCase):
+    README = ("# Projecte\n\n### Status\nEn curs\n\n### Dades del projecte\n- Codi: PRISIB 22011\n"
+              "- Data inici:01/12/2022\n- Sol·licitud: SSPT_20240206_PRISIB.pdf\n- Contacte:\n\t- Nom: Pau\n"
+              "- Correu: pau@idisba.es\n\t- Dictamen CEIB:\n")
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write_readme(self, text, encoding='utf-8'):
+        with open(os.path.join(self.tmp.name, 'README.md'), 'w', encoding=encoding) as f:
+            f.write(text)
+
+    def test_indexes_all_fields(self):
+        self.write_readme(self.README)
+        record = parse_readme(self.tmp.name)
+        self.assertEqual('En curs', record.status)
+        self.assertEqual('PRISIB 22011', record.get('- Codi:'))
+        self.assertEqual('01/12/2022', record.get('- Data inici:'))
+        self.assertEqual('SSPT_20240206_PRISIB.pdf', record.get('- Sol·licitud:'))
+        self.assertEqual('Pau', record.get('\t- Nom:'))
+        self.assertEqual('', record.get('- Dictamen CEIB:'))
+        self.assertIsNone(record.get('- Pressupost:'))
+        self.assertEqual('', record.get('- Contacte:'))
+
+    def test_missing_readme(self):
+        record = parse_readme(self.tmp.name)
+        self.assertFalse(record.exists)
+        self.assertIsNone(record.get('- Codi:'))
+
+    def test_repository_parses_once(self):
+        self.write_readme(self.README)
+        repo = Repository(self.tmp.name)
+        self.assertEqual('PRISIB 22011', repo.extract_field_from_readme('- Codi:'))
+        os.remove(os.path.join(self.tmp.name, 'README.md'))
+        self.assertEqual('En curs', repo.extract_field_from_readme('### Status'))
+
+
+class TestTextDecoding(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        self.readmes = {}
+        for folder, encoding in (('PRISIB-1', 'utf-8'), ('PRISIB-2', 'windows-1252')):
+            os.makedirs(os.path.join(self.root, folder))
+            self.readmes[folder] = os.path.join(self.root, folder, 'README.md')
+            with open(self.readmes[folder], 'w', encoding=encoding) as f:
+                f.write("### Status\nEn curs\n\n- Sol·licitud: Sí, signada per l'investigació\n" * 20)
+
+    def test_utf8_first_then_bounded_detection(self):
+        text, encoding, raw = text_decoding.read_text(self.readmes['PRISIB-1'])
+        self.assertEqual('utf-8', encoding)
+        self.assertIn('Sol·licitud: Sí', text)
+        with mock.patch('chardet.detect', wraps=chardet.detect) as detect:
+            for _ in range(3):
+                text, encoding, raw = text_decoding.read_text(self.readmes['PRISIB-2'])
+                self.assertIn('Sol·licitud: Sí', text)
+            self.assertEqual(1, detect.call_count)
+            self.assertLessEqual(len(detect.call_args[0][0]), text_decoding.DETECT_PREFIX)
+        self.assertEqual('Sí', main.extract_field_from_readme(os.path.join(self.root, 'PRISIB-2'), '- Sol·licitud:')[:2])
+
+    def test_utf8_is_decoded_once(self):
+        decodes = []
+
+        class Raw(bytes):
+            def decode(self, *args):
+                decodes.append(args)
+                return super().decode(*args)
+
+        self.assertEqual(('Sol·licitud', 'utf-8'), text_decoding.decode_bytes(Raw('Sol·licitud'.encode())))
+        self.assertEqual(('Sí', 'utf-8-sig'), text_decoding.decode_bytes(Raw(b'\xef\xbb\xbf' + 'Sí'.encode())))
+        self.assertEqual(2, len(decodes))
+
+    def test_report_non_utf8_readmes(self):
+        readmes = main.report_non_utf8_readmes(self.root)
+        self.assertEqual([os.path.abspath(self.readmes['PRISIB-2'])], [path for path, encoding in readmes])
+
+
+class TestDocumentClassifier(unittest.TestCase):
+    def setUp(self):
+        self.plan = main.get_scan_plan()
+        self.classifier = self.plan.classifier
+
+    def test_dated_prefixes(self):
+        self.assertEqual(['SSPT'], self.classifier.classify('SSPT_20240206B_PRISIB_Alfonso Leiva - còpia.pdf'))
+        self.assertEqual(['PSPT'], self.classifier.classify('PSPT_20241231.pdf'))
+        self.assertEqual([], self.classifier.classify('SSPT_20241341.pdf'))
+        self.assertEqual([], self.classifier.classify('SSPT_sense_data.pdf'))
+        self.assertEqual([], self.classifier.classify('old_SSPT_20240206.pdf'))
+
+    def test_all_matches_at_once(self):
+        self.assertEqual(['SSPT', 'Dictamen_CEI'], self.classifier.classify('SSPT_20240206_Dictamen_CEI.pdf'))
+
+    def test_data_model_requires_codi(self):
+        self.assertEqual(['Data Model'], self.classifier.classify('Data Model 22011.xlsx', '22011'))
+        self.assertEqual([], self.classifier.classify('Data Model 22011.xlsx', '23001'))
+        self.assertEqual([], self.classifier.classify('Data Model 22011.xlsx'))
+
+    def test_classify_repo_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, 'docs', 'ceib'))
+            for name in ['docs/SSPT_20240206.pdf', 'docs/ceib/Dictamen_CEI_22011.pdf', 'Data Model 22011.xlsx', 'notes.txt']:
+                open(os.path.join(tmp, name), 'wb').close()
+            documents = {key: [] for key in self.classifier.keys}
+            for entry, keys in self.plan.matches(tmp, '22011'):
+                for key in keys:
+                    documents[key].append(entry.path)
+            self.assertEqual([os.path.join(tmp, 'docs', 'SSPT_20240206.pdf')], documents['SSPT'])
+            self.assertEqual([], documents['PSPT'])
+            self.assertEqual(1, len(documents['Dictamen_CEI']))
+            self.assertEqual(1, len(documents['Data Model']))
+
+    def test_readme_lines_are_the_fields_that_read_them(self):
+        # Written to the same lines parse_readme() reads, mangled middle dot included
+        self.assertTrue(self.plan.readme_lines['SSPT'].match('- Sol\u00c2\u00b7licitud: '))
+        self.assertTrue(self.plan.readme_lines['Dictamen_CEI'].match('\t- Dictamen CEIB:'))
+        self.assertNotIn('PSPT', main.get_scan_plan(('PSPT_X',)).readme_lines)
+
+    def test_plan_adds_a_column_per_rule_in_one_walk(self):
+        self.assertEqual(['SSPT', 'PSPT', 'CONV'], main.get_scan_plan(('SSPT', 'PSPT', 'CONV')).status_keys)
+        headers = main.record_headers(['SSPT', 'PSPT', 'CONV'])
+        self.assertEqual(headers.index('PSPT') + 1, headers.index('CONV'))
+        with tempfile.TemporaryDirectory() as tmp:
+            repo = os.path.join(tmp, '22011 Projecte')
+            os.makedirs(repo)
+            for name in ['README.md', 'CONV_20240301.pdf', 'SSPT_20240206.pdf']:
+                open(os.path.join(repo, name), 'wb').close()
+            with mock.patch('tree_walk.walk_tree', wraps=tree_walk.walk_tree) as walk:
+                record = main.scan_repo(tmp, '22011 Projecte', ['SSPT', 'PSPT', 'CONV'])
+            self.assertEqual(1, walk.call_count)
+            self.assertEqual({'SSPT': 'YES', 'PSPT': 'NO', 'CONV': 'YES'}, record.pdf_statuses)
+            self.assertEqual(len(headers), len(record.to_row(['SSPT', 'PSPT', 'CONV'])))
+
+
+
+class TestTreeWalk(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = self.tmp.name
+        for name in ['SSPT_20240101.pdf', '.git/objects/SSPT_20240102.pdf', 'node_modules/x/SSPT_20240103.pdf',
+                     'docs/SSPT_20240104.pdf', 'docs/raw/SSPT_20240105.pdf', 'docs/zz/SSPT_20240106.pdf']:
+            path = os.path.join(self.root, *name.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(synthetic_root.PDF_VARIANTS['unsigned'][0])
+
+    def names(self, **options):
+        return sorted(entry.name for dirpath, relpath, dirs, files in tree_walk.walk_tree(self.root, **options)
+                      for entry in files)
+
+    def test_prunes_git_and_excludes(self):
+        self.assertEqual(['SSPT_20240101.pdf', 'SSPT_20240104.pdf', 'SSPT_20240105.pdf', 'SSPT_20240106.pdf'],
+                         self.names())
+        self.assertEqual(['SSPT_20240101.pdf', 'SSPT_20240103.pdf', 'SSPT_20240104.pdf', 'SSPT_20240106.pdf'],
+                         self.names(exclude=['docs/raw']))
+
+    def test_max_depth(self):
+        self.assertEqual(['SSPT_20240101.pdf'], self.names(max_depth=0))
+        self.assertEqual(['SSPT_20240101.pdf', 'SSPT_20240104.pdf'], self.names(max_depth=1))
+
+    def test_signed_file_ends_the_search(self):
+        with open(os.path.join(self.root, 'docs', 'raw', 'SSPT_20240105.pdf'), 'wb') as f:
+            f.write(synthetic_root.PDF_VARIANTS['signed'][0])
+        with mock.patch('main.is_pdf_signed', wraps=main.is_pdf_signed) as is_pdf_signed:
+            documents = main.get_scan_plan().run(self.root, None, keys=['SSPT'])
+        self.assertEqual(('SIGNED', os.path.join(self.root, 'docs', 'raw', 'SSPT_20240105.pdf')), documents['SSPT'])
+        # SSPT_20240101 and 20240104 are checked before it, docs/zz is never reached
+        self.assertEqual(3, is_pdf_signed.call_count)
+        self.assertEqual(('NO', None), documents['PSPT'])
+        unsigned = main.get_scan_plan().run(self.root, None, keys=['SSPT'], max_depth=1)
+        self.assertEqual(('YES', os.path.join(self.root, 'SSPT_20240101.pdf')), unsigned['SSPT'])
+
+
+class TestParallelScan(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = os.path.join(self.tmp.name, 'root')
+        for i in range(12):
+            folder = os.path.join(self.root, f'PRISIB-{i:05d}')
+            os.makedirs(folder)
+            with open(os.path.join(folder, 'README.md'), 'w', encoding='utf-8') as f:
+                f.write(f"### Status\nEn curs {i}\n\n- Codi: PRISIB {i:05d}\n- Data Model: \n")
+            open(os.path.join(folder, f'Data Model {i:05d}.xlsx'), 'wb').close()
+        open(os.path.join(self.root, 'loose_file.txt'), 'wb').close()
+
+    def read_csv(self, csv_file):
+        with open(csv_file, encoding='utf-8') as f:
+            return f.read()
+
+    def test_pool_output_matches_sequential(self):
+        sequential = os.path.join(self.tmp.name, 'sequential.csv')
+        main.scan_repos_and_create_csv_no_write(self.root, sequential)
+        expected = self.read_csv(sequential)
+        self.assertEqual(13, len(expected.splitlines()))
+        self.assertIn('PRISIB-00000,00000,En curs 0', expected.splitlines()[1])
+        for executor in ('thread', 'process'):
+            parallel = os.path.join(self.tmp.name, f'{executor}.csv')
+            main.scan_repos_and_create_csv_no_write(self.root, parallel, workers=3, executor=executor)
+            self.assertEqual(expected, self.read_csv(parallel))
+
+    def test_cache_rescans_only_changed_folders(self):
+        csv_file = os.path.join(self.tmp.name, 'out.csv')
+        cache_file = os.path.join(self.tmp.name, 'scan-cache.json')
+        main.scan_repos_and_create_csv_no_write(self.root, csv_file, cache_file=cache_file)
+        expected = self.read_csv(csv_file)
+        with mock.patch('main.scan_repo', wraps=main.scan_repo) as scan_repo:
+            main.scan_repos_and_create_csv_no_write(self.root, csv_file, cache_file=cache_file)
+            self.assertEqual(0, scan_repo.call_count)
+            self.assertEqual(expected, self.read_csv(csv_file))
+            os.remove(os.path.join(self.root, 'PRISIB-00003', 'Data Model 00003.xlsx'))
+            main.scan_repos_and_create_csv_no_write(self.root, csv_file, cache_file=cache_file)
+            self.assertEqual(1, scan_repo.call_count)
+            self.assertIn('PRISIB-00003,00003,En curs 3,,,,,,,NO,NO,NO,NO', self.read_csv(csv_file))
+            main.scan_repos_and_create_csv_no_write(self.root, csv_file, cache_file=cache_file, full_rescan=True)
+            self.assertEqual(13, scan_repo.call_count)
+
+    def test_export_to_several_formats_in_one_pass(self):
+        extensions = ['.csv', '.jsonl'] + [extension for extension, module in (('.xlsx', 'xlsxwriter'), ('.parquet', 'pyarrow'))
+                                           if importlib.util.find_spec(module)]
+        outputs = [os.path.join(self.tmp.name, 'out' + extension) for extension in extensions]
+        with mock.patch('main.scan_repo', wraps=main.scan_repo) as scan_repo:
+            self.assertEqual(12, main.export_project_records(self.root, outputs))
+            # The loose file at the root is never handed to a scan
+            self.assertEqual(12, scan_repo.call_count)
+        headers, rows = main.read_csv_rows(outputs[0])
+        self.assertEqual(main.record_headers(), headers)
+        with open(outputs[1], encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(rows[5][headers.index('Status')], records[5]['Status'])
+        self.assertEqual('YES', records[5]['Data Model'])
+        self.assertEqual('NO', records[5]['SSPT'])
+
+
+    def test_progress_and_cancel_between_folders(self):
+        cancel = threading.Event()
+        steps = []
+
+        def progress(done, total, folder):
+            steps.append((done, total, folder))
+            if done == 3:
+                cancel.set()
+
+        cache_file = os.path.join(self.tmp.name, 'scan-cache.json')
+        main.scan_repos_and_create_csv_no_write(self.root, os.path.join(self.tmp.name, 'full.csv'), cache_file=cache_file)
+        csv_file = os.path.join(self.tmp.name, 'out.csv')
+        self.assertEqual(3, main.scan_repos_and_create_csv_no_write(self.root, csv_file, cache_file=cache_file,
+                                                                    progress=progress, cancel=cancel))
+        self.assertEqual([(1, 12, 'PRISIB-00000'), (2, 12, 'PRISIB-00001'), (3, 12, 'PRISIB-00002')], steps)
+        self.assertEqual(4, len(self.read_csv(csv_file).splitlines()))
+        with open(cache_file, encoding='utf-8') as f:
+            self.assertEqual(12, len(json.load(f)['folders']))
+
+
+
+class TestSharding(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = os.path.join(self.tmp.name, 'root')
+        synthetic_root.build_synthetic_root(self.root, 9, seed=3, git_every=0)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_shards_merge_into_the_full_scan(self):
+        self.assertEqual(sharding.shard_of('PRISIB-22001', 4), sharding.shard_of('PRISIB-22001', 4))
+        self.assertEqual((2, 3), sharding.parse_shard('2/3'))
+        self.assertRaises(ValueError, sharding.parse_shard, '4/3')
+        main.scan_repos_and_create_csv_no_write(self.root, self.path('full.csv'))
+        partials = [self.path(f'part-{k}.csv') for k in (1, 2, 3)]
+        counts = [main.scan_repos_and_create_csv_no_write(self.root, partial, shard=(k, 3))
+                  for k, partial in enumerate(partials, 1)]
+        self.assertEqual(9, sum(counts))
+        self.assertEqual(counts[1], sharding.read_manifest(partials[1])['rows'])
+        # A repeated shard only adds duplicates
+        report = sharding.merge_partials(partials + [partials[0]], self.path('merged.csv'))
+        self.assertTrue(report.clean, report.lines())
+        self.assertEqual((9, counts[0]), (report.rows, report.duplicates))
+        with open(self.path('full.csv'), encoding='utf-8') as full, open(self.path('merged.csv'), encoding='utf-8') as merged:
+            self.assertEqual(full.read(), merged.read())
+
+    def test_append_is_refused_for_a_shard(self):
+        for scan in (main.scan_repos_and_create_csv, main.scan_repos_and_create_csv_no_write):
+            with self.subTest(scan.__name__):
+                with self.assertRaises(ValueError):
+                    scan(self.root, self.path('part-1.csv'), append_to_csv=True, shard=(1, 2))
+                self.assertFalse(os.path.exists(self.path('part-1.csv')))
+
+    def test_conflicts_and_missing_shards_are_reported(self):
+        partials = [self.path('part-1.csv'), self.path('part-1-again.csv')]
+        for partial in partials:
+            main.scan_repos_and_create_csv_no_write(self.root, partial, shard=(1, 2))
+        headers, rows = main.read_csv_rows(partials[0])
+        with open(partials[0], 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows([headers, [rows[0][0], 'changed'] + rows[0][2:]] + rows[1:])
+        output = self.path('merged.csv')
+        self.assertEqual(cli.EXIT_FAILURE, cli.run(['merge', output] + partials))
+        report = sharding.merge_partials(partials, output)
+        self.assertEqual([rows[0][0]], list(report.conflicts))
+        self.assertEqual([2], report.missing_shards)
+        self.assertEqual(len(rows), len(main.read_csv_rows(output)[1]))
+
+    def test_newest_partial_wins_across_utc_offsets(self):
+        partials = [self.path('part-1.csv'), self.path('part-1-again.csv')]
+        for partial in partials:
+            main.scan_repos_and_create_csv_no_write(self.root, partial, shard=(1, 2))
+        headers, rows = main.read_csv_rows(partials[0])
+        with open(partials[0], 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows([headers, [rows[0][0], 'newer'] + rows[0][2:]] + rows[1:])
+        # 09:00 UTC sorts before 10:00+02:00 (08:00 UTC) as a string
+        for partial, finished in zip(partials, ('2024-01-01T09:00:00+00:00', '2024-01-01T10:00:00+02:00')):
+            manifest = sharding.read_manifest(partial)
+            manifest['finished'] = finished
+            with open(sharding.manifest_path(partial), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+        sharding.merge_partials(partials, self.path('merged.csv'))
+        self.assertEqual('newer', main.read_csv_rows(self.path('merged.csv'))[1][0][1])
+
+
+class TestWatchMode(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = os.path.join(self.tmp.name, 'root')
+        for i in range(3):
+            self.write_readme(f'PRISIB-{i:05d}', 'En curs')
+
+    def write_readme(self, folder, status):
+        os.makedirs(os.path.join(self.root, folder), exist_ok=True)
+        with open(os.path.join(self.root, folder, 'README.md'), 'w', encoding='utf-8') as f:
+            f.write(f"### Status\n{status}\n\n- Codi: {folder}\n")
+
+    def test_folder_for_event(self):
+        self.assertEqual('PRISIB-00001', watcher.folder_for_event(self.root, os.path.join(self.root, 'PRISIB-00001', 'docs', 'SSPT.pdf')))
+        self.assertEqual('PRISIB-00001', watcher.folder_for_event(self.root, os.path.join(self.root, 'PRISIB-00001', '.git', 'refs', 'heads', 'main')))
+        self.assertIsNone(watcher.folder_for_event(self.root, os.path.join(self.root, 'PRISIB-00001', '.git', 'objects', 'ab', 'cdef')))
+        self.assertIsNone(watcher.folder_for_event(self.root, os.path.join(self.root, 'PRISIB-00001', '.README.md.x1.tmp')))
+        self.assertIsNone(watcher.folder_for_event(self.root, self.tmp.name))
+
+    def test_polling_watch_rescans_only_changed_folders(self):
+        for output in ('projectes.csv', 'projectes.sqlite'):
+            with self.subTest(output=output):
+                output = os.path.join(self.tmp.name, output)
+                stop = threading.Event()
+                updates = []
+                updated = threading.Event()
+
+                def on_update(folders):
+                    updates.extend(folders)
+                    if {'PRISIB-00001', 'PRISIB-00003'} <= set(updates):
+                        updated.set()
+
+                thread = threading.Thread(target=watcher.watch, args=(self.root, output),
+                                          kwargs=dict(polling=True, interval=0.05, debounce=0.1, stop=stop,
+                                                      on_update=on_update))
+                thread.start()
+                try:
+                    for _ in range(100):
+                        if os.path.exists(output) and len(main.read_csv_rows(output)[1]) == len(os.listdir(self.root)):
+                            break
+                        time.sleep(0.05)
+                    time.sleep(0.1)
+                    self.write_readme('PRISIB-00001', 'Tancat ' + output[-3:])
+                    self.write_readme('PRISIB-00003', 'Nou')
+                    self.assertTrue(updated.wait(10))
+                finally:
+                    stop.set()
+                    thread.join()
+                # Bursts are debounced into few rescans, each folder rescanned once
+                self.assertEqual(['PRISIB-00001', 'PRISIB-00003'], sorted(updates))
+                headers, rows = main.read_csv_rows(output)
+                self.assertEqual(['En curs', 'Tancat ' + output[-3:], 'En curs', 'Nou'], [row[2] for row in rows])
+
+
+    def test_polling_keeps_fingerprints_it_cannot_read(self):
+        events = queue.Queue()
+        polling = watcher.PollingWatcher(self.root, events, interval=0.01)
+        before = dict(polling.fingerprints)
+        fingerprint = main.repo_fingerprint
+
+        def flaky(path, *args, **kwargs):
+            if path.endswith('PRISIB-00001'):
+                raise OSError('network share dropped out')
+            return fingerprint(path, *args, **kwargs)
+
+        self.write_readme('PRISIB-00002', 'Tancat')
+        with mock.patch('main.repo_fingerprint', side_effect=flaky):
+            self.assertEqual(before['PRISIB-00001'], polling._fingerprints()['PRISIB-00001'])
+            with mock.patch('main.list_project_folders', side_effect=OSError('gone')):
+                self.assertEqual(before, polling._fingerprints())
+            polling.start()
+            try:
+                self.assertEqual('PRISIB-00002', events.get(timeout=5))
+            finally:
+                polling.stop()
+        self.assertTrue(events.empty())
+
+    def test_live_index_keeps_copies_and_follows_renames(self):
+        output = os.path.join(self.tmp.name, 'projectes.sqlite')
+        live = watcher.LiveOutput(output, main.record_headers(), self.root)
+        row = lambda folder: main.scan_folder(self.root, folder).to_row(main.DEFAULT_PDF_PREFIXES)
+        live.replace_all({folder: row(folder) for folder in os.listdir(self.root)})
+        shutil.copytree(os.path.join(self.root, 'PRISIB-00001'), os.path.join(self.root, 'Copia PRISIB-00001'))
+        live.update({'Copia PRISIB-00001': row('Copia PRISIB-00001')})
+        with ProjectIndex(output) as index:
+            self.assertEqual(['Copia PRISIB-00001', 'PRISIB-00001'], index.find('Codi', index.get('PRISIB-00001')['Codi']))
+            first_scanned = index.conn.execute(
+                "SELECT first_scanned_at FROM projects WHERE folder = 'PRISIB-00002'").fetchone()
+        os.rename(os.path.join(self.root, 'PRISIB-00002'), os.path.join(self.root, 'PRISIB-00002 tancat'))
+        live.update({'PRISIB-00002': None, 'PRISIB-00002 tancat': row('PRISIB-00002 tancat')})
+        with ProjectIndex(output) as index:
+            self.assertEqual(['PRISIB-00002 tancat'], index.find('Codi', index.get('PRISIB-00002 tancat')['Codi']))
+            self.assertEqual(first_scanned, index.conn.execute(
+                "SELECT first_scanned_at FROM projects WHERE folder = 'PRISIB-00002 tancat'").fetchone())
+
+
+class TestProjectTable(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.csv_file = os.path.join(tmp.name, 'projectes.csv')
+        with open(self.csv_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Folder Name', 'Codi', 'Status'])
+            writer.writerows([['PRISIB-3', '3', 'Tancat'], ['PRISIB-1', '1', 'En curs'], ['PRISIB-2', '2', 'en curs'],
+                              ['PRISIB-4', '4']])
+
+    def test_sort_filter_and_window_run_on_the_store(self):
+        table = project_table.ProjectTable()
+        table.load(self.csv_file)
+        self.assertEqual(('PRISIB-4', '4', ''), table.rows[3])
+        table.sort('Folder Name')
+        self.assertEqual([1, 2, 0, 3], table.view)
+        table.sort('Folder Name')
+        self.assertEqual([3, 0, 2, 1], table.view)
+        table.filter('EN CURS')
+        self.assertEqual([2, 1], table.view)
+        self.assertEqual([(1, ('PRISIB-1', '1', 'En curs'))], table.window(1, 10))
+        table.set(1, 'Status', 'Tancat')
+        self.assertEqual('Tancat', table.get(1, 'Status'))
+        self.assertIs(table.rows[0][2], table.rows[1][2])
+
+    def test_reload_replaces_rows(self):
+        table = project_table.ProjectTable()
+        table.load(self.csv_file)
+        table.filter('Tancat')
+        table.load(self.csv_file)
+        self.assertEqual(4, len(table.rows))
+        self.assertEqual(4, len(table))
+
+
+    def test_save_writes_only_journalled_edits(self):
+        root = os.path.dirname(self.csv_file)
+        for folder in ('PRISIB-1', 'PRISIB-2'):
+            os.makedirs(os.path.join(root, folder))
+            with open(os.path.join(root, folder, 'README.md'), 'w', encoding='utf-8') as f:
+                f.write("# Projecte\n\n### Status\nEn curs\n")
+        table = project_table.ProjectTable()
+        table.load(self.csv_file)
+        self.assertEqual((0, 0), table.save(root))
+        table.set(1, 'Codi', '11')
+        table.set(1, 'Codi', '1')
+        self.assertEqual({}, table.edits)
+        table.set(1, 'Status', 'Tancat')
+        table.set(0, 'Codi', '33')
+        with mock.patch('main.write_status_to_readme', wraps=main.write_status_to_readme) as write_status:
+            self.assertEqual((2, 1), table.save(root))
+            write_status.assert_called_once_with(root, 'PRISIB-1', 'Tancat')
+        self.assertEqual('Tancat', main.extract_status_from_readme(os.path.join(root, 'PRISIB-1')))
+        self.assertEqual(['PRISIB-3', '33', 'Tancat'], main.read_csv_rows(self.csv_file)[1][0])
+        self.assertEqual({}, table.edits)
+
+
+class TestSyntheticRoot(unittest.TestCase):
+    def test_generated_root_covers_the_scan_cases(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = os.path.join(tmp.name, 'root')
+        folders = synthetic_root.build_synthetic_root(root, 12, seed=3, max_depth=3)
+        self.assertEqual(12, len(folders))
+        output = os.path.join(tmp.name, 'projectes.jsonl')
+        self.assertEqual(12, main.export_project_records(root, [output]))
+        with open(output, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        statuses = {record[column] for record in records for column in ('SSPT', 'PSPT', 'Dictamen_CEI')}
+        self.assertEqual({'NO', 'YES', 'SIGNED'}, statuses)
+        self.assertEqual(6, sum(record['Last Commit Date'] == '2024-02-06' for record in records))
+        self.assertEqual('22000', records[0]['Codi'])
+        other = os.path.join(tmp.name, 'other')
+        synthetic_root.build_synthetic_root(other, 12, seed=3, git_every=0, max_depth=3)
+        listing = lambda path: sorted(os.path.relpath(os.path.join(d, f), path) for d, _, files in os.walk(path)
+                                      for f in files if '.git' not in d.split(os.sep))
+        self.assertEqual(listing(root), listing(other))
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_stages_are_recorded_per_repository(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = os.path.join(tmp.name, 'root')
+        synthetic_root.build_synthetic_root(root, 6, seed=1)
+        log_path = os.path.join(tmp.name, 'scan-log.jsonl')
+        profile_path = os.path.join(tmp.name, 'scan.prof')
+        with instrumentation.ScanRecorder(log_path, profile_path) as recorder:
+            main.scan_repos_and_create_csv_no_write(root, os.path.join(tmp.name, 'out.csv'), workers=3)
+        self.assertFalse(instrumentation.active())
+        summary = recorder.summary(top=2)
+        self.assertEqual(6, summary['repos'])
+        self.assertEqual({'readme', 'walk', 'pdf', 'git'}, set(summary['stages']))
+        self.assertGreater(summary['stages']['walk']['files'], 6 * 5)
+        self.assertGreater(summary['stages']['pdf']['bytes_read'], 0)
+        self.assertLessEqual(summary['stages']['pdf']['p50'], summary['stages']['pdf']['p95'])
+        # Nested stages ('pdf' inside 'walk') are not counted twice
+        for repo in recorder.repos:
+            self.assertLessEqual(sum(stats['seconds'] for stats in repo.stages.values()), repo.wall)
+        self.assertEqual(2, len(summary['slowest']))
+        self.assertIn('Slowest repositories:', recorder.format_summary())
+        with open(log_path, encoding='utf-8') as f:
+            events = [json.loads(line)['event'] for line in f]
+        self.assertEqual(['repo'] * 6 + ['summary'], events)
+        self.assertTrue(os.path.getsize(profile_path))
+
+    def test_disabled_hooks_are_shared_no_ops(self):
+        self.assertIs(instrumentation.stage('readme'), instrumentation.stage('git'))
+        instrumentation.count(bytes_read=10, files=1)
+
+
+class TestAggregation(unittest.TestCase):
+    HEADERS = ['Folder Name', 'Status', 'Data Inici', 'Last Commit Date', 'SSPT', 'PSPT', 'Dictamen_CEI', 'data_model']
+    ROWS = [['a', 'En curs', '15/04/2024', '2026-10-01', 'SIGNED', 'NO', 'YES', 'a.xlsx'],
+            ['b', 'Tancat', '2023-01-02', '', 'NO', 'NO', 'NO', ''],
+            ['c', '', '1-2-23', '', 'YES', 'NO', 'NO', ''],
+            ['d', 'En curs', '31/02/2024', '2025-01-01', 'NO', 'YES', 'NO'],
+            ['e', 'En curs', 'aviat', '', 'NO', 'YES', 'NO', '']]
+
+    def test_mixed_dates_are_parsed_in_bulk(self):
+        table = aggregation.load_table(['Data Inici'], [['15/04/2024'], [' 2024-04-15 '], ['20240415'], ['15-4-24'],
+                                                        ['31/02/2024'], [''], ['abril']])
+        dates = aggregation.parse_dates(table.column('Data Inici')).to_pylist()
+        self.assertEqual([datetime.date(2024, 4, 15)] * 4 + [None] * 3, dates)
+
+    def test_breakdowns_and_stale_projects(self):
+        summary = aggregation.summarize(self.HEADERS, self.ROWS, today=datetime.date(2026, 10, 18), stale_days=180)
+        self.assertEqual(5, summary.projects)
+        self.assertEqual({'En curs': 3, '': 1, 'Tancat': 1}, summary.by_status)
+        self.assertEqual(['SSPT', 'PSPT', 'Dictamen_CEI'], list(summary.by_document))
+        self.assertEqual({'NO': 3, 'YES': 1, 'SIGNED': 1}, summary.by_document['SSPT'])
+        self.assertEqual({'0-30': 1, '31-90': 0, '91-180': 0, '181-365': 0, '>365': 1, 'unknown': 3},
+                         summary.by_commit_age)
+        self.assertEqual(['d', 'e'], summary.unparsed_start_dates)
+        # b is closed, e has no date; c falls back to its Data inici
+        self.assertEqual([['c', None, '2023-02-01', 1355], ['d', 'En curs', '2025-01-01', 655]], summary.stale)
+
+    def test_summary_next_to_the_scan_output(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = os.path.join(tmp, 'root')
+            synthetic_root.build_synthetic_root(root, 6, seed=3)
+            csv_file = os.path.join(tmp, 'projectes.csv')
+            summary_file = os.path.join(tmp, 'projectes.summary.json')
+            self.assertEqual(cli.EXIT_OK, cli.run(['scan', root, csv_file, summary_file]))
+            with open(summary_file, encoding='utf-8') as f:
+                emitted = json.load(f)
+            self.assertEqual(aggregation.summarize_file(csv_file).to_dict(), emitted)
+            self.assertEqual(6, emitted['projects'])
+            self.assertEqual(cli.EXIT_OK, cli.run(['summary', csv_file, '--stale-days', '30']))
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = os.path.join(self.tmp.name, 'root')
+        synthetic_root.build_synthetic_root(self.root, 4, seed=2)
+
+    def test_scan_export_and_write_back(self):
+        csv_file = os.path.join(self.tmp.name, 'projectes.csv')
+        index = os.path.join(self.tmp.name, 'projectes.sqlite')
+        self.assertEqual(cli.EXIT_OK, cli.run(['scan', self.root, csv_file, index, '--workers', '2']))
+        jsonl = os.path.join(self.tmp.name, 'projectes.jsonl')
+        self.assertEqual(cli.EXIT_OK, cli.run(['export', index, jsonl]))
+        with open(jsonl, encoding='utf-8') as f:
+            self.assertEqual(4, len(f.readlines()))
+        self.assertEqual(cli.EXIT_OK, cli.run(['write-back', self.root, csv_file]))
+        self.assertEqual(cli.EXIT_NOT_FOUND, cli.run(['scan', os.path.join(self.tmp.name, 'missing'), csv_file]))
+        self.assertEqual(cli.EXIT_FAILURE, cli.run(['export', csv_file, os.path.join(self.tmp.name, 'out.txt')]))
+        with self.assertRaises(SystemExit) as exit:
+            cli.run(['scan'])
+        self.assertEqual(cli.EXIT_USAGE, exit.exception.code)
+        for shard in ('4/3', 'two'):
+            with self.subTest(shard=shard), self.assertRaises(SystemExit) as exit:
+                cli.run(['scan', self.root, csv_file, '--shard', shard])
+            self.assertEqual(cli.EXIT_USAGE, exit.exception.code)
+
+    def test_heavy_dependencies_load_only_when_needed(self):
+        csv_file = os.path.join(self.tmp.name, 'projectes.csv')
+        cli.run(['scan', self.root, csv_file])
+        script = ("import sys, cli; cli.run(['export', sys.argv[1], sys.argv[2]]); "
+                  "print(sorted(m for m in ('git', 'pdfreader', 'chardet', 'tkinter') if m in sys.modules))")
+        output = subprocess.run([sys.executable, '-c', script, csv_file, os.path.join(self.tmp.name, 'out.jsonl')],
+                                cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True,
+                                check=True).stdout
+        self.assertEqual('[]', output.strip().splitlines()[-1])
+
+
+class TestPdfSignature(unittest.TestCase):
+    CORPUS = {
+        'unsigned': (build_pdf({1: b'<< /Type /Catalog /Pages 2 0 R >>', **PAGES}, b'/Root 1 0 R'), False),
+        'empty_acroform': (build_pdf({1: b'<< /Type /Catalog /Pages 2 0 R /AcroForm << /Fields [] >> >>', **PAGES},
+                                     b'/Root 1 0 R'), False),
+        'signed_inline': (build_pdf({1: b'<< /Type /Catalog /Pages 2 0 R /AcroForm << /Fields [4 0 R] /SigFlags 3 >> >>',
+                                     **PAGES, 4: SIGNATURE}, b'/Root 1 0 R'), True),
+        'signed_indirect': (build_pdf({1: b'<< /Type /Catalog /Pages 2 0 R /AcroForm 5 0 R >>', **PAGES, 4: SIGNATURE,
+                                       5: b'<< /Fields [4 0 R] /SigFlags 3 >>'}, b'/Root 1 0 R'), True),
+        'signed_incremental': (build_pdf({1: b'<< /Type /Catalog /Pages 2 0 R >>', **PAGES}, b'/Root 1 0 R', updates=[
+            {1: b'<< /Type /Catalog /Pages 2 0 R /AcroForm 5 0 R >>', 4: SIGNATURE,
+             5: b'<< /Fields [4 0 R] /SigFlags 3 >>'}]), True),
+        'signed_xref_stream': (build_pdf({1: b'<< /Type /Catalog /Pages 2 0 R /AcroForm << /SigFlags 1 >> >>', **PAGES},
+                                         b'/Root 1 0 R', xref_stream=True), True),
+        'not_a_pdf': (b'this is not a pdf', False),
+        'empty': (b'', False),
+    }
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp.name, name + '.pdf')
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_agrees_with_full_parse(self):
+        for name, (content, signed) in self.CORPUS.items():
+            with self.subTest(name):
+                path = self.write(name, content)
+                self.assertEqual(signed, main.is_pdf_signed(path))
+                if content.startswith(b'%PDF'):
+                    self.assertEqual(pdf_signature._inspect_full(path).signed, main.is_pdf_signed(path))
+
+    def test_fast_path_avoids_full_parse(self):
+        with mock.patch('pdf_signature._inspect_full') as full_parse:
+            for name in ('unsigned', 'signed_inline', 'signed_indirect', 'signed_incremental'):
+                self.assertEqual(self.CORPUS[name][1], main.is_pdf_signed(self.write(name, self.CORPUS[name][0])))
+            full_parse.assert_not_called()
+            main.is_pdf_signed(self.write('signed_xref_stream', self.CORPUS['signed_xref_stream'][0]))
+            full_parse.assert_called_once()
+
+    def test_fast_path_counts_the_bytes_parsed(self):
+        content = self.CORPUS['signed_indirect'][0]
+        path = self.write('signed_indirect', content)
+        with mock.patch('instrumentation.count') as count:
+            self.assertTrue(main.is_pdf_signed(path))
+        bytes_read = sum(call.kwargs.get('bytes_read', 0) for call in count.call_args_list)
+        # The padding after the header is never touched
+        self.assertLess(0, bytes_read)
+        self.assertLess(bytes_read, len(content) - len(b'% padding\n' * 512))
+
+    def test_missing_xref_entry_falls_back(self):
+        content = self.CORPUS['signed_indirect'][0]
+        entry = re.search(rb'5 1\n\d{10} 00000 n \n', content).group()
+        truncated = content.replace(entry, b'')
+        with self.assertRaises(pdf_signature.FastPathUnavailable):
+            pdf_signature.PdfFile(truncated).object_offset(5)
+        path = self.write('missing_entry', truncated)
+        with mock.patch('pdf_signature._inspect_full', return_value=pdf_signature.PdfInspection(signed=True)) as full_parse:
+            self.assertTrue(main.is_pdf_signed(path))
+        full_parse.assert_called_once_with(path, False)
+
+    def test_encrypted(self):
+        content = build_pdf({1: b'<< /Type /Catalog /Pages 2 0 R /AcroForm << /SigFlags 3 >> >>', **PAGES,
+                             6: b'<< /Filter /Standard /V 1 /R 2 /O <00> /U <00> /P -4 >>'},
+                            b'/Root 1 0 R /Encrypt 6 0 R')
+        self.assertEqual(pdf_signature.PdfInspection(encrypted=True), pdf_signature._inspect_fast(self.write('encrypted', content)))
+
+
+
+    def test_signature_details(self):
+        signed = synthetic_root.PDF_VARIANTS['signed'][0]
+        for name, content, expected in (('intact', signed, (pdf_signature.WHOLE_FILE, pdf_signature.MATCH)),
+                                        ('appended', signed + b'% later revision\n', (pdf_signature.PARTIAL, pdf_signature.MATCH)),
+                                        ('modified', signed.replace(b'BT ET', b'BX EX'), (pdf_signature.WHOLE_FILE, pdf_signature.MISMATCH)),
+                                        ('stub', self.CORPUS['signed_inline'][0], (pdf_signature.PARTIAL, None))):
+            with self.subTest(name):
+                inspection = pdf_signature.inspect_pdf(self.write(name, content), details=True)
+                self.assertTrue(inspection.signed)
+                [signature] = inspection.signatures
+                self.assertEqual(('Pau Pericàs', '2024-02-06 12:00:00+01:00', 'adbe.pkcs7.detached'),
+                                 (signature.signer, signature.signed_at, signature.sub_filter))
+                self.assertEqual(expected, (signature.byte_range, signature.digest))
+                if name == 'intact':
+                    self.assertEqual(inspection, pdf_signature._inspect_full(self.write(name, content), details=True))
+
+    def test_scan_with_signature_details(self):
+        root = os.path.join(self.tmp.name, 'root')
+        synthetic_root.build_synthetic_root(root, 6, seed=5, git_every=0)
+        output = os.path.join(self.tmp.name, 'out.csv')
+        self.assertEqual(cli.EXIT_OK, cli.run(['scan', root, output, '--signature-details']))
+        headers, rows = main.read_csv_rows(output)
+        self.assertEqual(main.record_headers(signature_details=True), headers)
+        self.assertEqual(headers.index('SSPT') + 1, headers.index('SSPT Signer'))
+        self.assertEqual(headers.index('Dictamen_CEI') + 5, headers.index('Dictamen_CEI Digest'))
+        for document in ('SSPT', 'PSPT', 'Dictamen_CEI'):
+            for row in rows:
+                signed = row[headers.index(document)] == 'SIGNED'
+                self.assertEqual('match' if signed else '', row[headers.index(document + ' Digest')])
+
+
+class TestDataModel(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_filled_and_template_workbooks(self):
+        filled = os.path.join(self.tmp.name, 'filled.xlsx')
+        template = os.path.join(self.tmp.name, 'template.xlsx')
+        synthetic_root.build_xlsx(filled, 12)
+        synthetic_root.build_xlsx(template, 5, filled=False)
+        self.assertEqual(data_model.DataModelInspection(['Variables'], 12, False), data_model.inspect_workbook(filled))
+        self.assertEqual(data_model.DataModelInspection(['Variables'], 5, True), data_model.inspect_workbook(template))
+        broken = os.path.join(self.tmp.name, 'broken.xlsx')
+        with open(broken, 'wb') as f:
+            f.write(b'not a workbook')
+        self.assertIsNotNone(data_model.inspect_workbook(broken).error)
+
+    def test_cached_by_fingerprint(self):
+        path = os.path.join(self.tmp.name, 'Data Model 22011.xlsx')
+        synthetic_root.build_xlsx(path, 3)
+        with mock.patch('data_model.inspect_workbook', wraps=data_model.inspect_workbook) as inspect:
+            self.assertEqual(3, data_model.inspect_data_model(path).variables)
+            self.assertEqual(3, data_model.inspect_data_model(path).variables)
+            self.assertEqual(1, inspect.call_count)
+            synthetic_root.build_xlsx(path, 7)
+            os.utime(path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+            self.assertEqual(7, data_model.inspect_data_model(path).variables)
+            self.assertEqual(2, inspect.call_count)
+
+    def test_scan_with_data_model_details(self):
+        root = os.path.join(self.tmp.name, 'root')
+        synthetic_root.build_synthetic_root(root, 6, seed=5, git_every=0)
+        output = os.path.join(self.tmp.name, 'out.csv')
+        self.assertEqual(cli.EXIT_OK, cli.run(['scan', root, output, '--data-model-details']))
+        headers, rows = main.read_csv_rows(output)
+        self.assertEqual(main.record_headers(data_model_details=True), headers)
+        self.assertEqual(headers.index('Data Model') + 1, headers.index('Data Model Sheets'))
+        for row in rows:
+            found = row[headers.index('Data Model')] == 'YES'
+            self.assertEqual('Variables' if found else '', row[headers.index('Data Model Sheets')])
+            self.assertEqual(found, row[headers.index('Data Model Template')] in ('YES', 'NO'))
+
+
+class TestPdfCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache_file = os.path.join(self.tmp.name, 'pdf-cache.json')
+        self.paths = []
+        for i, variant in enumerate(['signed', 'signed', 'unsigned', 'signed']):
+            path = os.path.join(self.tmp.name, f'SSPT_2024010{i}.pdf')
+            with open(path, 'wb') as f:
+                f.write(synthetic_root.PDF_VARIANTS[variant][0])
+            self.paths.append(path)
+
+    def test_copies_are_parsed_once_across_runs(self):
+        with mock.patch('pdf_signature.inspect_pdf', wraps=pdf_signature.inspect_pdf) as inspect_pdf:
+            with pdf_cache.PdfInspectionCache(self.cache_file) as cache:
+                self.assertEqual([True, True, False, True], [main.is_pdf_signed(path) for path in self.paths])
+            self.assertEqual(2, inspect_pdf.call_count)
+            self.assertEqual((2, 2), (cache.hits, cache.misses))
+            with mock.patch('pdf_cache.content_hash') as content_hash:
+                with pdf_cache.PdfInspectionCache(self.cache_file) as cache:
+                    self.assertEqual([True, True, False, True], [main.is_pdf_signed(path) for path in self.paths])
+                content_hash.assert_not_called()
+            self.assertEqual(2, inspect_pdf.call_count)
+            with open(self.paths[0], 'wb') as f:
+                f.write(synthetic_root.PDF_VARIANTS['encrypted'][0])
+            with pdf_cache.PdfInspectionCache(self.cache_file):
+                self.assertFalse(main.is_pdf_signed(self.paths[0]))
+            self.assertEqual(3, inspect_pdf.call_count)
+        self.assertIsNone(pdf_signature._cache)
+
+    def test_details_only_when_asked(self):
+        cache = pdf_cache.PdfInspectionCache()
+        with mock.patch('pdf_signature.inspect_pdf', wraps=pdf_signature.inspect_pdf) as inspect_pdf:
+            self.assertIsNone(cache.inspect(self.paths[0]).signatures)
+            self.assertIsNone(cache.inspect(self.paths[1]).signatures)
+            self.assertEqual([False], [call.args[1] for call in inspect_pdf.call_args_list])
+            self.assertTrue(cache.inspect(self.paths[1], details=True).signatures)
+            self.assertTrue(cache.inspect(self.paths[0]).signatures)
+            self.assertEqual([False, True], [call.args[1] for call in inspect_pdf.call_args_list])
+            self.assertEqual(1, len(cache.inspections))
+
+    def test_lru_bound(self):
+        cache = pdf_cache.PdfInspectionCache(max_entries=2)
+        for path in self.paths[1:]:
+            cache.inspect(path)
+        cache.inspect(self.paths[1])
+        cache.inspect(os.path.join(self.tmp.name, 'missing.pdf'))
+        self.assertEqual(2, len(cache.inspections))
+        self.assertEqual([file_keys.fast_key(os.stat(path)) for path in (self.paths[3], self.paths[1])], list(cache.files))
+
+    def test_scan_with_pdf_cache(self):
+        root = os.path.join(self.tmp.name, 'root')
+        synthetic_root.build_synthetic_root(root, 4, seed=4, git_every=0)
+        expected = os.path.join(self.tmp.name, 'expected.csv')
+        main.scan_repos_and_create_csv_no_write(root, expected)
+        output = os.path.join(self.tmp.name, 'out.csv')
+        for workers, executor in ((1, 'thread'), (2, 'process')):
+            self.assertEqual(cli.EXIT_OK, cli.run(['scan', root, output, '--pdf-cache', self.cache_file,
+                                                   '--workers', str(workers), '--executor', executor]))
+            self.assertEqual(main.read_csv_rows(expected), main.read_csv_rows(output))
+        self.assertTrue(os.path.exists(self.cache_file))
+
+    def test_process_workers_warm_the_cache(self):
+        root = os.path.join(self.tmp.name, 'root')
+        synthetic_root.build_synthetic_root(root, 6, seed=4, git_every=0)
+        output = os.path.join(self.tmp.name, 'out.csv')
+        main.export_project_records(root, [output], workers=2, executor='process', pdf_cache_file=self.cache_file)
+        self.assertTrue(pdf_cache.PdfInspectionCache(self.cache_file).inspections)
+        with mock.patch('pdf_signature.inspect_pdf') as inspect_pdf:
+            main.export_project_records(root, [output], pdf_cache_file=self.cache_file)
+        inspect_pdf.assert_not_called()
+
+
+class TestGitMetadata(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.repo = self.tmp.name
+
+    def git(self, *args):
+        env = dict(os.environ, GIT_AUTHOR_NAME='Pau', GIT_AUTHOR_EMAIL='pau@idisba.es', GIT_COMMITTER_NAME='Pau',
+                   GIT_COMMITTER_EMAIL='pau@idisba.es', GIT_AUTHOR_DATE='2024-02-06T10:00:00+01:00',
+                   GIT_COMMITTER_DATE='2024-02-06T23:30:00-03:00')
+        return subprocess.run(['git', '-C', self.repo] + list(args), check=True, capture_output=True, env=env).stdout
+
+    def commit(self, message):
+        with open(os.path.join(self.repo, 'README.md'), 'a', encoding='utf-8') as f:
+            f.write(message + '\n' * 50)
+        self.git('add', 'README.md')
+        self.git('commit', '-q', '-m', message)
+
+    def test_loose_and_packed_commits_on_main(self):
+        self.git('init', '-q', '-b', 'main')
+        self.commit('Primer commit')
+        self.commit('Sol·licitud rebuda\n\nCos del missatge')
+        expected = ('2024-02-07', 'pau@idisba.es', 'Sol·licitud rebuda')
+        self.assertEqual(expected, main.get_last_commit_info(self.repo))
+        self.git('gc', '-q')
+        self.assertFalse(os.path.exists(os.path.join(self.repo, '.git', 'refs', 'heads', 'main')))
+        self.assertEqual(expected, main.get_last_commit_info(self.repo))
+        commit = git.Repo(self.repo).head.commit
+        self.assertEqual(commit.author.email, main.get_last_commit_info(self.repo)[1])
+
+    def test_deltified_objects_match_git(self):
+        self.git('init', '-q', '-b', 'master')
+        for i in range(30):
+            self.commit(f'Canvi {i}')
+        self.git('repack', '-adfq', '--window=50', '--depth=50')
+        store = git_metadata.ObjectStore(os.path.join(self.repo, '.git'))
+        try:
+            for sha in self.git('rev-list', '--objects', '--all').decode().split():
+                if len(sha) == 40:
+                    kind = self.git('cat-file', '-t', sha).decode().strip()
+                    self.assertEqual((kind, self.git('cat-file', kind, sha)), store.read(sha))
+        finally:
+            store.close()
+        # The deepest delta chain is inflated once; reading it again only inflates its last delta
+        chains = [line.split() for line in self.git('verify-pack', '-v', *glob.glob(
+            os.path.join(self.repo, '.git', 'objects', 'pack', '*.idx'))).decode().splitlines()]
+        sha, depth = max(((fields[0], int(fields[5])) for fields in chains if len(fields) == 7), key=lambda c: c[1])
+        self.assertGreater(depth, 1)
+        store = git_metadata.ObjectStore(os.path.join(self.repo, '.git'))
+        try:
+            with mock.patch('git_metadata._inflate', wraps=git_metadata._inflate) as inflate:
+                store.read(sha)
+                self.assertEqual(depth + 1, inflate.call_count)
+                store.read(sha)
+                self.assertEqual(depth + 2, inflate.call_count)
+        finally:
+            store.close()
+
+    def test_branches_and_empty_repositories(self):
+        self.git('init', '-q', '-b', 'master')
+        self.assertEqual((None, None, None), main.get_last_commit_info(self.repo))
+        with mock.patch('git_metadata.last_commit_info', side_effect=git_metadata.ObjectNotFound('sha')):
+            self.assertEqual((None, None, None), main.get_last_commit_info(self.repo))
+        self.commit('A master')
+        self.git('checkout', '-q', '-b', 'feature')
+        self.commit('A feature')
+        self.assertEqual('A feature', main.get_last_commit_info(self.repo)[2])
+        self.assertEqual('A master', main.get_last_commit_info(self.repo, ['develop', 'master'])[2])
+        self.assertEqual((None, None, None), main.get_last_commit_info(self.repo, ['develop']))
+        # The GitPython fallback agrees with the fast path
+        expected = main.get_last_commit_info(self.repo, ['master'])
+        with mock.patch('git_metadata.last_commit_info', side_effect=git_metadata.ObjectNotFound('sha')):
+            self.assertEqual((None, None, None), main.get_last_commit_info(self.repo, ['develop']))
+            self.assertEqual(expected, main.get_last_commit_info(self.repo, ['master']))
+
+    def test_cache_follows_a_branch_that_is_not_checked_out(self):
+        self.repo = os.path.join(self.tmp.name, 'root', 'PRISIB-00001')
+        os.makedirs(self.repo)
+        self.git('init', '-q', '-b', 'main')
+        self.commit('main1')
+        self.git('checkout', '-q', '-b', 'feature')
+        csv_file = os.path.join(self.tmp.name, 'out.csv')
+        cache_file = os.path.join(self.tmp.name, 'scan-cache.json')
+        root = os.path.dirname(self.repo)
+        main.scan_repos_and_create_csv_no_write(root, csv_file, cache_file=cache_file, branches=['main'])
+        # A commit on main that leaves HEAD, the work tree and README.md alone
+        sha = self.git('commit-tree', 'HEAD^{tree}', '-p', 'main', '-m', 'main2').decode().strip()
+        self.git('update-ref', 'refs/heads/main', sha)
+        main.scan_repos_and_create_csv_no_write(root, csv_file, cache_file=cache_file, branches=['main'])
+        headers, rows = main.read_csv_rows(csv_file)
+        self.assertEqual('main2', rows[0][headers.index('Last Commit msg')])
+
+    def test_not_a_repository(self):
+        with self.assertRaises(git_metadata.InvalidGitRepositoryError):
+            main.get_last_commit_info(self.repo)
+
+    def test_activity_metrics(self):
+        self.git('init', '-q', '-b', 'main')
+        now = time.time()
+        for days, email in ((400, 'pau@idisba.es'), (60, 'Anna@idisba.es'), (10, 'anna@idisba.es')):
+            date = time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime(now - days * 86400))
+            with open(os.path.join(self.repo, 'README.md'), 'a', encoding='utf-8') as f:
+                f.write(email + '\n')
+            self.git('add', 'README.md')
+            subprocess.run(['git', '-C', self.repo, 'commit', '-q', '-m', f'Fa {days} dies'], check=True,
+                           env=dict(os.environ, GIT_AUTHOR_NAME='X', GIT_AUTHOR_EMAIL=email, GIT_COMMITTER_NAME='X',
+                                    GIT_COMMITTER_EMAIL=email, GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date))
+        self.git('checkout', '-q', '-b', 'feature', 'HEAD~1')
+        open(os.path.join(self.repo, 'branca.txt'), 'w').close()
+        self.git('add', 'branca.txt')
+        self.git('commit', '-q', '-m', 'Branca')
+        self.git('checkout', '-q', 'main')
+        self.git('merge', '-q', '--no-edit', 'feature')
+        metrics = git_metadata.activity(self.repo, now=now)
+        self.assertEqual(metrics, git_metadata.activity_from_git_log(self.repo, now=now))
+        # The branch and merge commits are committed on 2024-02-07 UTC, the first day of the history
+        first = '2024-02-07'
+        self.assertEqual((5, 1, 2, 2, first), git_metadata.activity_summary(metrics, now))
+        self.assertEqual((5, 0, 1, 2, first), git_metadata.activity_summary(metrics, now + 30 * 86400))
+        with mock.patch('git_metadata.ObjectStore') as store:
+            self.assertIs(metrics, main.get_activity(self.repo, known=metrics))
+            store.assert_not_called()
+        self.git('gc', '-q')
+        self.assertEqual(metrics, git_metadata.activity(self.repo, now=now))
+
+
+class TestReadmeWriteBack(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = self.tmp.name
+        self.repo = os.path.join(self.root, 'PRISIB-22011')
+        os.makedirs(os.path.join(self.repo, 'docs'))
+        self.readme = os.path.join(self.repo, 'README.md')
+        with open(self.readme, 'wb') as f:
+            f.write(b'# Projecte\r\n\r\n### Status\r\nEn curs\r\n\r\n- Codi: 22011\r\n- Sol\xb7licitud: \r\n'
+                    b'- Pressupost: \r\n- Data Model: \r\n- Dictamen CEIB:\r\n')
+        for name in ['SSPT_20240206.pdf', 'Dictamen_CEI_22011.pdf', 'Data Model 22011.xlsx']:
+            open(os.path.join(self.repo, 'docs', name), 'wb').close()
+
+    def read_readme(self):
+        with open(self.readme, 'rb') as f:
+            return f.read()
+
+    def test_scan_applies_all_edits_once(self):
+        csv_file = os.path.join(self.tmp.name, 'out.csv')
+        with mock.patch('main._atomic_write', wraps=main._atomic_write) as atomic_write:
+            main.scan_repos_and_create_csv(self.root, csv_file)
+            self.assertEqual(1, atomic_write.call_count)
+            self.assertEqual(b'# Projecte\r\n\r\n### Status\r\nEn curs\r\n\r\n- Codi: 22011\r\n'
+                             b'- Sol\xb7licitud: SSPT_20240206.pdf\r\n- Pressupost: \r\n'
+                             b'- Data Model: Data Model 22011.xlsx\r\n- Dictamen CEIB: Dictamen_CEI_22011.pdf\r\n',
+                             self.read_readme())
+            main.scan_repos_and_create_csv(self.root, csv_file)
+            self.assertEqual(1, atomic_write.call_count)
+
+    def test_update_from_csv_rewrites_changed_status_only(self):
+        csv_file = os.path.join(self.tmp.name, 'out.csv')
+        main.scan_repos_and_create_csv_no_write(self.root, csv_file)
+        self.assertEqual(0, main.update_readme_files_from_csv(self.root, csv_file))
+        headers, rows = main.read_csv_rows(csv_file)
+        rows[0][headers.index('Status')] = 'Tancat'
+        with open(csv_file, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows([headers] + rows)
+        self.assertEqual(1, main.update_readme_files_from_csv(self.root, csv_file))
+        self.assertIn(b'### Status\r\nTancat\r\n\r\n- Codi', self.read_readme())
+
+    def test_status_is_inserted_when_missing(self):
+        edits = main.ReadmeEdits(self.repo)
+        edits.set_status('Nou')
+        self.assertEqual(['# A\n', '\n', '### Status\n', 'Nou\n', '\n', '- Codi:\n'],
+                         edits.edit_lines(['# A\n', '\n', '- Codi:\n']))
+
+
+class TestProjectIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = os.path.join(self.tmp.name, 'root')
+        self.index = os.path.join(self.tmp.name, 'projectes.sqlite')
+        for i, status in enumerate(['En curs', 'Tancat', 'En curs']):
+            folder = os.path.join(self.root, f'PRISIB-{i:05d}')
+            os.makedirs(folder)
+            with open(os.path.join(folder, 'README.md'), 'w', encoding='utf-8') as f:
+                f.write(f"### Status\n{status}\n\n- Codi: PRISIB {i:05d}\n")
+
+    def test_rescans_upsert_by_folder(self):
+        main.export_project_records(self.root, [self.index])
+        main.export_project_records(self.root, [self.index])
+        index = main.ProjectIndex(self.index)
+        self.addCleanup(index.close)
+        headers, rows = index.headers_and_rows()
+        self.assertEqual(main.record_headers(), headers)
+        self.assertEqual(['PRISIB-00000', 'PRISIB-00001', 'PRISIB-00002'], [row[0] for row in rows])
+        self.assertEqual(['PRISIB-00001'], index.find('Codi', '00001'))
+        self.assertEqual(['PRISIB-00000', 'PRISIB-00002'], index.find('Status', 'En curs'))
+        self.assertEqual(3, len(index.missing_signed('PSPT')))
+        plan = index.conn.execute("EXPLAIN QUERY PLAN SELECT folder FROM projects WHERE pspt = 'NO'").fetchall()
+        self.assertIn('projects_pspt', str(plan))
+
+    def test_renamed_folder_keeps_its_row(self):
+        main.export_project_records(self.root, [self.index])
+        index = main.ProjectIndex(self.index)
+        first_scanned = index.conn.execute("SELECT first_scanned_at FROM projects WHERE folder = 'PRISIB-00001'").fetchone()
+        index.close()
+        os.rename(os.path.join(self.root, 'PRISIB-00001'), os.path.join(self.root, 'PRISIB-00001-tancat'))
+        shutil.copytree(os.path.join(self.root, 'PRISIB-00002'), os.path.join(self.root, 'PRISIB-00002-copia'))
+        main.export_project_records(self.root, [self.index])
+        index = main.ProjectIndex(self.index)
+        self.addCleanup(index.close)
+        self.assertEqual(['PRISIB-00001-tancat'], index.find('Codi', '00001'))
+        self.assertEqual(first_scanned, index.conn.execute(
+            "SELECT first_scanned_at FROM projects WHERE folder = 'PRISIB-00001-tancat'").fetchone())
+        # Both folders sharing a Codi were scanned, so neither takes over the other's row
+        self.assertEqual(['PRISIB-00002', 'PRISIB-00002-copia'], index.find('Codi', '00002'))
+
+    def test_index_does_not_import_main(self):
+        code = "import sys, project_index; sys.exit('main' in sys.modules)"
+        self.assertEqual(0, subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(main.__file__))).returncode)
+
+    def test_readme_update_and_csv_export_from_index(self):
+        main.export_project_records(self.root, [self.index])
+        index = main.ProjectIndex(self.index)
+        index.update('PRISIB-00001', 'Status', 'Reobert')
+        index.close()
+        self.assertEqual(1, main.update_readme_files_from_csv(self.root, self.index))
+        self.assertEqual('Reobert', main.extract_status_from_readme(os.path.join(self.root, 'PRISIB-00001')))
+        csv_file = os.path.join(self.tmp.name, 'export.csv')
+        index = main.ProjectIndex(self.index)
+        self.assertEqual(3, index.export_csv(csv_file))
+        index.close()
+        headers, rows = main.read_csv_rows(self.index)
+        self.assertEqual((headers, [['' if v is None else v for v in row] for row in rows]),
+                         main.read_csv_rows(csv_file))
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,6 +1,16 @@
+import queue
+import threading
+import time
 import tkinter as tk
 import main as main
-from tkinter import filedialog, PhotoImage
+from tkinter import filedialog, PhotoImage, ttk
+
+# Scans run on a worker thread. It never touches Tk: it posts ("progress", done, total,
+# folder) and ("done", message) events to this queue, which the main loop drains with
+# root.after. Cancel sets an event checked between repositories.
+events = queue.Queue()
+cancel_event = threading.Event()
+POLL_MS = 100
 
 def browse_directory(entry):
     directory = filedialog.askdirectory()
@@ -14,6 +24,74 @@ def browse_file(entry):
     entry.insert(0, file)
 
 
+def start_task(description, unit, task, *args, **kwargs):
+    cancel_event.clear()
+    started = time.monotonic()
+
+    def progress(done, total, folder):
+        events.put(("progress", done, total, folder, time.monotonic() - started))
+
+    def work():
+        try:
+            result = task(*args, progress=progress, cancel=cancel_event, **kwargs)
+            state = "Cancelled" if cancel_event.is_set() else "Finished"
+            events.put(("done", f"{state}: {result} {unit} in {time.monotonic() - started:.1f} s"))
+        except Exception as e:
+            print(f"Exception occurred: {e}")
+            events.put(("done", f"Failed: {e}"))
+
+    for button in (run_button, readme_button):
+        button.config(state=tk.DISABLED)
+    cancel_button.config(state=tk.NORMAL)
+    progress_bar.config(value=0, maximum=1)
+    status_label.config(text=f"{description}...")
+    threading.Thread(target=work, daemon=True).start()
+    root.after(POLL_MS, poll_events)
+
+
+def poll_events():
+    finished = False
+    last_progress = None
+    try:
+        while True:
+            event = events.get_nowait()
+            if event[0] == "progress":
+                last_progress = event
+            else:
+                finished = True
+                status_label.config(text=event[1])
+    except queue.Empty:
+        pass
+    if last_progress is not None:
+        # Only the latest progress event is drawn, however many arrived since the last poll
+        _, done, total, folder, elapsed = last_progress
+        progress_bar.config(value=done, maximum=max(total, 1))
+        rate = done / elapsed if elapsed > 0 else 0
+        progress_label.config(text=f"{done}/{total} repositories - {folder} - {rate:.1f} repos/s")
+    if finished:
+        for button in (run_button, readme_button):
+            button.config(state=tk.NORMAL)
+        cancel_button.config(state=tk.DISABLED)
+    else:
+        root.after(POLL_MS, poll_events)
+
+
+def run_scan():
+    scan = main.scan_repos_and_create_csv if write_to_readme.get() else main.scan_repos_and_create_csv_no_write
+    start_task("Scanning repositories", "projects exported", scan, dir_entry.get(), file_entry.get(), append_to_csv=append_to_csv.get())
+
+
+def update_readmes():
+    start_task("Updating README.md files", "README.md files updated", main.update_readme_files_from_csv,
+               csv_file=file_entry.get(), dir_path=dir_entry.get())
+
+
+def cancel_task():
+    cancel_event.set()
+    cancel_button.config(state=tk.DISABLED)
+    status_label.config(text="Cancelling after the current repository...")
+
+
 root = tk.Tk()
 root.geometry('800x600')  # Adjust the dimensions as needed
 
@@ -53,13 +131,22 @@ append_to_csv.set(False)  # Default value
 append_checkbox = tk.Checkbutton(root, text="Append to CSV", variable=append_to_csv)
 append_checkbox.pack()
 
-run_button = tk.Button(root, text="Run Script",
-                       command=lambda: main.run_script(dir_entry, file_entry, write_to_readme, append_to_csv))
+run_button = tk.Button(root, text="Run Script", command=run_scan)
 run_button.pack()
 
-readme_button = tk.Button(root, text="Update Status in Readme",
-                          command=lambda: main.update_readme_files_from_csv(csv_file=file_entry.get(),
-                                                                       dir_path=dir_entry.get()))
+readme_button = tk.Button(root, text="Update Status in Readme", command=update_readmes)
 readme_button.pack()
 
+progress_bar = ttk.Progressbar(root, length=400, mode='determinate')
+progress_bar.pack(pady=(10, 0))
+
+progress_label = tk.Label(root, text="")
+progress_label.pack()
+
+status_label = tk.Label(root, text="")
+status_label.pack()
+
+cancel_button = tk.Button(root, text="Cancel", command=cancel_task, state=tk.DISABLED)
+cancel_button.pack()
+
 root.mainloop()
@@ -1,8 +1,14 @@
 import tkinter as tk
 from tkinter import ttk, filedialog
-import csv
-import os
-import main  # Import the main module
+from project_table import ProjectTable
+
+# The Treeview is a viewport over table: it holds the visible rows plus BUFFER_ROWS on
+# each side, and is refilled from the backing store when scrolling leaves that range.
+BUFFER_ROWS = 50
+table = ProjectTable()
+top = 0  # view position of the first visible row
+rendered = (0, 0)  # view positions currently inserted in the tree
+visible_rows = 20
 
 def browse_directory(entry):
     directory = filedialog.askdirectory()
@@ -14,44 +20,47 @@ def browse_file(entry):
     entry.delete(0, tk.END)
     entry.insert(0, file)
 
-def load_csv_data(csv_file):
-    data = []
-    with open(csv_file, 'r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        headers = next(reader)
-        for row in reader:
-            data.append(row)
-    return headers, data
-
-def save_csv_data(csv_file, headers, data):
-    with open(csv_file, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow(headers)
-        writer.writerows(data)
-
 def on_cell_double_click(event):
-    item = tree.selection()[0]
+    item = tree.identify_row(event.y)
     column = tree.identify_column(event.x)
-    col_index = int(column.replace('#', '')) - 1
+    if not item or column == '#0':
+        return
+    header = table.headers[int(column.replace('#', '')) - 1]
     entry = tk.Entry(root)
-    entry.insert(0, tree.item(item, 'values')[col_index])
-    entry.place(x=event.x_root, y=event.y_root)
+    entry.insert(0, table.get(int(item), header))
+    entry.place(x=event.x_root - root.winfo_rootx(), y=event.y_root - root.winfo_rooty())
     entry.focus()
 
     def on_entry_confirm(event):
         new_value = entry.get()
+        table.set(int(item), header, new_value)
         tree.set(item, column, new_value)
         entry.destroy()
 
     entry.bind('<Return>', on_entry_confirm)
 
 def on_save_button_click():
-    data = []
-    for row_id in tree.get_children():
-        row = tree.item(row_id)['values']
-        data.append(row)
-    save_csv_data(file_entry.get(), headers, data)
-    main.update_readme_files_from_csv(dir_entry.get(), file_entry.get())  # Call the existing function
+    # Only the journalled edits are saved, and only edited statuses reach the READMEs
+    changed, written = table.save(dir_entry.get())
+    count_label.config(text=f"Saved {changed} changed projects, {written} README.md files updated")
+
+def on_summary_button_click():
+    # Summary of the loaded rows, including unsaved edits
+    try:
+        import aggregation
+        lines = aggregation.summarize(table.headers, table.rows).lines()
+    except ImportError as e:
+        count_label.config(text=str(e))
+        return
+    window = tk.Toplevel(root)
+    window.title("Summary")
+    text = tk.Text(window, width=80, height=30)
+    scroll = ttk.Scrollbar(window, orient=tk.VERTICAL, command=text.yview)
+    text.config(yscrollcommand=scroll.set)
+    scroll.pack(side=tk.RIGHT, fill='y')
+    text.pack(expand=True, fill='both')
+    text.insert('1.0', '\n'.join(lines))
+    text.config(state=tk.DISABLED)
 
 root = tk.Tk()
 root.geometry('800x600')
@@ -78,23 +87,115 @@ file_browse_button.pack()
 load_button = tk.Button(root, text="Load Data", command=lambda: load_data())
 load_button.pack()
 
-tree = ttk.Treeview(root)
-tree.pack(expand=True, fill='both')
+filter_var = tk.StringVar()
+filter_frame = tk.Frame(root)
+filter_frame.pack(fill='x')
+tk.Label(filter_frame, text="Filter:").pack(side=tk.LEFT)
+filter_entry = tk.Entry(filter_frame, textvariable=filter_var)
+filter_entry.pack(side=tk.LEFT, expand=True, fill='x')
+count_label = tk.Label(filter_frame, text="")
+count_label.pack(side=tk.LEFT)
+
+table_frame = tk.Frame(root)
+table_frame.pack(expand=True, fill='both')
+tree = ttk.Treeview(table_frame)
+scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL)
+scrollbar.pack(side=tk.RIGHT, fill='y')
+tree.pack(side=tk.LEFT, expand=True, fill='both')
+
+
+def render():
+    # Draw view positions top .. top + visible_rows, refilling the tree only when they
+    # fall outside the rows already inserted
+    global rendered
+    total = len(table)
+    start, end = rendered
+    if rendered == (0, 0) or total == 0:
+        # Reset by redraw_view, or nothing left to show: rows of the previous view must not linger
+        tree.delete(*tree.get_children())
+        start, end = rendered = (0, 0)
+    if total and (end == 0 or not (start <= top and min(top + visible_rows, total) <= end) or end > total):
+        start, end = max(0, top - BUFFER_ROWS), min(total, top + visible_rows + BUFFER_ROWS)
+        tree.delete(*tree.get_children())
+        for row_id, values in table.window(start, end - start):
+            tree.insert('', 'end', iid=str(row_id), text=row_id, values=values)
+        rendered = (start, end)
+    if end > start:
+        tree.yview_moveto((top - start) / (end - start))
+    shown = min(visible_rows, total)
+    scrollbar.set(top / total if total else 0, (top + shown) / total if total else 1)
+    count_label.config(text=f"{total} of {len(table.rows)} projects")
+
+
+def scroll_to(position):
+    global top
+    top = max(0, min(int(position), len(table) - visible_rows))
+    render()
+
+
+def on_scrollbar(action, amount, unit=None):
+    if action == 'moveto':
+        scroll_to(float(amount) * len(table))
+    else:
+        scroll_to(top + int(amount) * (visible_rows if unit == 'pages' else 1))
+
+
+def on_mouse_wheel(event):
+    if event.num == 4 or event.delta > 0:
+        scroll_to(top - 3)
+    else:
+        scroll_to(top + 3)
+    return 'break'
+
+
+def on_tree_configure(event):
+    global visible_rows
+    row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+    visible_rows = max(1, event.height // row_height - 1)
+    scroll_to(top)
+
+
+def redraw_view():
+    # The view changed order or size: drop the rendered rows and start from the top
+    global rendered, top
+    rendered = (0, 0)
+    top = 0
+    render()
+
+
+def on_heading_click(header):
+    table.sort(header)
+    redraw_view()
+
+
+def on_filter_change(*args):
+    table.filter(filter_var.get())
+    redraw_view()
+
 
 def load_data():
-    global headers
-    headers, data = load_csv_data(file_entry.get())
-    tree['columns'] = headers
+    table.load(file_entry.get())
+    filter_var.set('')
+    tree['columns'] = table.headers
     tree.heading('#0', text='Index')
     tree.column('#0', width=50)
-    for header in headers:
-        tree.heading(header, text=header)
+    for header in table.headers:
+        tree.heading(header, text=header, command=lambda header=header: on_heading_click(header))
         tree.column(header, width=100)
-    for i, row in enumerate(data):
-        tree.insert('', 'end', text=i, values=row)
-    tree.bind('<Double-1>', on_cell_double_click)
+    redraw_view()
+
+
+scrollbar.config(command=on_scrollbar)
+tree.bind('<Double-1>', on_cell_double_click)
+tree.bind('<Configure>', on_tree_configure)
+tree.bind('<MouseWheel>', on_mouse_wheel)
+tree.bind('<Button-4>', on_mouse_wheel)
+tree.bind('<Button-5>', on_mouse_wheel)
+filter_var.trace_add('write', on_filter_change)
 
 save_button = tk.Button(root, text="Save Changes", command=on_save_button_click)
 save_button.pack()
+summary_button = tk.Button(root, text="Summary", command=on_summary_button_click)
+summary_button.pack()
 
 root.mainloop()
\ No newline at end of file
@@ -0,0 +1,213 @@
+import datetime
+import json
+from dataclasses import dataclass, field, asdict
+
+# Portfolio summary of a scan: projects by Status, by missing / unsigned documents, by age
+# since the last commit and since Data inici, and the list of stale projects.
+#
+#   python cli.py scan C:/Users/Pau/Documents Projectes.csv Projectes.summary.json
+#   python cli.py summary Projectes.csv --stale-days 120
+#
+# The scan output is loaded into a pyarrow table (one array per column) and every count
+# is a pyarrow.compute kernel over whole columns, so the cost stays flat per project
+# instead of a Python loop over rows. Dates are parsed the same way: "15/04/2024",
+# "2024-04-15", "20240415" and "15-4-24" are rewritten to ISO strings by regex kernels
+# and parsed in one strptime call; anything else (or 31/02/2024) becomes null.
+
+DOCUMENT_STATUSES = ("NO", "YES", "SIGNED")
+# YES/NO columns that are not document statuses
+NOT_DOCUMENTS = ("Data Model Template",)
+# Ages in days, each bucket holding the projects up to that age
+AGE_BUCKETS = (30, 90, 180, 365)
+DEFAULT_STALE_DAYS = 180
+# Status values (compared case-insensitively) of projects that are not expected to move
+CLOSED_STATUSES = ('tancat', 'finalitzat', 'closed')
+
+# (regex with y, m, d groups) for every accepted date format; the first one matching wins
+_DATE_FORMATS = (
+    r'^(?P<y>\d{4})-(?P<m>\d{1,2})-(?P<d>\d{1,2})',
+    r'^(?P<d>\d{1,2})[/.-](?P<m>\d{1,2})[/.-](?P<y>\d{4}|\d{2})$',
+    r'^(?P<y>\d{4})(?P<m>\d{2})(?P<d>\d{2})$',
+)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+    except ImportError:
+        raise ImportError("The scan summary requires the pyarrow package (pip install pyarrow)")
+    return pyarrow, pyarrow.compute
+
+
+def load_table(headers, rows):
+    """Build a pyarrow table of strings from scan rows; empty cells are null."""
+    pa, pc = _pyarrow()
+    width = len(headers)
+    # Short rows are padded; the transpose is the only per-row Python work
+    columns = list(zip(*((list(row) + [None] * width)[:width] for row in rows))) or [()] * width
+    arrays = []
+    for column in columns:
+        array = pc.cast(pa.array(column), pa.string()) if column else pa.array([], pa.string())
+        arrays.append(pc.if_else(pc.equal(array, ''), pa.scalar(None, pa.string()), array))
+    # Headers may repeat (a prefix named like a trailing column), so build by position
+    return pa.Table.from_arrays(arrays, names=[str(header) for header in headers])
+
+
+def parse_dates(column):
+    """Parse a string column of mixed date formats into date32, null where it is not a valid date."""
+    pa, pc = _pyarrow()
+    text = pc.utf8_trim_whitespace(column)
+    iso = pa.nulls(len(text), pa.string())
+    for pattern in _DATE_FORMATS:
+        parts = pc.extract_regex(text, pattern)
+        year = pc.struct_field(parts, 'y')
+        year = pc.if_else(pc.equal(pc.utf8_length(year), 2), pc.binary_join_element_wise('20', year, ''), year)
+        candidate = pc.binary_join_element_wise(year, pc.utf8_lpad(pc.struct_field(parts, 'm'), 2, '0'),
+                                                pc.utf8_lpad(pc.struct_field(parts, 'd'), 2, '0'), '-')
+        iso = pc.coalesce(iso, candidate)
+    dates = pc.cast(pc.strptime(iso, format='%Y-%m-%d', unit='s', error_is_null=True), pa.date32())
+    # strptime rolls impossible days over (31/02 -> 2 March); they do not survive the round trip
+    valid = pc.equal(pc.strftime(dates, format='%Y-%m-%d'), iso)
+    return pc.if_else(valid, dates, pa.scalar(None, pa.date32()))
+
+
+def age_in_days(dates, today):
+    pa, pc = _pyarrow()
+    return pc.days_between(dates, pa.scalar(today, pa.date32()))
+
+
+def _counts(column):
+    # {value: count} with null counted under ''
+    counts = {}
+    for item in column.value_counts().to_pylist():
+        value = '' if item['values'] is None else item['values']
+        counts[value] = counts.get(value, 0) + item['counts']
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+
+
+def _age_breakdown(days):
+    pa, pc = _pyarrow()
+    breakdown = {}
+    below = 0
+    previous = None
+    for limit in AGE_BUCKETS:
+        upto = pc.sum(pc.less_equal(days, limit)).as_py() or 0
+        breakdown[f"{0 if previous is None else previous + 1}-{limit}"] = upto - below
+        below, previous = upto, limit
+    known = len(days) - days.null_count
+    breakdown[f">{AGE_BUCKETS[-1]}"] = known - below
+    breakdown["unknown"] = days.null_count
+    return breakdown
+
+
+def document_columns(table):
+    """The columns holding document statuses: every value is NO, YES or SIGNED (SSPT, PSPT, Dictamen_CEI, ...)."""
+    pa, pc = _pyarrow()
+    statuses = pa.array(DOCUMENT_STATUSES)
+    columns = []
+    for name, column in zip(table.column_names, table.columns):
+        if name in NOT_DOCUMENTS:
+            continue
+        present = len(column) - column.null_count
+        if present and pc.sum(pc.is_in(column, value_set=statuses)).as_py() == present:
+            columns.append(name)
+    return columns
+
+
+@dataclass
+class PortfolioSummary:
+    today: str
+    projects: int = 0
+    stale_days: int = DEFAULT_STALE_DAYS
+    by_status: dict = field(default_factory=dict)  # Status -> projects ('' when missing)
+    by_document: dict = field(default_factory=dict)  # document column -> {NO, YES, SIGNED: projects}
+    by_commit_age: dict = field(default_factory=dict)  # age bucket of the last commit -> projects
+    by_start_age: dict = field(default_factory=dict)  # age bucket of Data inici -> projects
+    unparsed_start_dates: list = field(default_factory=list)  # folders whose Data inici is not a date
+    stale: list = field(default_factory=list)  # [folder, status, last activity date, days], oldest first
+
+    def to_dict(self):
+        return asdict(self)
+
+    def lines(self):
+        lines = [f"{self.projects} projects on {self.today}", "By status:"]
+        lines += [f"  {status or '(none)'}: {count}" for status, count in self.by_status.items()]
+        lines.append("By document (missing / unsigned / signed):")
+        lines += [f"  {document}: {counts['NO']} / {counts['YES']} / {counts['SIGNED']}"
+                  for document, counts in self.by_document.items()]
+        lines.append("Days since the last commit: " + ", ".join(f"{k}: {v}" for k, v in self.by_commit_age.items()))
+        lines.append("Days since Data inici: " + ", ".join(f"{k}: {v}" for k, v in self.by_start_age.items()))
+        if self.unparsed_start_dates:
+            lines.append(f"Unreadable Data inici in: {', '.join(self.unparsed_start_dates)}")
+        lines.append(f"Stale projects (no activity in {self.stale_days} days): {len(self.stale)}")
+        lines += [f"  {folder} ({status or 'no status'}): {last} ({days} days)"
+                  for folder, status, last, days in self.stale]
+        return lines
+
+
+def _column(table, *names):
+    # The first of names in table, or an all-null column
+    pa, pc = _pyarrow()
+    for name in names:
+        if name in table.column_names:
+            return table.column(name)
+    return pa.nulls(table.num_rows, pa.string())
+
+
+def summarize(headers, rows, today: datetime.date = None, stale_days: int = DEFAULT_STALE_DAYS):
+    """
+    Summarize scan results (see main.read_csv_rows) into a PortfolioSummary.
+
+    A project is stale when its last activity, the last commit date or Data inici when there
+    are no commits, is more than stale_days old and its Status is not one of CLOSED_STATUSES.
+    Projects without any date are not listed as stale, they are counted as "unknown" ages.
+    """
+    pa, pc = _pyarrow()
+    if today is None:
+        today = datetime.date.today()
+    table = load_table(headers, rows)
+    summary = PortfolioSummary(today=today.isoformat(), projects=table.num_rows, stale_days=stale_days)
+    folders = table.column(0)
+    status = _column(table, "Status", "Project Status")
+    summary.by_status = _counts(status)
+    for name in document_columns(table):
+        counts = _counts(table.column(name))
+        summary.by_document[name] = {value: counts.get(value, 0) for value in DOCUMENT_STATUSES}
+
+    start_text = _column(table, "Data Inici")
+    start = parse_dates(start_text)
+    commit = parse_dates(_column(table, "Last Commit Date"))
+    commit_days = age_in_days(commit, today)
+    start_days = age_in_days(start, today)
+    summary.by_commit_age = _age_breakdown(commit_days)
+    summary.by_start_age = _age_breakdown(start_days)
+    unparsed = pc.and_(pc.is_valid(start_text), pc.is_null(start))
+    summary.unparsed_start_dates = pc.filter(folders, unparsed).to_pylist()
+
+    last = pc.coalesce(commit, start)
+    last_days = age_in_days(last, today)
+    closed = pc.is_in(pc.utf8_lower(pc.utf8_trim_whitespace(status)), value_set=pa.array(CLOSED_STATUSES))
+    stale = pc.and_kleene(pc.greater(last_days, stale_days), pc.invert(pc.fill_null(closed, False)))
+    stale = pc.fill_null(stale, False)
+    stale_table = pa.table({'folder': folders, 'status': status, 'last': last, 'days': last_days}).filter(stale)
+    stale_table = stale_table.sort_by([('days', 'descending'), ('folder', 'ascending')])
+    summary.stale = [[row['folder'], row['status'], row['last'].isoformat(), row['days']]
+                     for row in stale_table.to_pylist()]
+    return summary
+
+
+def summarize_file(path, today=None, stale_days=DEFAULT_STALE_DAYS):
+    """summarize() the scan CSV or SQLite project index at path."""
+    import main
+    headers, rows = main.read_csv_rows(path)
+    return summarize(headers, rows, today, stale_days)
+
+
+def write_summary(summary: PortfolioSummary, path):
+    """Write the summary as JSON, or as the text of lines() when path does not end in .json."""
+    with open(path, 'w', encoding='utf-8') as f:
+        if path.lower().endswith('.json'):
+            json.dump(summary.to_dict(), f, ensure_ascii=False, indent=1)
+        else:
+            f.write('\n'.join(summary.lines()) + '\n')
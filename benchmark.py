@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import main
+from pdf_signature import is_pdf_signed
+from synthetic_root import build_synthetic_root
+
+# Benchmarks of the scan entry points over synthetic roots of several sizes.
+#
+#   python benchmark.py                   # run and compare with benchmark_baseline.json
+#   python benchmark.py --save-baseline   # run and store the results as the new baseline
+#
+# Baselines are machine specific, so they are kept locally (benchmark_baseline.json is not
+# committed). A result slower than the baseline by more than --tolerance is a regression
+# and makes the script exit with status 1.
+
+DEFAULT_SIZES = [10, 50, 200]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+
+def best_time(fn, setup=None, repeat=3):
+    """Best wall time of fn() over repeat runs; setup() runs untimed before each one."""
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_benchmarks(sizes=None, repeat=3, seed=0):
+    """Return {benchmark name: best seconds} for every size."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes or DEFAULT_SIZES:
+            pristine = os.path.join(tmp, f'pristine-{size}')
+            build_synthetic_root(pristine, size, seed)
+            root = os.path.join(tmp, f'root-{size}')
+            csv_file = os.path.join(tmp, f'projectes-{size}.csv')
+
+            def fresh_copy():
+                # Runs that write to READMEs always start from the untouched root
+                shutil.rmtree(root, ignore_errors=True)
+                shutil.copytree(pristine, root, symlinks=True)
+
+            fresh_copy()
+            # Untimed warm-up: imports, compiled patterns and the OS file cache
+            main.scan_repos_and_create_csv_no_write(root, csv_file)
+            results[f'scan_repos_and_create_csv_no_write[{size}]'] = best_time(
+                lambda: main.scan_repos_and_create_csv_no_write(root, csv_file), repeat=repeat)
+            results[f'scan_repos_and_create_csv[{size}]'] = best_time(
+                lambda: main.scan_repos_and_create_csv(root, csv_file), fresh_copy, repeat)
+
+            headers, rows = main.read_csv_rows(csv_file)
+            status = main.status_column(headers)
+            changed_csv = os.path.join(tmp, f'changed-{size}.csv')
+            with main.CsvSink(changed_csv) as sink:
+                sink.open(headers)
+                for row in rows:
+                    sink.write(row[:status] + ['Revisat'] + row[status + 1:])
+            results[f'update_readme_files_from_csv[{size}]'] = best_time(
+                lambda: main.update_readme_files_from_csv(root, changed_csv), fresh_copy, repeat)
+
+            pdfs = [os.path.join(dirpath, name) for dirpath, dirnames, filenames in os.walk(pristine)
+                    for name in filenames if name.endswith('.pdf')]
+            results[f'is_pdf_signed[{size}, {len(pdfs)} pdfs]'] = best_time(
+                lambda: [is_pdf_signed(pdf) for pdf in pdfs], repeat=repeat)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print results next to the baseline and return the names that regressed."""
+    regressions = []
+    for name, seconds in results.items():
+        before = baseline.get(name)
+        if before:
+            ratio = seconds / before
+            flag = '  REGRESSION' if ratio > tolerance else ''
+            print(f"{name:55} {seconds * 1000:10.1f} ms  (baseline {before * 1000:.1f} ms, x{ratio:.2f}){flag}")
+            if ratio > tolerance:
+                regressions.append(name)
+        else:
+            print(f"{name:55} {seconds * 1000:10.1f} ms  (no baseline)")
+    return regressions
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the project scans on synthetic roots.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Numbers of project folders")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per benchmark; the best one counts")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help="Slowdown factor over the baseline reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.repeat, args.seed)
+    try:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    except FileNotFoundError:
+        baseline = {}
+    regressions = compare(results, baseline, args.tolerance)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'sizes': args.sizes, 'repeat': args.repeat, 'seed': args.seed, 'results': results}, f,
+                      indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
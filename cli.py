@@ -0,0 +1,207 @@
+import argparse
+import os
+import sqlite3
+import sys
+
+# Command line entry point, for cron jobs and scripts that run without Tk.
+#
+#   python cli.py scan C:/Users/Pau/Documents Projectes.csv Projectes.sqlite --workers 8 --cache scan-cache.json
+#   python cli.py write-back C:/Users/Pau/Documents Projectes.csv
+#   python cli.py export Projectes.sqlite Projectes.xlsx
+#   python cli.py scan C:/Users/Pau/Documents part-2.csv --shard 2/4   (then: merge Projectes.csv part-*.csv)
+#   python cli.py summary Projectes.csv --stale-days 120 --output Projectes.summary.json
+#   python cli.py watch C:/Users/Pau/Documents Projectes.sqlite
+#
+# Only the modules a command needs are imported, and main itself loads GitPython,
+# pdfreader and chardet only when a repository actually needs them.
+
+EXIT_OK = 0
+EXIT_FAILURE = 1  # the command ran but failed (unreadable output, broken CSV, ...)
+EXIT_USAGE = 2  # invalid arguments (argparse)
+EXIT_NOT_FOUND = 3  # the project root or input file does not exist
+EXIT_INTERRUPTED = 130
+
+
+def _scan_options(parser):
+    parser.add_argument('--prefix', dest='pdf_prefixes', action='append',
+                        help="Dated PDF prefix to look for (repeatable), defaults to SSPT and PSPT")
+    parser.add_argument('--branch', dest='branches', action='append',
+                        help="Report the last commit of this branch (repeatable, first existing wins)")
+    parser.add_argument('--write-readme', action='store_true',
+                        help="Write the detected document filenames to each README.md")
+
+
+def _shard(text):
+    # argparse type of --shard: an invalid k/N is a usage error (exit 2), not a failed scan
+    import sharding
+    try:
+        return sharding.parse_shard(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description="Scan PRISIB project folders.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    scan = commands.add_parser('scan', help="Scan every project folder into one or more outputs")
+    scan.add_argument('dir_path', help="Root directory holding the project folders")
+    scan.add_argument('outputs', nargs='+',
+                      help="Output files; .csv, .jsonl, .xlsx, .parquet, .sqlite/.db or a .summary.json/.txt summary")
+    _scan_options(scan)
+    scan.add_argument('--workers', type=int, default=1, help="Folders scanned concurrently")
+    scan.add_argument('--executor', choices=['thread', 'process'], default='thread')
+    scan.add_argument('--cache', dest='cache_file', help="Scan cache file; unchanged folders are not rescanned")
+    scan.add_argument('--full-rescan', action='store_true', help="Ignore the cached records")
+    scan.add_argument('--pdf-cache', dest='pdf_cache_file',
+                      help="PDF inspection cache file, shared by identical PDFs in every folder and across runs")
+    scan.add_argument('--exclude', action='append',
+                      help="Directory glob not searched for documents (repeatable), replaces the default excludes")
+    scan.add_argument('--max-depth', type=int, help="Deepest directory level searched for documents")
+    scan.add_argument('--signature-details', action='store_true',
+                      help="Add the signer, signing time, SubFilter and integrity of each signed PDF as columns")
+    scan.add_argument('--activity', action='store_true',
+                      help="Add commit counts (total, last 30 and 90 days), distinct authors and first commit date")
+    scan.add_argument('--data-model-details', action='store_true',
+                      help="Add the sheet names, variable count and unfilled-template flag of each Data Model workbook")
+    scan.add_argument('--shard', type=_shard, help="Scan only shard k of N (k/N) and write a manifest next to each output")
+    scan.add_argument('--stats', action='store_true', help="Print per-stage timings and the slowest repositories")
+    scan.add_argument('--stats-log', help="Write per-repository stage timings to this JSON lines file")
+    scan.add_argument('--profile', help="Write a cProfile dump of the scan to this file")
+
+    write_back = commands.add_parser('write-back', help="Write the Status column of a scan back to the READMEs")
+    write_back.add_argument('dir_path', help="Root directory holding the project folders")
+    write_back.add_argument('csv_file', help="Scan CSV or SQLite project index")
+
+    export = commands.add_parser('export', help="Convert scan results to other formats without rescanning")
+    export.add_argument('source', help="Scan CSV or SQLite project index")
+    export.add_argument('outputs', nargs='+', help="Output files, the extension picks the format")
+
+    merge = commands.add_parser('merge', help="Merge the partial outputs of sharded scans")
+    merge.add_argument('output', help="Merged output file, the extension picks the format")
+    merge.add_argument('partials', nargs='+', help="Partial CSVs or SQLite indexes written with scan --shard")
+
+    summary = commands.add_parser('summary', help="Count projects by status, document and age, and list stale ones")
+    summary.add_argument('source', help="Scan CSV or SQLite project index")
+    summary.add_argument('--stale-days', type=int, help="Days without commits after which an open project is stale")
+    summary.add_argument('--output', help="Also write the summary to this file, as JSON if it ends in .json")
+
+    watch = commands.add_parser('watch', help="Keep an output current while the project folders change")
+    watch.add_argument('dir_path', help="Root directory holding the project folders")
+    watch.add_argument('output', help="Output file, ideally a .sqlite project index")
+    _scan_options(watch)
+    watch.add_argument('--debounce', type=float, default=1.0, help="Seconds of quiet before rescanning")
+    watch.add_argument('--polling', action='store_true', help="Poll for changes instead of using watchdog")
+    watch.add_argument('--interval', type=float, default=2.0, help="Seconds between polls")
+    return parser
+
+
+def _missing(*paths):
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"{path} does not exist", file=sys.stderr)
+            return True
+    return False
+
+
+def run_scan(args):
+    if _missing(args.dir_path):
+        return EXIT_NOT_FOUND
+    import main
+    options = dict(write_to_readme=args.write_readme, workers=args.workers, executor=args.executor,
+                   cache_file=args.cache_file, full_rescan=args.full_rescan, branches=args.branches,
+                   exclude=args.exclude, max_depth=args.max_depth, pdf_cache_file=args.pdf_cache_file,
+                   signature_details=args.signature_details, activity=args.activity,
+                   data_model_details=args.data_model_details, shard=args.shard)
+    if args.stats or args.stats_log or args.profile:
+        import instrumentation
+        with instrumentation.ScanRecorder(args.stats_log, args.profile) as recorder:
+            count = main.export_project_records(args.dir_path, args.outputs, args.pdf_prefixes, **options)
+        if args.stats:
+            print(recorder.format_summary())
+    else:
+        count = main.export_project_records(args.dir_path, args.outputs, args.pdf_prefixes, **options)
+    print(f"Scanned {count} projects into {', '.join(args.outputs)}")
+    return EXIT_OK
+
+
+def run_write_back(args):
+    if _missing(args.dir_path, args.csv_file):
+        return EXIT_NOT_FOUND
+    import main
+    written = main.update_readme_files_from_csv(args.dir_path, args.csv_file)
+    print(f"Updated {written} README.md files")
+    return EXIT_OK
+
+
+def run_export(args):
+    if _missing(args.source):
+        return EXIT_NOT_FOUND
+    import main
+    headers, rows = main.read_csv_rows(args.source)
+    outputs = [main.output_sink(output) for output in args.outputs]
+    try:
+        for output in outputs:
+            output.open(headers)
+        for row in rows:
+            for output in outputs:
+                output.write(row)
+    finally:
+        for output in outputs:
+            output.close()
+    print(f"Exported {len(rows)} projects into {', '.join(args.outputs)}")
+    return EXIT_OK
+
+
+def run_merge(args):
+    if _missing(*args.partials):
+        return EXIT_NOT_FOUND
+    import sharding
+    report = sharding.merge_partials(args.partials, args.output)
+    for line in report.lines():
+        print(line)
+    # The merged output is written either way, but a cron job should notice gaps and conflicts
+    return EXIT_OK if report.clean else EXIT_FAILURE
+
+
+def run_summary(args):
+    if _missing(args.source):
+        return EXIT_NOT_FOUND
+    import aggregation
+    stale_days = aggregation.DEFAULT_STALE_DAYS if args.stale_days is None else args.stale_days
+    summary = aggregation.summarize_file(args.source, stale_days=stale_days)
+    for line in summary.lines():
+        print(line)
+    if args.output:
+        aggregation.write_summary(summary, args.output)
+    return EXIT_OK
+
+
+def run_watch(args):
+    if _missing(args.dir_path):
+        return EXIT_NOT_FOUND
+    import watcher
+    watcher.watch(args.dir_path, args.output, args.pdf_prefixes, args.write_readme, args.branches,
+                  debounce=args.debounce, interval=args.interval, polling=args.polling)
+    return EXIT_OK
+
+
+COMMANDS = {'scan': run_scan, 'write-back': run_write_back, 'export': run_export, 'merge': run_merge,
+            'summary': run_summary, 'watch': run_watch}
+
+
+def run(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return COMMANDS[args.command](args)
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    except (OSError, ValueError, ImportError, sqlite3.Error) as e:
+        # Unwritable outputs, unknown output formats, empty CSVs or CSVs without a Status column, partials
+        # that cannot be merged, optional dependencies (xlsxwriter, pyarrow, watchdog) that are not installed
+        print(f"{args.command} failed: {e}", file=sys.stderr)
+        return EXIT_FAILURE
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,118 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+from file_keys import fast_key
+
+# What a project's Data Model workbook holds: its sheet names, how many variables it defines
+# and whether it is still the unfilled template (variables listed, or none at all, but no
+# description, type or other detail column filled in).
+#
+# Workbooks are opened with openpyxl in read-only mode, which streams the sheet XML instead
+# of building every cell in memory, and only the variables sheet is read: the first rows to
+# find the header, then just the columns between the variable name and the last detail
+# column. Results are kept per file fingerprint (device, inode, size, mtime), so a workbook
+# is read once per process however many times it is asked for; across runs the scan cache
+# keeps the rows of unchanged folders (see main.ScanCache).
+
+# Header of the variable name column (compared case-insensitively)
+VARIABLE_HEADERS = ('variable', 'variables', 'nom variable', 'nom de la variable', 'variable name', 'nom', 'name')
+# Rows searched for that header
+HEADER_ROWS = 10
+MAX_ENTRIES = 4096
+
+
+@dataclass
+class DataModelInspection:
+    sheets: list = field(default_factory=list)
+    variables: Optional[int] = None
+    template: Optional[bool] = None
+    error: Optional[str] = None  # why the workbook could not be read, if it could not
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _variables_sheet(workbook):
+    # The sheet named like "Variables", else the first one
+    for name in workbook.sheetnames:
+        if 'variable' in name.casefold():
+            return workbook[name]
+    return workbook.worksheets[0]
+
+
+def _count_variables(sheet):
+    # Returns (variables, whether any detail cell is filled), or None without a variable header
+    sheet.reset_dimensions()  # the stored dimensions of hand-edited workbooks are often wrong
+    for number, row in enumerate(sheet.iter_rows(max_row=HEADER_ROWS, values_only=True), 1):
+        names = [_text(value).casefold() for value in row]
+        name_column = next((i for i, name in enumerate(names) if name in VARIABLE_HEADERS), None)
+        if name_column is not None:
+            break
+    else:
+        return None
+    detail_columns = [i for i, name in enumerate(names) if name and i != name_column]
+    first = min([name_column] + detail_columns)
+    last = max([name_column] + detail_columns)
+    variables = 0
+    filled = False
+    for row in sheet.iter_rows(min_row=number + 1, min_col=first + 1, max_col=last + 1, values_only=True):
+        if len(row) <= name_column - first or not _text(row[name_column - first]):
+            continue
+        variables += 1
+        if not filled:
+            filled = any(_text(row[i - first]) for i in detail_columns if i - first < len(row))
+    return variables, filled
+
+
+def inspect_workbook(path):
+    """Read the sheet names, variable count and template state of a Data Model workbook."""
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImportError("Data Model details require the openpyxl package (pip install openpyxl)")
+    try:
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    except Exception as e:
+        # Not a zip, not a workbook, password protected, ...
+        return DataModelInspection(error=str(e))
+    try:
+        inspection = DataModelInspection(sheets=list(workbook.sheetnames))
+        counted = _count_variables(_variables_sheet(workbook))
+        if counted is None:
+            inspection.error = f"No variable column header in the first {HEADER_ROWS} rows"
+        else:
+            inspection.variables, filled = counted
+            inspection.template = not filled
+        return inspection
+    except Exception as e:
+        return DataModelInspection(error=str(e))
+    finally:
+        workbook.close()
+
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def inspect_data_model(path):
+    """inspect_workbook(path), cached by the file's fingerprint; errors are printed like the PDF checks do."""
+    try:
+        key = fast_key(os.stat(path))
+    except OSError as e:
+        return DataModelInspection(error=str(e))
+    with _lock:
+        inspection = _cache.get(key)
+        if inspection is not None:
+            _cache.move_to_end(key)
+            return inspection
+    inspection = inspect_workbook(path)
+    if inspection.error is not None:
+        print(f"Could not inspect Data Model at {path}. Exception: {inspection.error}. Skipping...")
+    with _lock:
+        _cache[key] = inspection
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return inspection
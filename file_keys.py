@@ -0,0 +1,9 @@
+# Keys of a file's state, for the per-file caches (PDF inspections, Data Model workbooks).
+#
+# A key is built from an os.stat() result alone, so a cache lookup costs one stat: while
+# the key matches, the file is taken to be unchanged and nothing is read or parsed again.
+
+
+def fast_key(stat):
+    """Key of a file's state from os.stat(): a changed device, inode, size or mtime gives a new key."""
+    return f'{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}'
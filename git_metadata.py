@@ -0,0 +1,516 @@
+import glob
+import heapq
+import mmap
+import os
+import struct
+import subprocess
+import time
+import zlib
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Optional
+import instrumentation
+
+# Reads the tip commit of a project repository straight from .git: HEAD and refs
+# (loose or packed-refs), then the commit object from a loose object file or a
+# pack. No Repo object is built and no git process is spawned per folder.
+
+_OBJ_COMMIT = 1
+_OBJ_OFS_DELTA = 6
+_OBJ_REF_DELTA = 7
+_IDX_MAGIC = b'\377tOc'
+
+# Branches tried when HEAD does not resolve (e.g. unborn default branch)
+FALLBACK_BRANCHES = ['master', 'main']
+
+
+class InvalidGitRepositoryError(Exception):
+    """The folder has no readable git directory."""
+
+
+class ObjectNotFound(Exception):
+    pass
+
+
+def find_git_dir(repo_path: str) -> str:
+    git_path = os.path.join(repo_path, '.git')
+    if os.path.isfile(git_path):
+        # Worktrees and submodules point at their git directory with "gitdir: <path>"
+        with open(git_path, 'r', encoding='utf-8') as f:
+            pointer = f.read().strip()
+        if pointer.startswith('gitdir:'):
+            return os.path.join(repo_path, pointer[len('gitdir:'):].strip())
+    return git_path
+
+
+def _common_dir(git_dir):
+    # Linked worktrees keep refs and objects in the main repository's git directory
+    try:
+        with open(os.path.join(git_dir, 'commondir'), 'r', encoding='utf-8') as f:
+            return os.path.join(git_dir, f.read().strip())
+    except FileNotFoundError:
+        return git_dir
+
+
+def read_packed_refs(git_dir: str) -> dict:
+    refs = {}
+    try:
+        with open(os.path.join(_common_dir(git_dir), 'packed-refs'), 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith(('#', '^')):
+                    continue
+                parts = line.split()
+                if len(parts) == 2:
+                    refs[parts[1]] = parts[0]
+    except FileNotFoundError:
+        pass
+    return refs
+
+
+def resolve_ref(git_dir: str, ref: str, packed_refs: dict = None) -> Optional[str]:
+    """Resolve a ref name (or symbolic ref chain) to a commit SHA, None if it does not exist."""
+    for _ in range(10):
+        for base in (git_dir, _common_dir(git_dir)):
+            try:
+                with open(os.path.join(base, ref), 'r', encoding='utf-8') as f:
+                    value = f.read().strip()
+                break
+            except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+                value = None
+        if value is None:
+            if packed_refs is None:
+                packed_refs = read_packed_refs(git_dir)
+            return packed_refs.get(ref)
+        if not value.startswith('ref:'):
+            return value
+        ref = value[len('ref:'):].strip()
+    return None
+
+
+def read_head(git_dir: str) -> Optional[str]:
+    try:
+        with open(os.path.join(git_dir, 'HEAD'), 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def head_signature(repo_path: str) -> Optional[str]:
+    """The checked out ref and its SHA, e.g. 'refs/heads/main 1a2b...', for change detection."""
+    git_dir = find_git_dir(repo_path)
+    head = read_head(git_dir)
+    if head is None or not head.startswith('ref:'):
+        return head
+    ref = head[len('ref:'):].strip()
+    return f'{ref} {resolve_ref(git_dir, ref)}'
+
+
+def resolve_tip(repo_path: str, branches: list = None):
+    """
+    Return (git_dir, sha) of the commit to report for a repository.
+
+    With branches, the first existing refs/heads/<branch> wins. Otherwise HEAD is used,
+    falling back to FALLBACK_BRANCHES when HEAD points at an unborn branch.
+    """
+    git_dir = find_git_dir(repo_path)
+    if read_head(git_dir) is None:
+        raise InvalidGitRepositoryError(repo_path)
+    packed_refs = read_packed_refs(git_dir)
+    sha = None
+    if not branches:
+        sha = resolve_ref(git_dir, 'HEAD', packed_refs)
+    for branch in branches or FALLBACK_BRANCHES:
+        if sha is not None:
+            break
+        sha = resolve_ref(git_dir, f'refs/heads/{branch}', packed_refs)
+    return git_dir, sha
+
+
+def _read_loose_object(objects_dir, sha):
+    try:
+        with open(os.path.join(objects_dir, sha[:2], sha[2:]), 'rb') as f:
+            raw = zlib.decompress(f.read())
+    except FileNotFoundError:
+        return None
+    header, _, body = raw.partition(b'\0')
+    kind, _ = header.split(b' ', 1)
+    return kind.decode('ascii'), body
+
+
+class _Pack:
+    def __init__(self, idx_path):
+        self.idx_path = idx_path
+        self.pack_path = idx_path[:-4] + '.pack'
+        with open(idx_path, 'rb') as f:
+            self.idx = f.read()
+        if self.idx[:4] != _IDX_MAGIC or struct.unpack('>I', self.idx[4:8])[0] != 2:
+            raise ObjectNotFound(f'unsupported pack index {idx_path}')
+        self.fanout = struct.unpack('>256I', self.idx[8:8 + 1024])
+        self.count = self.fanout[255]
+        self._pack_file = None
+        self.pack = None
+
+    def find(self, binsha):
+        lo = self.fanout[binsha[0] - 1] if binsha[0] else 0
+        hi = self.fanout[binsha[0]]
+        names = 8 + 1024
+        while lo < hi:
+            mid = (lo + hi) // 2
+            name = self.idx[names + mid * 20:names + mid * 20 + 20]
+            if name < binsha:
+                lo = mid + 1
+            elif name > binsha:
+                hi = mid
+            else:
+                return self._offset(mid)
+        return None
+
+    def _offset(self, index):
+        offsets = 8 + 1024 + self.count * 24
+        offset = struct.unpack('>I', self.idx[offsets + index * 4:offsets + index * 4 + 4])[0]
+        if offset & 0x80000000:
+            large = offsets + self.count * 4 + (offset & 0x7FFFFFFF) * 8
+            offset = struct.unpack('>Q', self.idx[large:large + 8])[0]
+        return offset
+
+    def open(self):
+        if self.pack is None:
+            self._pack_file = open(self.pack_path, 'rb')
+            self.pack = mmap.mmap(self._pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.pack
+
+    def close(self):
+        if self.pack is not None:
+            self.pack.close()
+            self._pack_file.close()
+            self.pack = None
+
+
+def _inflate(data, pos):
+    decompressor = zlib.decompressobj()
+    out = []
+    while not decompressor.eof:
+        chunk = data[pos:pos + 16384]
+        if not chunk:
+            raise ObjectNotFound('truncated pack entry')
+        out.append(decompressor.decompress(chunk))
+        pos += 16384
+    return b''.join(out)
+
+
+def _delta_size(delta, pos):
+    size = shift = 0
+    while True:
+        byte = delta[pos]
+        pos += 1
+        size |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return size, pos
+
+
+def _apply_delta(base, delta):
+    _, pos = _delta_size(delta, 0)
+    _, pos = _delta_size(delta, pos)
+    out = bytearray()
+    while pos < len(delta):
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            offset = size = 0
+            for i in range(4):
+                if op & (1 << i):
+                    offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if op & (1 << (4 + i)):
+                    size |= delta[pos] << (8 * i)
+                    pos += 1
+            out += base[offset:offset + (size or 0x10000)]
+        elif op:
+            out += delta[pos:pos + op]
+            pos += op
+        else:
+            raise ObjectNotFound('invalid delta opcode')
+    return bytes(out)
+
+
+class ObjectStore:
+    """Loose and packed objects of one repository."""
+    # Delta bases kept once reconstructed: the objects of a history share long delta chains,
+    # which would otherwise be inflated and applied again for every object built on them
+    BASE_CACHE_ENTRIES = 256
+    BASE_CACHE_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, git_dir):
+        self.objects_dir = os.path.join(_common_dir(git_dir), 'objects')
+        self._packs = None
+        self._bases = OrderedDict()  # (pack, offset) -> (kind, body), least recently used first
+        self._bases_size = 0
+
+    def packs(self):
+        if self._packs is None:
+            self._packs = []
+            for idx_path in sorted(glob.glob(os.path.join(self.objects_dir, 'pack', '*.idx'))):
+                try:
+                    self._packs.append(_Pack(idx_path))
+                except (OSError, ObjectNotFound, struct.error):
+                    continue
+        return self._packs
+
+    def read(self, sha: str):
+        """Return (type name, body) of an object."""
+        loose = _read_loose_object(self.objects_dir, sha)
+        if loose is not None:
+            return loose
+        binsha = bytes.fromhex(sha)
+        for pack in self.packs():
+            offset = pack.find(binsha)
+            if offset is not None:
+                kind, body = self._read_packed(pack, offset)
+                return {1: 'commit', 2: 'tree', 3: 'blob', 4: 'tag'}[kind], body
+        raise ObjectNotFound(sha)
+
+    def _read_packed(self, pack, offset):
+        data = pack.open()
+        byte = data[offset]
+        kind = (byte >> 4) & 7
+        pos = offset + 1
+        while byte & 0x80:
+            byte = data[pos]
+            pos += 1
+        if kind == _OBJ_OFS_DELTA:
+            byte = data[pos]
+            pos += 1
+            distance = byte & 0x7F
+            while byte & 0x80:
+                byte = data[pos]
+                pos += 1
+                distance = ((distance + 1) << 7) | (byte & 0x7F)
+            base_kind, base = self._read_base(pack, offset - distance)
+            return base_kind, _apply_delta(base, _inflate(data, pos))
+        if kind == _OBJ_REF_DELTA:
+            base_name, body = self.read(data[pos:pos + 20].hex())
+            base_kind = {'commit': 1, 'tree': 2, 'blob': 3, 'tag': 4}[base_name]
+            return base_kind, _apply_delta(body, _inflate(data, pos + 20))
+        return kind, _inflate(data, pos)
+
+    def _read_base(self, pack, offset):
+        key = (pack.pack_path, offset)
+        cached = self._bases.get(key)
+        if cached is not None:
+            self._bases.move_to_end(key)
+            return cached
+        cached = self._read_packed(pack, offset)
+        if len(cached[1]) <= self.BASE_CACHE_BYTES // 4:
+            self._bases[key] = cached
+            self._bases_size += len(cached[1])
+            while len(self._bases) > self.BASE_CACHE_ENTRIES or self._bases_size > self.BASE_CACHE_BYTES:
+                self._bases_size -= len(self._bases.popitem(last=False)[1][1])
+        return cached
+
+    def close(self):
+        for pack in self._packs or []:
+            pack.close()
+        self._bases.clear()
+        self._bases_size = 0
+
+
+def parse_commit(body: bytes):
+    """Return (committer timestamp, author email, subject) of a raw commit object."""
+    header, _, message = body.partition(b'\n\n')
+    encoding = 'utf-8'
+    author_email = None
+    committed = None
+    for line in header.split(b'\n'):
+        if line.startswith(b'author '):
+            author_email = line[line.index(b'<') + 1:line.index(b'>')]
+        elif line.startswith(b'committer '):
+            committed = int(line[line.index(b'>') + 1:].split()[0])
+        elif line.startswith(b'encoding '):
+            encoding = line[len('encoding '):].decode('ascii', 'replace')
+    try:
+        text = message.decode(encoding, 'replace')
+        email = author_email.decode(encoding, 'replace') if author_email is not None else None
+    except LookupError:
+        text = message.decode('utf-8', 'replace')
+        email = author_email.decode('utf-8', 'replace') if author_email is not None else None
+    subject = text.strip().split('\n', 1)[0].strip()
+    return committed, email, subject
+
+
+def last_commit_info(repo_path: str, branches: list = None):
+    """
+    Return (commit date 'YYYY-MM-DD' in UTC, author email, subject) of the tip commit.
+
+    Raises InvalidGitRepositoryError for folders without a git directory. Repositories
+    without commits return (None, None, None).
+    """
+    git_dir, sha = resolve_tip(repo_path, branches)
+    if sha is None:
+        return None, None, None
+    store = ObjectStore(git_dir)
+    try:
+        kind, body = store.read(sha)
+        instrumentation.count(bytes_read=len(body), files=1)
+        while kind == 'tag':
+            # Annotated tag checked out as detached HEAD
+            sha = body.split(b'\n', 1)[0].split()[1].decode('ascii')
+            kind, body = store.read(sha)
+    finally:
+        store.close()
+    committed, email, subject = parse_commit(body)
+    date = datetime.fromtimestamp(committed, timezone.utc).strftime('%Y-%m-%d') if committed is not None else None
+    return date, email, subject
+
+
+# Activity metrics: one pass over the history of the tip commit, aggregated on the fly in
+# bounded memory: running counters, the set of author emails, and commits per UTC day for the
+# days inside the widest window (at most max(ACTIVITY_WINDOWS) + 1 counters). A window of N
+# days is the N days ending on the day the metrics are reported, so metrics cached for an
+# unchanged tip stay right as time goes by.
+#
+# Merges reach commits twice. Instead of remembering every commit visited, the history is
+# walked newest first (by committer date, clamped so that no commit sorts before one of its
+# descendants) and only the commits done within ACTIVITY_SLOP of the walk's current date are
+# remembered, besides the ones queued. Like git's own date-ordered walks this is exact unless
+# a committer clock ran more than ACTIVITY_SLOP behind a merged parent's.
+ACTIVITY_WINDOWS = (30, 90)  # days
+_DAY = 24 * 60 * 60
+ACTIVITY_SLOP = 7 * _DAY
+
+
+def _commit_header(body):
+    # (parents, committer timestamp, author email) without decoding the message
+    end = body.find(b'\n\n')
+    parents = []
+    committed = email = None
+    for line in (body if end < 0 else body[:end]).split(b'\n'):
+        if line.startswith(b'parent '):
+            parents.append(line[7:].decode('ascii'))
+        elif line.startswith(b'author '):
+            email = line[line.index(b'<') + 1:line.index(b'>')]
+        elif line.startswith(b'committer '):
+            committed = int(line[line.index(b'>') + 1:].split()[0])
+    return parents, committed, email
+
+
+class _ActivityCounter:
+    def __init__(self, head, now):
+        self.head = head
+        self.since_day = int(now // _DAY) - max(ACTIVITY_WINDOWS)
+        self.commits = 0
+        self.authors = set()
+        self.first_commit = None
+        self.days = {}  # UTC day number -> commits, for the days inside the widest window
+
+    def add(self, committed, email):
+        self.commits += 1
+        if email is not None:
+            self.authors.add(email.strip().lower())
+        if committed is not None:
+            if self.first_commit is None or committed < self.first_commit:
+                self.first_commit = committed
+            day = committed // _DAY
+            if day > self.since_day:
+                self.days[day] = self.days.get(day, 0) + 1
+
+    def result(self):
+        return {'head': self.head, 'commits': self.commits, 'authors': len(self.authors),
+                'first_commit': self.first_commit, 'recent': sorted(self.days.items(), reverse=True)}
+
+
+def _shallow_commits(git_dir):
+    try:
+        with open(os.path.join(_common_dir(git_dir), 'shallow'), 'r', encoding='ascii') as f:
+            return {line.strip() for line in f if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def _read_commit(store, sha):
+    kind, body = store.read(sha)
+    while kind == 'tag':
+        kind, body = store.read(body.split(b'\n', 1)[0].split()[1].decode('ascii'))
+    instrumentation.count(bytes_read=len(body), files=1)
+    return _commit_header(body)
+
+
+def activity(repo_path: str, branches: list = None, known: dict = None, now: float = None):
+    """
+    Return the activity metrics of the tip commit's history, see activity_summary().
+
+    known is a previous result for this repository; when the tip is still known['head']
+    it is returned without reading any commit. Raises InvalidGitRepositoryError like
+    last_commit_info(), and ObjectNotFound for object stores that cannot be read
+    directly (activity_from_git_log() handles those).
+    """
+    git_dir, sha = resolve_tip(repo_path, branches)
+    if known is not None and known.get('head') == sha:
+        return known
+    counter = _ActivityCounter(sha, time.time() if now is None else now)
+    if sha is None:
+        return counter.result()
+    shallow = _shallow_commits(git_dir)
+    store = ObjectStore(git_dir)
+    # Heap of (-clamped date, sha, parents); queued and done hold what is in it and what
+    # left it within ACTIVITY_SLOP of the current date
+    heap = []
+    queued = set()
+    done = set()
+    done_order = deque()
+
+    def push(commit, limit):
+        if commit in queued or commit in done:
+            return
+        parents, committed, email = _read_commit(store, commit)
+        counter.add(committed, email)
+        key = limit if committed is None or (limit is not None and committed > limit) else committed
+        heapq.heappush(heap, (-(key or 0), commit, () if commit in shallow else parents))
+        queued.add(commit)
+
+    try:
+        push(sha, None)
+        while heap:
+            key, commit, parents = heapq.heappop(heap)
+            current = -key
+            queued.discard(commit)
+            done.add(commit)
+            done_order.append((current, commit))
+            while done_order[0][0] > current + ACTIVITY_SLOP:
+                done.discard(done_order.popleft()[1])
+            for parent in parents:
+                push(parent, current)
+    finally:
+        store.close()
+    return counter.result()
+
+
+def activity_from_git_log(repo_path: str, branches: list = None, now: float = None):
+    """activity() through one streamed `git log` process, for object stores git_metadata cannot read."""
+    git_dir, sha = resolve_tip(repo_path, branches)
+    counter = _ActivityCounter(sha, time.time() if now is None else now)
+    if sha is None:
+        return counter.result()
+    with subprocess.Popen(['git', '-C', repo_path, 'log', '--format=%ct %ae', sha], stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL) as process:
+        for line in process.stdout:
+            committed, _, email = line.rstrip(b'\n').partition(b' ')
+            counter.add(int(committed), email)
+    if process.returncode:
+        raise ObjectNotFound(f'git log failed in {repo_path}')
+    return counter.result()
+
+
+def activity_summary(metrics: dict, now: float = None):
+    """
+    Return (commits, commits in each ACTIVITY_WINDOWS, distinct authors, first commit date 'YYYY-MM-DD' UTC).
+
+    A window of N days holds the commits of the N UTC days ending on the day of now, so cached
+    metrics can be reported later.
+    """
+    today = int((time.time() if now is None else now) // _DAY)
+    windows = tuple(sum(count for day, count in metrics['recent'] if day > today - days) for days in ACTIVITY_WINDOWS)
+    first = metrics['first_commit']
+    first = datetime.fromtimestamp(first, timezone.utc).strftime('%Y-%m-%d') if first is not None else None
+    return (metrics['commits'],) + windows + (metrics['authors'], first)
@@ -0,0 +1,190 @@
+import contextlib
+import cProfile
+import json
+import math
+import threading
+import time
+
+# Optional per-repository, per-stage instrumentation of the scans.
+#
+# The scan pipeline marks its stages with `with instrumentation.stage('readme'):` and
+# reports work with instrumentation.count(bytes_read=..., files=...). While no
+# ScanRecorder is active both are a global lookup and a shared no-op context manager,
+# so leaving the calls in place costs nothing measurable.
+#
+#     with ScanRecorder(log_path='scan-log.jsonl', profile_path='scan.prof') as recorder:
+#         main.scan_repos_and_create_csv_no_write(dir_path, csv_file)
+#     print(recorder.format_summary())
+#
+# Stages may nest (the 'pdf' checks run inside the 'walk' that finds the files); each stage
+# is charged its own time only, so the stage totals add up to the repository time.
+#
+# Stages are recorded in the process that runs them, so with executor='process' the work
+# done in the worker processes is not collected.
+
+_recorder = None
+_NULL = contextlib.nullcontext()
+
+
+class _RepoStats:
+    def __init__(self, folder):
+        self.folder = folder
+        self.wall = 0.0
+        self.stages = {}
+
+    def stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = {'seconds': 0.0, 'bytes_read': 0, 'files': 0}
+        return self.stages[name]
+
+    def to_dict(self):
+        return {'folder': self.folder, 'seconds': round(self.wall, 6),
+                'stages': {name: dict(stats, seconds=round(stats['seconds'], 6)) for name, stats in self.stages.items()}}
+
+
+def _percentile(values, fraction):
+    # Nearest-rank percentile of a non-empty list
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class ScanRecorder:
+    """
+    Collects wall time, bytes read and files visited per repository and per stage.
+
+    Args:
+        log_path (str): Optional JSON lines file receiving one line per scanned repository.
+        profile_path (str): Optional file receiving a cProfile dump of the whole recording.
+    """
+
+    def __init__(self, log_path=None, profile_path=None):
+        self.log_path = log_path
+        self.profile_path = profile_path
+        self.repos = []
+        self.started = None
+        self.wall = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._log = None
+        self._profile = None
+
+    def __enter__(self):
+        global _recorder
+        if self.log_path:
+            self._log = open(self.log_path, 'w', encoding='utf-8')
+        if self.profile_path:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self.started = time.perf_counter()
+        _recorder = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _recorder
+        _recorder = None
+        self.wall = time.perf_counter() - self.started
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.profile_path)
+        if self._log is not None:
+            self._log.write(json.dumps({'event': 'summary', **self.summary()}, ensure_ascii=False) + '\n')
+            self._log.close()
+
+    @contextlib.contextmanager
+    def repo(self, folder):
+        repo = _RepoStats(folder)
+        self._local.repo = repo
+        self._local.stages = []
+        self._local.nested = []
+        start = time.perf_counter()
+        try:
+            yield repo
+        finally:
+            repo.wall = time.perf_counter() - start
+            self._local.repo = None
+            if not repo.stages:
+                # Not a project folder (loose file at the root)
+                return
+            with self._lock:
+                self.repos.append(repo)
+                if self._log is not None:
+                    self._log.write(json.dumps({'event': 'repo', **repo.to_dict()}, ensure_ascii=False) + '\n')
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        repo = getattr(self._local, 'repo', None)
+        if repo is None:
+            yield
+            return
+        stats = repo.stage(name)
+        self._local.stages.append(stats)
+        self._local.nested.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._local.stages.pop()
+            stats['seconds'] += elapsed - self._local.nested.pop()
+            if self._local.nested:
+                self._local.nested[-1] += elapsed
+
+    def count(self, bytes_read=0, files=0):
+        stages = getattr(self._local, 'stages', None)
+        if stages:
+            stages[-1]['bytes_read'] += bytes_read
+            stages[-1]['files'] += files
+
+    def summary(self, top=10):
+        """Totals and p50/p95 per stage, and the slowest repositories."""
+        stages = {}
+        for repo in self.repos:
+            for name, stats in repo.stages.items():
+                stages.setdefault(name, []).append(stats)
+        return {
+            'seconds': round(self.wall, 6),
+            'repos': len(self.repos),
+            'stages': {name: {'seconds': round(sum(s['seconds'] for s in values), 6),
+                              'bytes_read': sum(s['bytes_read'] for s in values),
+                              'files': sum(s['files'] for s in values),
+                              'p50': round(_percentile([s['seconds'] for s in values], 0.50), 6),
+                              'p95': round(_percentile([s['seconds'] for s in values], 0.95), 6)}
+                       for name, values in stages.items()},
+            'slowest': [repo.to_dict() for repo in sorted(self.repos, key=lambda repo: repo.wall, reverse=True)[:top]],
+        }
+
+    def format_summary(self, top=10):
+        summary = self.summary(top)
+        lines = [f"Scanned {summary['repos']} repositories in {summary['seconds']:.2f} s", '',
+                 f"{'Stage':12} {'Total s':>9} {'p50 ms':>9} {'p95 ms':>9} {'Files':>8} {'MB read':>9}"]
+        for name, stats in sorted(summary['stages'].items(), key=lambda item: -item[1]['seconds']):
+            lines.append(f"{name:12} {stats['seconds']:9.3f} {stats['p50'] * 1000:9.2f} {stats['p95'] * 1000:9.2f} "
+                         f"{stats['files']:8} {stats['bytes_read'] / 1e6:9.2f}")
+        lines += ['', 'Slowest repositories:']
+        for repo in summary['slowest']:
+            slowest_stage = max(repo['stages'].items(), key=lambda item: item[1]['seconds'], default=(None, None))[0]
+            lines.append(f"  {repo['folder']:40} {repo['seconds'] * 1000:9.1f} ms  (mostly {slowest_stage})")
+        return '\n'.join(lines)
+
+
+def active():
+    return _recorder is not None
+
+
+def repo(folder):
+    """Attribute the stages run inside to folder."""
+    recorder = _recorder
+    return _NULL if recorder is None else recorder.repo(folder)
+
+
+def stage(name):
+    """Time the block as stage name of the current repository."""
+    recorder = _recorder
+    return _NULL if recorder is None else recorder.stage(name)
+
+
+def count(bytes_read=0, files=0):
+    """Add work done to the innermost running stage."""
+    recorder = _recorder
+    if recorder is not None:
+        recorder.count(bytes_read, files)
@@ -1,524 +1,1097 @@
 import os
 import csv
-import git as git
-from pdfreader import SimplePDFViewer
+import data_model
+import git_metadata
+import pdf_cache
+import instrumentation
+import sharding
+import text_decoding
+import tree_walk
+from sinks import CsvSink, sink_for_path
+from project_index import ProjectIndex, is_index_path
+from pdf_signature import is_pdf_signed, inspect_signatures
 import re
-from datetime import datetime
-from git import exc
+from datetime import datetime, timezone
 from typing import Optional
-import chardet
+from dataclasses import dataclass, field, asdict
+import functools
+import io
+import shutil
+import tempfile
+import hashlib
+import json
+import concurrent.futures
+import contextlib
+from collections import deque
+
+@dataclass(frozen=True)
+class ReadmeField:
+    """
+    One field of the "Dades del projecte" section of README.md.
+
+    Args:
+        label (str): The label as written in the README, also the key of ReadmeRecord.get().
+        pattern (str): Regex of the label (case-insensitive), tolerating variants like a mangled middle dot.
+            None for the Status, which is the line after README_STATUS_HEADER.
+        attribute (str): ProjectRecord attribute receiving the value.
+        header (str): Output column among the leading columns. Fields without one hold a document's
+            filename and get a trailing column named like their attribute.
+    """
+    label: str
+    pattern: Optional[str]
+    attribute: str
+    header: Optional[str] = None
+
+
+README_STATUS_HEADER = '### Status'
+
+# Every README field a scan reads, in output column order. Document rules write the detected
+# filenames back to the lines of the fields they name (DocumentRule.readme_field).
+README_FIELDS = [
+    ReadmeField('- Codi:', r'- Codi:', 'codi', "Codi"),
+    ReadmeField(README_STATUS_HEADER, None, 'status', "Status"),
+    ReadmeField('- Nom:', r'- Nom:', 'nom', "Sol·licitant"),
+    ReadmeField('- Correu:', r'- Correu:', 'email', "Correu"),
+    ReadmeField('- Data inici:', r'- Data inici:', 'data_inici', "Data Inici"),
+    ReadmeField('- Data Model:', r'- Data Model:', 'data_model'),
+    ReadmeField('- Dictamen CEIB:', r'- Dictamen CEIB?:', 'dictamen_cei'),
+    ReadmeField('- Sol·licitud:', r'- Sol.{0,2}licitud:', 'solicitud'),
+    ReadmeField('- Pressupost:', r'- Pressupost:', 'pressupost'),
+]
+_README_FIELDS_BY_LABEL = {readme_field.label: readme_field for readme_field in README_FIELDS}
+
+_INDEXED_FIELDS = [readme_field for readme_field in README_FIELDS if readme_field.pattern is not None]
+_README_LABELS = [readme_field.label for readme_field in _INDEXED_FIELDS]
+_README_PATTERN = re.compile(
+    '|'.join(f'(?P<f{i}>{readme_field.pattern})' for i, readme_field in enumerate(_INDEXED_FIELDS)),
+    re.IGNORECASE)
+
+
+class ReadmeRecord:
+    """
+    Fields of a README.md indexed in a single pass.
+
+    Known labels (README_FIELDS) and the line following '### Status' are looked up
+    from the index; any other label falls back to a scan of the decoded lines.
+    """
+
+    def __init__(self, path, lines=None, encoding=None):
+        self.path = path
+        self.lines = lines if lines is not None else []
+        self.encoding = encoding
+        self.fields = {}
+        self.status = None
+        self._index()
+
+    @property
+    def exists(self):
+        return self.encoding is not None
+
+    def _index(self):
+        status_seen = False
+        for i, line in enumerate(self.lines):
+            if not status_seen and line.strip().lower() == README_STATUS_HEADER.lower():
+                status_seen = True
+                self.status = self.lines[i + 1].strip() if i + 1 < len(self.lines) else None
+                continue
+            match = _README_PATTERN.search(line)
+            if match:
+                label = _README_LABELS[int(match.lastgroup[1:])]
+                if label not in self.fields:
+                    self.fields[label] = line[match.end():].strip()
+
+    def get(self, field):
+        key = field.strip()
+        if key.lower() == README_STATUS_HEADER.lower():
+            return self.status
+        for label in _README_LABELS:
+            if label.lower() == key.lower():
+                return self.fields.get(label)
+        for line in self.lines:
+            if key.lower() in line.lower():
+                return line.split(':', 1)[1].strip() if ':' in line else None
+        return None
+
+
+def parse_readme(repo_path: str) -> ReadmeRecord:
+    readme_path = os.path.join(repo_path, 'README.md')
+    try:
+        text, encoding, raw = text_decoding.read_text(readme_path)
+    except FileNotFoundError:
+        print(f"{readme_path} Not Found")
+        return ReadmeRecord(readme_path)
+    instrumentation.count(bytes_read=len(raw), files=1)
+    return ReadmeRecord(readme_path, text.splitlines(), encoding)
+
+DEFAULT_PDF_PREFIXES = ['SSPT', 'PSPT']
+DICTAMEN_CEI = 'Dictamen_CEI'
+DATA_MODEL = 'Data Model'
+
+_DATE_PATTERN = re.compile(r'\d{8}')
+
+
+@dataclass(frozen=True)
+class DocumentRule:
+    """
+    One document type searched for in every project folder.
+
+    Args:
+        key (str): Rule name, also the header of its status column.
+        pattern (str): Regex the whole filename must match.
+        dated (bool): The filename must also carry a valid YYYYMMDD date.
+        needs_codi (bool): The filename must contain the project's Codi.
+        check_signature (bool): Matches are reported "SIGNED" or "YES"; without it the first match is "YES".
+        status_attribute (str): ProjectRecord attribute receiving the status, whose column follows the
+            dated PDF prefixes; None puts it in pdf_statuses, with a column among the prefixes.
+        readme_field (str): Label of the README_FIELDS entry receiving the detected filename, both in
+            the record and in the README.md line.
+    """
+    key: str
+    pattern: str
+    dated: bool = False
+    needs_codi: bool = False
+    check_signature: bool = True
+    status_attribute: Optional[str] = None
+    readme_field: Optional[str] = None
+
+    @property
+    def filename_attribute(self):
+        return _README_FIELDS_BY_LABEL[self.readme_field].attribute if self.readme_field else None
+
+
+# README field receiving the filename of a dated PDF prefix; other prefixes only get a status column
+PREFIX_FIELDS = {'SSPT': '- Sol·licitud:', 'PSPT': '- Pressupost:'}
+
+# Documents searched for besides the dated PDF prefixes. A new document type is one more
+# rule here: it is classified by the same compiled pattern during the same walk.
+DOCUMENT_RULES = [
+    DocumentRule(DICTAMEN_CEI, r'.*Dictamen_CEI.*\.pdf$', status_attribute='ceim_status',
+                 readme_field='- Dictamen CEIB:'),
+    DocumentRule(DATA_MODEL, r'.*Data Model.*\.xlsx$', needs_codi=True, check_signature=False,
+                 status_attribute='data_model_status', readme_field='- Data Model:'),
+]
+
+
+def prefix_rule(prefix):
+    return DocumentRule(prefix, rf'{re.escape(prefix)}.*\d{{8}}.*\.pdf$', dated=True,
+                        readme_field=PREFIX_FIELDS.get(prefix))
+
+
+class DocumentClassifier:
+    """
+    Classifies filenames against every document rule with one precompiled pattern.
+
+    Each rule is an optional lookahead with its own group, so a single match call
+    reports all rules a filename satisfies. Dated rules (SSPT, PSPT, ...) must also
+    carry a valid YYYYMMDD date; rules that need the codi (Data Model) must contain it.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.keys = [rule.key for rule in self.rules]
+        self.pattern = re.compile(
+            '^' + ''.join(f'(?:(?=(?P<r{i}>{rule.pattern})))?' for i, rule in enumerate(self.rules)))
+
+    def classify(self, filename, codi=None):
+        groups = self.pattern.match(filename).groups()
+        matches = []
+        for rule, group in zip(self.rules, groups):
+            if group is None:
+                continue
+            if rule.dated and not _valid_date(filename):
+                continue
+            if rule.needs_codi and (codi is None or codi not in filename):
+                continue
+            matches.append(rule.key)
+        return matches
+
+
+def _valid_date(filename):
+    try:
+        datetime.strptime(_DATE_PATTERN.search(filename).group(), '%Y%m%d')
+        return True
+    except ValueError:
+        return False
+
+
+class ScanPlan:
+    """
+    The document rules of one set of PDF prefixes, compiled once and run on every folder.
+
+    Both the write and the no-write scans go through run(), which walks a folder once for
+    all rules; the README lines receiving filenames are compiled here as well, from the
+    same README_FIELDS patterns that read them.
+    """
+
+    def __init__(self, pdf_prefixes):
+        self.rules = [prefix_rule(prefix) for prefix in pdf_prefixes] + DOCUMENT_RULES
+        self.classifier = DocumentClassifier(self.rules)
+        self.readme_lines = {rule.key: re.compile('.*' + _README_FIELDS_BY_LABEL[rule.readme_field].pattern,
+                                                  re.IGNORECASE)
+                             for rule in self.rules if rule.readme_field}
+        # Rules reported in pdf_statuses, in column order
+        self.status_keys = [rule.key for rule in self.rules if rule.status_attribute is None]
+
+    def matches(self, repo_path, codi, exclude=None, max_depth=None):
+        """Yield (DirEntry, rule keys) for every file matching at least one rule, in walk order."""
+        for dirpath, relpath, dirs, files in tree_walk.walk_tree(repo_path, exclude, max_depth):
+            instrumentation.count(files=len(files))
+            for entry in files:
+                keys = self.classifier.classify(entry.name, codi)
+                if keys:
+                    yield entry, keys
+
+    def run(self, repo_path, codi, keys=None, exclude=None, max_depth=None):
+        """
+        Walk a repository until every rule in keys has its final answer, and return them.
+
+        A signature-checked rule's search ends with its first SIGNED file, so a signed
+        document anywhere in the walk beats an unsigned one found before it. Other rules
+        end with their first match. The walk stops as soon as no rule is still searching.
+        Rules not in keys (default: all) are reported as "NO".
+
+        Returns:
+            dict: rule key -> (status, path of the reported file or None).
+        """
+        results = {rule.key: ("NO", None) for rule in self.rules}
+        searching = set(self.classifier.keys if keys is None else keys)
+        if not searching:
+            return results
+        signed_rules = {rule.key for rule in self.rules if rule.check_signature}
+        for entry, matched in self.matches(repo_path, codi, exclude, max_depth):
+            for key in matched:
+                if key not in searching:
+                    continue
+                if key not in signed_rules:
+                    results[key] = ("YES", entry.path)
+                    searching.discard(key)
+                    continue
+                with instrumentation.stage('pdf'):
+                    signed = is_pdf_signed(entry.path)
+                if signed:
+                    results[key] = ("SIGNED", entry.path)
+                    searching.discard(key)
+                elif results[key][1] is None:
+                    results[key] = ("YES", entry.path)
+            if not searching:
+                return results
+        return results
+
+
+@functools.lru_cache(maxsize=None)
+def get_scan_plan(pdf_prefixes=tuple(DEFAULT_PDF_PREFIXES)):
+    return ScanPlan(pdf_prefixes)
+
+
+def _atomic_write(path, data: bytes):
+    # Write next to the target and rename over it, so readers never see a half-written file
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ReadmeEdits:
+    """
+    Pending README.md edits of one repository, applied in a single pass.
+
+    The README is rewritten (through a temporary file and a rename, keeping its encoding
+    and line endings) only when the edits actually change its bytes.
+    """
+
+    def __init__(self, repo_path):
+        self.readme_path = os.path.join(repo_path, 'README.md')
+        self.status = None
+        self.filenames = []
+
+    def set_status(self, status):
+        self.status = status
+
+    def add_filename(self, line_pattern, file):
+        # Append file to the line matching line_pattern unless it is already there
+        self.filenames.append((line_pattern, file))
+
+    def __bool__(self):
+        return self.status is not None or bool(self.filenames)
+
+    def edit_lines(self, lines, newline='\n'):
+        lines = list(lines)
+        for line_pattern, file in self.filenames:
+            for i, line in enumerate(lines):
+                if line_pattern.match(line) and file not in line:
+                    lines[i] = line.rstrip() + ' ' + file + newline
+        if self.status is not None:
+            for i, line in enumerate(lines):
+                if line.strip() == README_STATUS_HEADER:
+                    if i + 1 >= len(lines):
+                        lines[i] = line.rstrip('\r\n') + newline
+                        lines.append(self.status + newline)
+                    elif lines[i + 1].strip() != self.status:
+                        lines[i + 1] = self.status + newline
+                    break
+            else:
+                lines[2:2] = [README_STATUS_HEADER + newline, self.status + newline, newline]
+        return lines
+
+    def apply(self):
+        """
+        Returns:
+            bool: True if README.md was rewritten.
+        """
+        if not self:
+            return False
+        try:
+            text, encoding, raw = text_decoding.read_text(self.readme_path)
+        except FileNotFoundError:
+            print(f"{self.readme_path} does not exist. Skipping...")
+            return False
+        newline = '\r\n' if '\r\n' in text else '\n'
+        text = ''.join(self.edit_lines(text.splitlines(keepends=True), newline))
+        try:
+            data = text.encode(encoding)
+        except UnicodeEncodeError:
+            data = text.encode('utf-8')
+        if data == raw:
+            return False
+        try:
+            _atomic_write(self.readme_path, data)
+        except PermissionError:
+            print(f"Do not have write permissions for {self.readme_path}. Skipping...")
+            return False
+        return True
+
 
 class Repository:
     def __init__(self, path):
         self.path = path
         self.statuses = {}
         self.last_commit_info = None
+        self.readme = None
 
-    def check_for_file(self, pattern, status_name):
+    def check_for_file(self, key, pdf_prefixes=None):
+        """
+        Set statuses[key] to the "NO", "YES" or "SIGNED" of document rule key, see ScanPlan.run().
+
+        Raises TypeError for anything but a rule key, e.g. the old check_for_file(pattern, status_name).
+        """
+        if isinstance(pdf_prefixes, str):
+            raise TypeError(f"check_for_file() takes a document rule key and a list of PDF prefixes, "
+                            f"not {pdf_prefixes!r}")
+        plan = get_scan_plan(tuple(pdf_prefixes or DEFAULT_PDF_PREFIXES))
+        keys = [rule.key for rule in plan.rules]
+        if key not in keys:
+            raise TypeError(f"check_for_file() takes a document rule key ({', '.join(keys)}), not {key!r}")
         try:
-            for dirpath, dirnames, filenames in os.walk(self.path):
-                for file in filenames:
-                    if re.match(pattern, file):
-                        self.statuses[status_name] = "YES"
-                        if is_pdf_signed(os.path.join(dirpath, file)):
-                            self.statuses[status_name] = "SIGNED"
-                        return
+            if self.readme is None:
+                self.readme = parse_readme(self.path)
+            documents = plan.run(self.path, project_codi(self.readme, self.path), [key])
+            self.statuses[key] = documents[key][0]
         except Exception as e:
             print(f"Class Repository Exception in {self.path}. Exception: {str(e)}")
 
-    def get_last_commit_info(self):
+    def get_last_commit_info(self, branches=None):
         try:
-            repo = git.Repo(self.path)
-            last_commit = list(repo.iter_commits('master', max_count=1))[0]
-            self.last_commit_info = (
-            datetime.utcfromtimestamp(last_commit.committed_date).strftime('%Y-%m-%d'),
-            last_commit.author.email, last_commit.message.strip())
-        except exc.InvalidGitRepositoryError:
+            self.last_commit_info = get_last_commit_info(self.path, branches)
+        except git_metadata.InvalidGitRepositoryError:
             print(f"{self.path} is not a Git repository. Skipping...")
             self.last_commit_info = (None, None, None)
 
     def extract_field_from_readme(self, field):
-        readme_path = os.path.join(self.path, 'README.md')
-        try:
-            with open(readme_path, 'rb') as f:
-                result = chardet.detect(f.read())
-            with open(readme_path, 'r', encoding=result['encoding']) as file:
-                lines = file.readlines()
-                for i, line in enumerate(lines):
-                    if field.lower() in line.lower():
-                        if field.lower() == '### status':
-                            return lines[i + 1].strip() if i + 1 < len(lines) else None
-                        else:
-                            return line.split(':', 1)[1].strip() if ':' in line else None
-        except UnicodeDecodeError:
-            print(f"Could not decode {readme_path} with the detected encoding.")
-        except FileNotFoundError:
-            print(f"{readme_path} Not Found")
-        return None
+        if self.readme is None:
+            self.readme = parse_readme(self.path)
+        return self.readme.get(field)
 
     def update_status_in_readme(self, status):
-        readme_path = os.path.join(self.path, 'README.md')
-        if os.path.exists(readme_path):
-            try:
-                with open(readme_path, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-                status_exists = any(line.strip() == "### Status" for line in lines)
-                if status_exists:
-                    for i, line in enumerate(lines):
-                        if line.strip() == "### Status":
-                            if status is not None:
-                                if i + 1 < len(lines):
-                                    lines[i + 1] = status + '\n\n'
-                                else:
-                                    lines.append(status + '\n\n')
-                            break
-                else:
-                    if status is not None:
-                        lines.insert(2, "### Status\n")
-                        lines.insert(3, status + '\n\n')
-                with open(readme_path, 'w', encoding='utf-8') as f:
-                    f.writelines(lines)
-            except PermissionError:
-                print(f"Do not have write permissions for {readme_path}. Skipping...")
+        edits = ReadmeEdits(self.path)
+        edits.set_status(status)
+        return edits.apply()
+
+
+def run_script(dir_entry, file_entry, write_to_readme, append_to_csv):
+    try:
+        dir_path = dir_entry.get()
+        file_path = file_entry.get()
+        if write_to_readme.get():
+            scan_repos_and_create_csv(dir_path, file_path, append_to_csv=append_to_csv.get())
         else:
-            print(f"{readme_path} does not exist. Skipping...")
+            scan_repos_and_create_csv_no_write(dir_path, file_path, append_to_csv=append_to_csv.get())
+    except Exception as e:
+        print(f"Exception occurred: {e}")
 
 
+def get_last_commit_info(repo_path: str, branches: list = None):
+    """
+    Return (date, author email, subject) of the last commit of HEAD, or of the first
+    existing branch in branches.
 
-def is_pdf_signed(file_path):
+    The commit is read straight from .git by git_metadata; GitPython is only used for
+    object stores it cannot read (alternates, unsupported pack formats), and imported then.
+    """
     try:
-        with open(file_path, 'rb') as fd:
-            viewer = SimplePDFViewer(fd)
-            if viewer.doc.is_encrypted:
-                print(f"PDF file at {file_path} is encrypted. Skipping...")
-                return False
-            acro_form = viewer.doc.catalog['AcroForm'] if 'AcroForm' in viewer.doc.catalog else None
-            return acro_form is not None and acro_form.get("SigFlags", 0) != 0
-    except Exception as e:
-        print(f"Exception occurred when checking signature in PDF file at {file_path}. Exception: {str(e)}. Skipping...")
-        return False
+        return git_metadata.last_commit_info(repo_path, branches)
+    except git_metadata.ObjectNotFound:
+        import git
+        try:
+            repo = git.Repo(repo_path)
+        except git.InvalidGitRepositoryError as e:
+            raise git_metadata.InvalidGitRepositoryError(repo_path) from e
+        try:
+            if branches:
+                # Like the fast path: no existing branch means nothing to report
+                last_commit = next((repo.heads[branch].commit for branch in branches if branch in repo.heads), None)
+            else:
+                last_commit = repo.head.commit
+        except ValueError:
+            # Unborn HEAD (no commits yet), which the fast path reports as no commit too
+            last_commit = None
+        if last_commit is None:
+            return None, None, None
+        return (datetime.fromtimestamp(last_commit.committed_date, timezone.utc).strftime('%Y-%m-%d'),
+                last_commit.author.email, last_commit.message.strip().split('\n', 1)[0])
 
-def scan_repos_and_create_csv(dir_path: str, csv_file: str, write_to_readme: bool, append_to_csv: bool):
-    mode = 'a' if append_to_csv else 'w'
-    with open(csv_file, mode, newline='', encoding='utf-8') as file:
-        writer = csv.writer(file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        headers = ['Folder', 'Codi', 'Project Status', 'Nom', 'Email', 'Data Inici', 'Last Commit Date',
-                   'Last Commit Author', 'Last Commit Message', 'SSPT Status', 'PSPT Status', 'CEIM Status',
-                   'Data Model Status', 'Data Model', 'Dictamen CEI', 'Solicitud', 'Pressupost']
-        if mode == 'w':
-            writer.writerow(headers)
-        for folder in os.listdir(dir_path):
-            try:
-                repo_path = os.path.join(dir_path, folder)
-                if os.path.isdir(repo_path):
-                    repo = Repository(repo_path)
-                    repo.check_for_file(r'^.*SSPT.*\.pdf$', 'SSPT Status')
-                    repo.check_for_file(r'^.*PSPT.*\.pdf$', 'PSPT Status')
-                    repo.check_for_file(r'^.*Dictamen_CEI.*\.pdf$', 'CEIM Status')
-                    repo.check_for_file(r'^.*Data Model.*\.xlsx$', 'Data Model Status')
-                    repo.get_last_commit_info()
-                    row = [folder, repo.extract_field_from_readme('- Codi:'), repo.extract_field_from_readme('### Status'),
-                           repo.extract_field_from_readme('- Nom:'), repo.extract_field_from_readme('- Correu:'),
-                           repo.extract_field_from_readme('- Data inici:')] + list(repo.last_commit_info) + [repo.statuses.get('SSPT Status', 'NO'), repo.statuses.get('PSPT Status', 'NO'),
-                           repo.statuses.get('CEIM Status', 'NO'), repo.statuses.get('Data Model Status', 'NO'),
-                           repo.extract_field_from_readme('- Data Model:'), repo.extract_field_from_readme('- Dictamen CEI:'),
-                           repo.extract_field_from_readme('- Sol·licitud:'), repo.extract_field_from_readme('- Pressupost:')]
-                    writer.writerow(row)
-                    if write_to_readme:
-                        repo.update_status_in_readme(repo.extract_field_from_readme('Project Status'))
-            except Exception as e:
-                print(f"Exception occurred when processing folder {folder}. Exception: {str(e)}")
-
-
-
-
-def update_readme_files_from_csv(dir_path: str, csv_file: str):
-    with open(csv_file, 'r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        headers = next(reader)
-        status_index = headers.index("Status")
-        for row in reader:
-            folder = row[0]
-            status = row[status_index]
-            repo_path = os.path.join(dir_path, folder)
-            if os.path.isdir(repo_path):
-                repo = Repository(repo_path)
-                repo.update_status_in_readme(status)
 
+def get_activity(repo_path: str, branches: list = None, known: dict = None):
+    """
+    Return git_metadata.activity() of HEAD, or of the first existing branch in branches.
 
+    Object stores git_metadata cannot read are summarised from one streamed `git log`.
+    """
+    try:
+        return git_metadata.activity(repo_path, branches, known)
+    except git_metadata.ObjectNotFound:
+        return git_metadata.activity_from_git_log(repo_path, branches)
 
 
-def run_script(dir_entry, file_entry, write_to_readme, append_to_csv):
+@dataclass
+class ProjectRecord:
+    """Everything a scan extracts from one project folder."""
+    folder: str
+    codi: Optional[str] = None
+    status: Optional[str] = None
+    nom: Optional[str] = None
+    email: Optional[str] = None
+    data_inici: Optional[str] = None
+    last_commit_date: Optional[str] = None
+    last_commit_author: Optional[str] = None
+    last_commit_msg: Optional[str] = None
+    pdf_statuses: dict = field(default_factory=dict)
+    ceim_status: Optional[str] = None
+    data_model_status: Optional[str] = None
+    data_model: Optional[str] = None
+    dictamen_cei: Optional[str] = None
+    solicitud: Optional[str] = None
+    pressupost: Optional[str] = None
+    signature_details: dict = field(default_factory=dict)  # signature column header -> value
+    activity: Optional[dict] = None  # git_metadata.activity() of the reported branch
+    data_model_details: dict = field(default_factory=dict)  # Data Model column header -> value
+
+    def to_row(self, pdf_prefixes, signature_details=False, activity=False, data_model_details=False):
+        # The 30/90 day windows are counted from now, also for records served from the scan cache
+        summary = git_metadata.activity_summary(self.activity) if activity and self.activity is not None else None
+        row = []
+        for header, source, name in record_columns(tuple(pdf_prefixes), signature_details, activity,
+                                                   data_model_details):
+            if source == 'attribute':
+                row.append(getattr(self, name))
+            elif source == 'status':
+                row.append(self.pdf_statuses.get(name))
+            elif source == 'signature':
+                row.append(self.signature_details.get(header))
+            elif source == 'data_model':
+                row.append(self.data_model_details.get(header))
+            else:
+                row.append(summary[name] if summary is not None else None)
+        return row
+
+
+# Last commit columns, after the README fields that have a header
+_COMMIT_COLUMNS = [("Last Commit Date", 'last_commit_date'), ("Last Commit Author", 'last_commit_author'),
+                   ("Last Commit msg", 'last_commit_msg')]
+
+
+# With signature details every PDF status column is followed by these, prefixed by the document
+# ("SSPT Signer"); several signatures on one PDF are joined with "; "
+_SIGNATURE_COLUMNS = [("Signer", 'signer'), ("Signed At", 'signed_at'), ("SubFilter", 'sub_filter'),
+                      ("ByteRange", 'byte_range'), ("Digest", 'digest')]
+
+
+def signature_headers(document):
+    return [f"{document} {label}" for label, name in _SIGNATURE_COLUMNS]
+
+
+# With activity metrics these follow the last commit columns
+ACTIVITY_HEADERS = (["Commits"] + [f"Commits {days}d" for days in git_metadata.ACTIVITY_WINDOWS]
+                    + ["Authors", "First Commit Date"])
+
+
+# With Data Model details these follow the Data Model column; sheet names are joined with "; "
+DATA_MODEL_HEADERS = ["Data Model Sheets", "Data Model Variables", "Data Model Template"]
+
+
+@functools.lru_cache(maxsize=None)
+def record_columns(pdf_prefixes, signature_details=False, activity=False, data_model_details=False):
+    """
+    The output columns as (header, source, name), where source is 'attribute' (ProjectRecord
+    attribute name), 'status' (pdf_statuses key name), 'signature' (signature_details by
+    header), 'data_model' (data_model_details by header) or 'activity' (index name into
+    git_metadata.activity_summary()).
+    """
+    plan = get_scan_plan(pdf_prefixes)
+    signed = {rule.key for rule in plan.rules if rule.check_signature} if signature_details else set()
+
+    def with_signature(column):
+        return [column] + [(header, 'signature', None) for header in signature_headers(column[0])
+                           if column[0] in signed]
+
+    columns = [("Folder Name", 'attribute', 'folder')]
+    columns += [(readme_field.header, 'attribute', readme_field.attribute) for readme_field in README_FIELDS
+                if readme_field.header is not None]
+    columns += [(header, 'attribute', name) for header, name in _COMMIT_COLUMNS]
+    if activity:
+        columns += [(header, 'activity', i) for i, header in enumerate(ACTIVITY_HEADERS)]
+    for key in plan.status_keys:
+        columns += with_signature((key, 'status', key))
+    # Then the document rules with a status attribute and the README fields holding filenames
+    for rule in plan.rules:
+        if rule.status_attribute is not None:
+            columns += with_signature((rule.key, 'attribute', rule.status_attribute))
+            if data_model_details and rule.key == DATA_MODEL:
+                columns += [(header, 'data_model', None) for header in DATA_MODEL_HEADERS]
+    columns += [(readme_field.attribute, 'attribute', readme_field.attribute) for readme_field in README_FIELDS
+                if readme_field.header is None]
+    return columns
+
+
+def record_headers(pdf_prefixes=None, signature_details=False, activity=False, data_model_details=False):
+    if pdf_prefixes is None:
+        pdf_prefixes = DEFAULT_PDF_PREFIXES
+    return [header for header, source, name in record_columns(tuple(pdf_prefixes), signature_details, activity,
+                                                              data_model_details)]
+
+
+def index_options():
+    """
+    ProjectIndex arguments for scan outputs: the headers stored under their ProjectRecord attribute
+    name, so the columns keep their names when a header is relabelled, and the document status
+    headers of the default scan, which are indexed.
+    """
+    pdf_prefixes = tuple(DEFAULT_PDF_PREFIXES)
+    return dict(columns={header: name for header, source, name in record_columns(pdf_prefixes)
+                         if source == 'attribute'},
+                status_columns=[rule.key for rule in get_scan_plan(pdf_prefixes).rules])
+
+
+def output_sink(path: str, root: str = None):
+    """sink_for_path(path), with index_options() and the scanned root for a project index."""
+    if is_index_path(path):
+        return ProjectIndex(path, root=root, **index_options())
+    return sink_for_path(path)
+
+
+def project_codi(readme: ReadmeRecord, repo_path: str) -> Optional[str]:
+    """The Codi of the README without the "PRISIB" prefix, else the part of the folder name after "-"."""
+    codi = readme.get("- Codi:")
+    if codi is not None:
+        return codi.replace("PRISIB", "").replace(" ", "").strip()
+    codi_parts = os.path.basename(repo_path).split("-")
+    print(f"No 'Codi' field found in README.md for {repo_path}")
+    return codi_parts[1].strip() if len(codi_parts) > 1 else None
+
+
+def scan_folder(dir_path: str, folder: str, pdf_prefixes: list = None, write_to_readme: bool = False,
+                branches: list = None, exclude: list = None, max_depth: int = None,
+                signature_details: bool = False, activity: bool = False,
+                data_model_details: bool = False) -> Optional[ProjectRecord]:
+    """
+    Scan a single project folder.
+
+    Args:
+        dir_path (str): The root directory holding the project folders.
+        folder (str): The folder name inside dir_path.
+        pdf_prefixes (list): Dated PDF prefixes to look for, defaults to DEFAULT_PDF_PREFIXES.
+        write_to_readme (bool): Whether detected document filenames are written back to README.md.
+        branches (list): Branches to report the last commit of, defaults to HEAD.
+        exclude (list): Directory globs not searched for documents, defaults to tree_walk.DEFAULT_EXCLUDES.
+        max_depth (int): How deep documents are searched for below the folder, unlimited by default.
+        signature_details (bool): Whether the signatures of the signed PDFs are inspected (signer, time,
+            SubFilter, ByteRange coverage and digest), see pdf_signature.inspect_pdf().
+        activity (bool): Whether the git history is summarised (commits, recent commits, authors, first
+            commit), see git_metadata.activity().
+        data_model_details (bool): Whether the Data Model workbook is read (sheet names, number of
+            variables, unfilled template), see data_model.inspect_workbook().
+
+    Returns:
+        ProjectRecord: The folder's record, or None if folder is not a directory. Folders that are
+        not Git repositories or cannot be read still produce a record with whatever could be collected.
+    """
+    folder = os.fsdecode(folder)
+    if not os.path.isdir(os.path.join(dir_path, folder)):
+        return None
+    return scan_repo(dir_path, folder, pdf_prefixes, write_to_readme, branches, exclude, max_depth, signature_details,
+                     activity, data_model_details)
+
+
+def scan_repo(dir_path: str, folder: str, pdf_prefixes: list = None, write_to_readme: bool = False,
+              branches: list = None, exclude: list = None, max_depth: int = None,
+              signature_details: bool = False, activity: bool = False, data_model_details: bool = False,
+              known_activity: dict = None) -> ProjectRecord:
+    """
+    scan_folder() for a folder already known to be a directory (e.g. from a DirEntry).
+
+    known_activity is the activity of a previous scan, reused if the tip commit has not moved.
+    """
+    if pdf_prefixes is None:
+        pdf_prefixes = DEFAULT_PDF_PREFIXES
+    repo_path = os.path.join(dir_path, folder)
+    record = ProjectRecord(folder)
     try:
-        dir_path = dir_entry.get()
-        file_path = file_entry.get()
-        scan_repos_and_create_csv(dir_path, file_path, write_to_readme.get(), append_to_csv.get())
-    except Exception as e:
-        print(f"Exception occurred: {e}")
+        with instrumentation.stage('readme'):
+            readme = parse_readme(repo_path)
+        for readme_field in README_FIELDS:
+            setattr(record, readme_field.attribute, readme.get(readme_field.label))
+        record.codi = codi = project_codi(readme, repo_path)
+        edits = ReadmeEdits(repo_path)
+        plan = get_scan_plan(tuple(pdf_prefixes))
+        # Without a README the signed documents are reported as "NO", so only the others are searched for
+        keys = None if readme.exists else [rule.key for rule in plan.rules if not rule.check_signature]
+        with instrumentation.stage('walk'):
+            documents = plan.run(repo_path, codi, keys, exclude, max_depth)
+        for rule in plan.rules:
+            status, path = documents[rule.key]
+            if rule.status_attribute is None:
+                record.pdf_statuses[rule.key] = status
+            else:
+                setattr(record, rule.status_attribute, status)
+            if path is not None:
+                file = os.path.basename(path)
+                if rule.readme_field is not None:
+                    setattr(record, rule.filename_attribute, file)
+                    edits.add_filename(plan.readme_lines[rule.key], file)
+            if signature_details and status == "SIGNED":
+                with instrumentation.stage('pdf'):
+                    record.signature_details.update(_signature_columns(rule.key, inspect_signatures(path)))
+        path = documents[DATA_MODEL][1]
+        if data_model_details and path is not None:
+            with instrumentation.stage('xlsx'):
+                record.data_model_details = _data_model_columns(data_model.inspect_data_model(path))
+        if write_to_readme:
+            # Write the detected filenames to the README.md file in one pass
+            with instrumentation.stage('write_back'):
+                edits.apply()
+        with instrumentation.stage('git'):
+            record.last_commit_date, record.last_commit_author, record.last_commit_msg = get_last_commit_info(
+                repo_path, branches)
+        if activity:
+            with instrumentation.stage('activity'):
+                record.activity = get_activity(repo_path, branches, known_activity)
+    except git_metadata.InvalidGitRepositoryError:
+        print(f"{folder} is not a valid Git repository. Skipping...")
+    except PermissionError:
+        print(f"Permission denied for {folder}. Skipping...")
+    return record
+
+
+def _signature_columns(document, inspection):
+    signatures = inspection.signatures or []
+    return {header: '; '.join(getattr(signature, name) or '' for signature in signatures)
+            for header, (label, name) in zip(signature_headers(document), _SIGNATURE_COLUMNS)}
 
 
-# If the repository is a git repository, we can update the README files
-def extract_field_from_readme(self, field):
-    readme_path = os.path.join(self.path, 'README.md')
+def _data_model_columns(inspection):
+    if inspection.error is not None:
+        return {}
+    return dict(zip(DATA_MODEL_HEADERS, ['; '.join(inspection.sheets), inspection.variables,
+                                         "YES" if inspection.template else "NO"]))
+
+
+def repo_fingerprint(repo_path: str, exclude: list = None, max_depth: int = None, branches: list = None):
+    """
+    Cheap fingerprint of everything a folder's row depends on.
+
+    Covers the README.md size and mtime, a signature of the directory listing (names of
+    every entry tree_walk.walk_tree() visits, plus size and mtime of candidate .pdf/.xlsx documents),
+    the checked out HEAD ref and SHA, and the SHA of the reported tip (the first existing
+    branch of branches, which need not be checked out).
+    """
     try:
-        with open(readme_path, 'rb') as f:
-            result = chardet.detect(f.read())
-        with open(readme_path, 'r', encoding=result['encoding']) as file:
-            lines = file.readlines()
-            for i, line in enumerate(lines):
-                if field in line:
-                    if field == '### Status':
-                        return lines[i + 1].strip() if i + 1 < len(lines) else None
-                    else:
-                        return line.split(':', 1)[1].strip()
-    except UnicodeDecodeError:
-        print(f"Could not decode {readme_path} with the detected encoding.")
+        st = os.stat(os.path.join(repo_path, 'README.md'))
+        readme = [st.st_mtime_ns, st.st_size]
     except FileNotFoundError:
-        print(f"{readme_path} Not Found")
-    return None
+        readme = None
+    listing = hashlib.sha1()
+    for dirpath, relpath, dirs, files in tree_walk.walk_tree(repo_path, exclude, max_depth):
+        listing.update((relpath or '.').encode('utf-8', 'surrogateescape') + b'\0')
+        for entry in files:
+            listing.update(entry.name.encode('utf-8', 'surrogateescape') + b'\0')
+            if entry.name.lower().endswith(('.pdf', '.xlsx')):
+                st = entry.stat()
+                listing.update(f'{st.st_size}:{st.st_mtime_ns}\0'.encode())
+    try:
+        tip = git_metadata.resolve_tip(repo_path, branches)[1]
+    except git_metadata.InvalidGitRepositoryError:
+        tip = None
+    return {'readme': readme, 'listing': listing.hexdigest(), 'head': git_metadata.head_signature(repo_path),
+            'tip': tip}
 
 
-def scan_repos_and_create_csv(dir_path: str, csv_file: str, pdf_prefixes: list = None, append_to_csv: bool = False):
-    if pdf_prefixes is None:
-        pdf_prefixes = ['SSPT','PSPT']
-
-    with open(csv_file, 'a' if append_to_csv else 'w', newline='',encoding='utf-8') as file:
-        writer = csv.writer(file)
-        if not append_to_csv:
-            writer.writerow(["Folder Name", "Codi", "Status", "Sol·licitant", "Correu", "Data Inici", "Last Commit Date",
-                             "Last Commit Author", "Last Commit msg"] + pdf_prefixes + ["Dictamen_CEI",
-                                                                                                  "Data Model",
-                                                                                                  "data_model",
-                                                                                                  "dictamen_cei",
-                                                                                                  "solicitud",
-                                                                                                  "pressupost"])
-        for folder in os.listdir(dir_path):
-            folder = os.fsdecode(folder)
-            repo_path = os.path.join(dir_path, folder)
-            try:
-                if os.path.isdir(repo_path):
-                    codi = extract_field_from_readme(repo_path, "- Codi:")
-                    if codi is not None:
-                        codi = codi.replace("PRISIB","").strip()  # Strip the "PRISIB" prefix
-                        codi = codi.replace(" ","").strip()  # Strip the "PRISIB" prefix
-                    else:
-                        codi_parts = os.path.basename(repo_path).split("-")
-                        if len(codi_parts) > 1:
-                            codi = codi_parts[1].strip()
-                    data_inici = extract_field_from_readme(repo_path, "- Data inici:")
-                    data_model = extract_field_from_readme(repo_path, "- Data Model:")
-                    dictamen_cei = extract_field_from_readme(repo_path, "- Dictamen CEIB:")
-                    solicitud = extract_field_from_readme(repo_path, "- Sol·licitud:")
-                    pressupost = extract_field_from_readme(repo_path, "- Pressupost:")
-                    nom = extract_field_from_readme(repo_path, "- Nom:")
-                    email = extract_field_from_readme(repo_path, "- Correu:")
-                    project_status = extract_status_from_readme(repo_path)
-                    pdf_statuses = []
-                    for prefix in pdf_prefixes:
-                        status = "NO"
-                        for dirpath, dirnames, filenames in os.walk(repo_path):
-                            for file in filenames:
-                                if prefix in file and os.path.exists(os.path.join(repo_path, 'README.md')):
-                                    if re.match(r'^' + prefix + r'.*\d{8}.*\.pdf$', file):
-                                        date_part = re.search(r'\d{8}', file).group()
-                                        try:
-                                            datetime.strptime(date_part, '%Y%m%d')
-                                            status = "YES"
-                                            if prefix == 'SSPT':
-                                                solicitud = file
-                                            if prefix == 'PSPT':
-                                                pressupost = file
-                                            if is_pdf_signed(os.path.join(dirpath, file)):
-                                                status = "SIGNED"
-                                            # Write the filename to the README.md file
-                                            with open(os.path.join(repo_path, 'README.md'), 'r', encoding='utf-8') as readme_file:
-                                                lines = readme_file.readlines()
-                                            with open(os.path.join(repo_path, 'README.md'), 'w', encoding='utf-8') as readme_file:
-                                                if prefix == 'SSPT':
-                                                    pattern = re.compile(".*- Sol.?licitud: ")
-                                                if prefix == 'PSPT':
-                                                    pattern = re.compile(".*- Pressupost: ")
-                                                for line in lines:
-                                                    if pattern.match(line) and file not in line:
-                                                        line = line.strip() + ' ' + file + '\n'
-                                                    readme_file.write(line)
-                                        except ValueError:
-                                            continue
-                        pdf_statuses.append(status)
-                    # Check for dictamen ceim file
-                    ceim_status = "NO"
-                    for dirpath, dirnames, filenames in os.walk(repo_path):
-                        for file in filenames:
-                            if re.match(r'^.*Dictamen_CEI.*\.pdf$', file) and os.path.exists(os.path.join(repo_path, 'README.md')):
-                                ceim_status = "YES"
-                                dictamen_cei = file
-                                if is_pdf_signed(os.path.join(dirpath, file)):
-                                    ceim_status = "SIGNED"
-                                    # Write the filename to the README.md file
-                                with open(os.path.join(repo_path, 'README.md'), 'r',
-                                              encoding='utf-8') as readme_file:
-                                    lines = readme_file.readlines()
-                                with open(os.path.join(repo_path, 'README.md'), 'w',
-                                              encoding='utf-8') as readme_file:
-                                    for line in lines:
-                                        if "Dictamen CEI" in line and file not in line:
-                                            line = line + ' ' + file + '\n'
-                                        readme_file.write(line)
-                                break
-                    # Check for Data Model xlsx file
-                    data_model_status = "NO"
-                    for dirpath, dirnames, filenames in os.walk(repo_path):
-                        if codi is not None:
-                            for file in filenames:
-                                if file.endswith('.xlsx') and 'Data Model' in file and codi in file:
-                                    data_model_status = "YES"
-                                    data_model = file
-                                    with open(os.path.join(repo_path, 'README.md'), 'r', encoding='utf-8') as readme_file:
-                                        lines = readme_file.readlines()
-                                    with open(os.path.join(repo_path, 'README.md'), 'w', encoding='utf-8') as readme_file:
-                                        pattern = re.compile(".*- Data Model:.*")
-                                        for line in lines:
-                                            if pattern.match(line) and file not in line:
-                                                line = line + ' ' + file + '\n'
-                                            readme_file.write(line)
-                                    break
-                    last_commit_date, last_commit_author, last_commit_msg = get_last_commit_info(repo_path)
-                    writer.writerow(
-                        [folder, codi, project_status, nom, email, data_inici, last_commit_date, last_commit_author, last_commit_msg] + pdf_statuses + [
-                            ceim_status, data_model_status, data_model, dictamen_cei, solicitud, pressupost])
-            except git.InvalidGitRepositoryError:
-                print(f"{folder} is not a valid Git repository. Skipping...")
-                last_commit_date, last_commit_author, last_commit_msg = None, None, None
-                writer.writerow(
-                    [folder, codi, project_status, nom, email, data_inici, last_commit_date, last_commit_author,
-                     last_commit_msg] + pdf_statuses + [
-                        ceim_status, data_model_status, data_model, dictamen_cei, solicitud, pressupost])
-                continue
-            except PermissionError:
-                print(f"Permission denied for {folder}. Skipping...")
-                writer.writerow(
-                    [folder, codi, project_status, nom, email, data_inici, last_commit_date, last_commit_author,
-                     last_commit_msg] + pdf_statuses + [
-                        ceim_status, data_model_status, data_model, dictamen_cei, solicitud, pressupost])
-                continue
-def scan_repos_and_create_csv_no_write(dir_path: str, csv_file: str, pdf_prefixes: list = None, append_to_csv: bool = False):
-    # This function is similar to scan_repos_and_create_csv, but it doesn't write to the README.md files
-    # Copy the body of scan_repos_and_create_csv here, but remove or comment out the parts that write to the README.md files
+class ScanCache:
+    """
+    On-disk cache of each folder's record, keyed by repo_fingerprint().
+
+    The cache is only reused with the same scan parameters (pdf_prefixes, branches, exclude, max_depth).
+    Entries of folders that were not seen during the current scan are dropped on save.
+    """
+    VERSION = 3  # 3: activity metrics count recent commits per day
+
+    def __init__(self, path, parameters, full_rescan=False):
+        self.path = path
+        self.parameters = parameters
+        self.entries = {}
+        self.seen = {}
+        if full_rescan:
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (ValueError, OSError) as e:
+            print(f"Could not read scan cache {path}. Exception: {str(e)}. Rescanning all folders...")
+            return
+        if data.get('version') == self.VERSION and data.get('parameters') == self.parameters:
+            self.entries = data.get('folders', {})
+
+    def get(self, folder):
+        return self.entries.get(folder)
+
+    def put(self, folder, entry):
+        self.seen[folder] = entry
+
+    def save(self, prune=True):
+        # prune=False keeps the entries of folders not reached, e.g. after a cancelled scan
+        folders = self.seen if prune else {**self.entries, **self.seen}
+        data = {'version': self.VERSION, 'parameters': self.parameters, 'folders': folders}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def _scan_folder_cached(dir_path, folder, pdf_prefixes, write_to_readme, branches, exclude, max_depth,
+                        signature_details, activity, data_model_details, use_cache, cached):
+    # Returns (record, cache entry) for a folder known to be a directory. The entry is None
+    # when caching is off or the folder could not be fingerprinted.
+    with instrumentation.repo(folder):
+        return _scan_folder_cached_timed(dir_path, folder, pdf_prefixes, write_to_readme, branches, exclude,
+                                         max_depth, signature_details, activity, data_model_details, use_cache,
+                                         cached)
+
+
+def _scan_folder_cached_timed(dir_path, folder, pdf_prefixes, write_to_readme, branches, exclude, max_depth,
+                              signature_details, activity, data_model_details, use_cache, cached):
+    scan_options = (pdf_prefixes, write_to_readme, branches, exclude, max_depth, signature_details, activity,
+                    data_model_details)
+    if not use_cache:
+        return scan_repo(dir_path, folder, *scan_options), None
+    repo_path = os.path.join(dir_path, folder)
+    try:
+        with instrumentation.stage('fingerprint'):
+            fingerprint = repo_fingerprint(repo_path, exclude, max_depth, branches)
+    except OSError:
+        return scan_repo(dir_path, folder, *scan_options), None
+    if cached is not None and cached['fingerprint'] == fingerprint and (cached['wrote_readme'] or not write_to_readme):
+        return ProjectRecord(**cached['record']), cached
+    # A changed folder whose tip commit did not move keeps its activity metrics
+    known_activity = cached['record'].get('activity') if cached is not None else None
+    record = scan_repo(dir_path, folder, *scan_options, known_activity)
+    if write_to_readme:
+        # The scan may have written to README.md, so fingerprint what it left behind
+        with instrumentation.stage('fingerprint'):
+            fingerprint = repo_fingerprint(repo_path, exclude, max_depth, branches)
+    return record, {'fingerprint': fingerprint, 'record': asdict(record), 'wrote_readme': write_to_readme}
+
+
+def _scan_folder_in_process(*item):
+    # Worker process: the result comes back with the PDF inspections the worker added
+    return _scan_folder_cached(*item), pdf_cache.take_worker_entries()
+
+
+def _with_worker_inspections(results, pdf_inspections):
+    for result, entries in results:
+        if pdf_inspections is not None:
+            pdf_inspections.merge(entries)
+        yield result
+
+
+def list_project_folders(dir_path: str):
+    """Return the sorted names of the directories directly under dir_path; loose files are left out."""
+    # The DirEntry already knows its type, so there is no isdir() call per folder
+    with os.scandir(dir_path) as it:
+        return sorted(os.fsdecode(entry.name) for entry in it if entry.is_dir())
+
+
+def _ordered_map(executor, fn, items, window):
+    # Like executor.map, but keeps at most `window` folders in flight so records stream out
+    # in input order without queueing the whole root up front.
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, *item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def scan_parameters(pdf_prefixes: list = None, branches: list = None, exclude: list = None, max_depth: int = None,
+                    signature_details: bool = False, activity: bool = False, data_model_details: bool = False):
+    """The parameters that change a scan's records; caches and shard manifests are only valid for equal ones."""
+    return {'pdf_prefixes': list(pdf_prefixes or DEFAULT_PDF_PREFIXES), 'branches': branches,
+            'exclude': None if exclude is None else list(exclude), 'max_depth': max_depth,
+            'signature_details': signature_details, 'activity': activity, 'data_model_details': data_model_details}
+
+
+def iter_project_records(dir_path: str, pdf_prefixes: list = None, write_to_readme: bool = False,
+                         workers: int = 1, executor: str = 'thread', cache_file: str = None, full_rescan: bool = False,
+                         branches: list = None, progress=None, cancel=None, exclude: list = None,
+                         max_depth: int = None, shard: tuple = None, pdf_cache_file: str = None,
+                         signature_details: bool = False, activity: bool = False, data_model_details: bool = False):
+    """
+    Lazily yield the ProjectRecord of every project folder under dir_path, in sorted folder order.
+
+    With workers > 1 the folders are scanned concurrently on a thread or process pool
+    (executor='thread' or 'process'); records are still yielded in order, each one as soon
+    as it and every folder before it are done.
+
+    With a cache_file, folders whose repo_fingerprint() is unchanged since the previous
+    scan are served from the cache; full_rescan ignores the cached records.
+
+    exclude and max_depth limit where documents are searched for inside each folder, see
+    tree_walk.walk_tree(). signature_details, activity and data_model_details add the signature,
+    git activity and Data Model columns, see scan_folder().
+
+    With a pdf_cache_file, PDF inspections are shared by identical copies and reused across
+    runs, see pdf_cache.py. Worker processes (executor='process') send the inspections they add
+    back with each folder, and they are saved with the rest.
+
+    shard=(k, N) scans only the folders of shard k out of N, see sharding.py.
+
+    progress(done, total, folder) is called after each folder. Setting the cancel event
+    (threading.Event) stops the scan before the next folder; folders already running on
+    the pool are finished but not yielded.
+    """
     if pdf_prefixes is None:
-        pdf_prefixes = ['SSPT','PSPT']
-
-    with open(csv_file, 'a' if append_to_csv else 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        if not append_to_csv:
-            writer.writerow(["Folder Name", "Codi", "Status", "Sol·licitant", "Correu", "Data Inici", "Last Commit Date",
-                            "Last Commit Author", "Last Commit msg"] + pdf_prefixes + ["Dictamen_CEI", "Data Model",
-                                                                                    "data_model",
-                                                                                    "dictamen_cei", "solicitud",
-                                                                                    "pressupost"])
-        for folder in os.listdir(dir_path):
-            folder = os.fsdecode(folder)
-            repo_path = os.path.join(dir_path, folder)
-            try:
-                if os.path.isdir(repo_path):
-                    codi = extract_field_from_readme(repo_path, "- Codi:")
-                    if codi is not None:
-                        codi = codi.replace("PRISIB", "").strip()  # Strip the "PRISIB" prefix
-                        codi = codi.replace(" ", "").strip()  # Strip the "PRISIB" prefix
-                    else:
-                        codi_parts = os.path.basename(repo_path).split("-")
-                        if len(codi_parts) > 1:
-                            codi = codi_parts[1].strip()
-                        print(f"No 'Codi' field found in README.md for {repo_path}")
-                    data_inici = extract_field_from_readme(repo_path, "- Data inici:")
-                    data_model = extract_field_from_readme(repo_path, "- Data Model:")
-                    dictamen_cei = extract_field_from_readme(repo_path, "- Dictamen CEIB:")
-                    solicitud = extract_field_from_readme(repo_path, "- Sol·licitud:")
-                    pressupost = extract_field_from_readme(repo_path, "- Pressupost:")
-                    nom = extract_field_from_readme(repo_path, "	- Nom:")
-                    email = extract_field_from_readme(repo_path, "	- Correu:")
-                    project_status = extract_status_from_readme(repo_path)
-                    pdf_statuses = []
-                    for prefix in pdf_prefixes:
-                        status = "NO"
-                        for dirpath, dirnames, filenames in os.walk(repo_path):
-                            for file in filenames:
-                                if prefix in file and os.path.exists(os.path.join(repo_path, 'README.md')):
-                                    if re.match(r'^' + prefix + r'.*\d{8}.*\.pdf$', file):
-                                        date_part = re.search(r'\d{8}', file).group()
-                                        try:
-                                            datetime.strptime(date_part, '%Y%m%d')
-                                            status = "YES"
-                                            if prefix == 'SSPT':
-                                                solicitud = file
-                                            if prefix == 'PSPT':
-                                                pressupost = file
-                                            if is_pdf_signed(os.path.join(dirpath, file)):
-                                                status = "SIGNED"
-                                        except ValueError:
-                                            continue
-                        pdf_statuses.append(status)
-                    # Check for dictamen ceim file
-                    ceim_status = "NO"
-                    for dirpath, dirnames, filenames in os.walk(repo_path):
-                        for file in filenames:
-                            if re.match(r'^.*Dictamen_CEI.*\.pdf$', file) and os.path.exists(os.path.join(repo_path, 'README.md')):
-                                ceim_status = "YES"
-                                dictamen_cei = file
-                                if is_pdf_signed(os.path.join(dirpath, file)):
-                                    ceim_status = "SIGNED"
-                                break
-                    # Check for Data Model xlsx file
-                    data_model_status = "NO"
-                    for dirpath, dirnames, filenames in os.walk(repo_path):
-                        if codi is not None:
-                            for file in filenames:
-                                if file.endswith('.xlsx') and 'Data Model' in file and codi in file:
-                                    data_model_status = "YES"
-                                    data_model = file
-                                    break
-                    last_commit_date, last_commit_author, last_commit_msg = get_last_commit_info(repo_path)
-                    writer.writerow(
-                        [folder, codi, project_status, nom, email, data_inici, last_commit_date, last_commit_author,
-                         last_commit_msg] + pdf_statuses + [
-                            ceim_status, data_model_status, data_model, dictamen_cei, solicitud, pressupost])
-            except git.InvalidGitRepositoryError:
-                print(f"{folder} is not a valid Git repository. Skipping...")
-                last_commit_date, last_commit_author, last_commit_msg = None, None, None
-                writer.writerow(
-                    [folder, codi, project_status, nom, email, data_inici, last_commit_date, last_commit_author,
-                     last_commit_msg] + pdf_statuses + [
-                        ceim_status, data_model_status, data_model, dictamen_cei, solicitud, pressupost])
-                continue
-            except PermissionError:
-                print(f"Permission denied for {folder}. Skipping...")
-                writer.writerow(
-                    [folder, codi, project_status, nom, email, data_inici, last_commit_date, last_commit_author,
-                     last_commit_msg] + pdf_statuses + [
-                        ceim_status, data_model_status, data_model, dictamen_cei, solicitud, pressupost])
-                continue
-def is_pdf_signed(file_path):
+        pdf_prefixes = DEFAULT_PDF_PREFIXES
+    parameters = scan_parameters(pdf_prefixes, branches, exclude, max_depth, signature_details, activity,
+                                 data_model_details)
+    cache = ScanCache(cache_file, parameters, full_rescan) if cache_file else None
+    folders = sharding.select(list_project_folders(dir_path), shard)
+    items = [(dir_path, folder, pdf_prefixes, write_to_readme, branches, exclude, max_depth, signature_details,
+              activity, data_model_details, cache is not None, cache.get(folder) if cache else None)
+             for folder in folders]
+    if workers <= 1:
+        results = (_scan_folder_cached(*item) for item in items)
+        pool = None
+    elif executor == 'process':
+        if instrumentation.active():
+            print("Stage timings are not collected from worker processes, use executor='thread' to profile a scan")
+        pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=pdf_cache.use_in_worker if pdf_cache_file else None,
+            initargs=(pdf_cache_file,) if pdf_cache_file else ())
+    elif executor == 'thread':
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    else:
+        raise ValueError(f"Unknown executor {executor!r}, expected 'thread' or 'process'")
+    cancelled = False
+    pdf_inspections = pdf_cache.PdfInspectionCache(pdf_cache_file) if pdf_cache_file else None
+    with pdf_inspections or contextlib.nullcontext():
+        try:
+            if executor == 'process' and pool is not None:
+                results = _with_worker_inspections(
+                    _ordered_map(pool, _scan_folder_in_process, items, workers * 4), pdf_inspections)
+            elif pool is not None:
+                results = _ordered_map(pool, _scan_folder_cached, items, workers * 4)
+            for done, (folder, (record, entry)) in enumerate(zip(folders, results), 1):
+                if entry is not None:
+                    cache.put(folder, entry)
+                yield record
+                if progress is not None:
+                    progress(done, len(folders), folder)
+                if cancel is not None and cancel.is_set():
+                    cancelled = True
+                    break
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+    if cache is not None:
+        cache.save(prune=not cancelled)
+
+
+def export_project_records(dir_path: str, outputs: list, pdf_prefixes: list = None, **options):
     """
-    Check if a PDF file is signed.
+    Scan dir_path once and stream every record into each output.
 
     Args:
-        file_path (str): The path to the PDF file.
+        dir_path (str): The root directory holding the project folders.
+        outputs (list): Sinks (see sinks.py) or output paths, whose extension picks the format.
+        pdf_prefixes (list): Dated PDF prefixes to look for, defaults to DEFAULT_PDF_PREFIXES.
+        **options: Passed on to iter_project_records (write_to_readme, workers, cache_file, ...).
+            With shard=(k, N), every output given as a path gets a manifest for sharding.merge_partials().
 
     Returns:
-        bool: True if the PDF is signed, False otherwise.
+        int: The number of records written.
     """
+    if pdf_prefixes is None:
+        pdf_prefixes = DEFAULT_PDF_PREFIXES
+    paths = [output for output in outputs if isinstance(output, str)]
+    # A project index is given the root so it can follow renamed folders
+    outputs = [output_sink(output, dir_path) if isinstance(output, str) else output for output in outputs]
+    signature_details = options.get('signature_details', False)
+    activity = options.get('activity', False)
+    data_model_details = options.get('data_model_details', False)
+    headers = record_headers(pdf_prefixes, signature_details, activity, data_model_details)
+    started = datetime.now().astimezone()
+    folders = []
     try:
-        with open(file_path, 'rb') as f:
-            reader = PdfReader(f)
-            acro_form = reader.trailer["/Root"].get("/AcroForm", None)
-            return acro_form is not None and acro_form.get("/SigFlags", 0) != 0
-    except AttributeError:
-        print(f"Error reading PDF file at {file_path}. Skipping...")
-        return False
+        for output in outputs:
+            output.open(headers)
+        for record in iter_project_records(dir_path, pdf_prefixes, **options):
+            row = record.to_row(pdf_prefixes, signature_details, activity, data_model_details)
+            for output in outputs:
+                output.write(row)
+            folders.append(record.folder)
+    finally:
+        for output in outputs:
+            output.close()
+    shard = options.get('shard')
+    if shard is not None:
+        cancel = options.get('cancel')
+        parameters = scan_parameters(pdf_prefixes, options.get('branches'), options.get('exclude'),
+                                     options.get('max_depth'), signature_details, activity, data_model_details)
+        for path in paths:
+            sharding.write_manifest(path, shard, dir_path, parameters, headers, folders,
+                                    complete=cancel is None or not cancel.is_set(), started=started)
+    return len(folders)
 
-def extract_field_from_readme(repo_path: str, field: str) -> Optional[str]:
-    readme_path = os.path.join(repo_path, 'README.md')
-    encodings = ['windows-1252', 'utf-8', 'ISO-8859-1']  # Add more encodings if needed
-    for encoding in encodings:
-        try:
-            with open(csv_file, 'r', encoding=encoding) as file:
-                reader = csv.reader(file)
-                headers = next(reader)
-                status_index = headers.index("Status")
-                for row in reader:
-                    folder = row[0]
-                    status = row[status_index]
-                    readme_path = os.path.join(dir_path, folder, 'README.md')
-                    if os.path.exists(readme_path):
-                        for readme_encoding in encodings:
-                            try:
-                                with open(readme_path, 'r', encoding=readme_encoding) as f:
-                                    lines = f.readlines()
-                                status_exists = any(line.strip() == "### Status" for line in lines)
-                                if status_exists:
-                                    for i, line in enumerate(lines):
-                                        if line.strip() == "### Status":
-                                            if status is not None:  # Check if status is not None
-                                                if i + 1 < len(lines):
-                                                    lines[i + 1] = status + '\n\n'
-                                                else:
-                                                    lines.append(status + '\n\n')
-                                            break
-                                else:
-                                    if status is not None:  # Check if status is not None
-                                        lines.insert(2, "### Status\n")
-                                        lines.insert(3, status + '\n\n')
-                                with open(readme_path, 'w', encoding='utf-8') as f:
-                                    f.writelines(lines)
-                                break
-                            except UnicodeDecodeError:
-                                continue
-                break
-        except UnicodeDecodeError:
-            continue
-        except FileNotFoundError:
-            print(f"{readme_path} Not Found")
-            return None
-    return None
 
+def _csv_outputs(csv_file, append_to_csv, shard):
+    if shard is None:
+        return [CsvSink(csv_file, append_to_csv)]
+    if append_to_csv:
+        # A partial must hold exactly its shard's rows for its manifest to describe it
+        raise ValueError("append_to_csv cannot be combined with shard; merge the partials with sharding.merge_partials()")
+    return [csv_file]
+
+
+def scan_repos_and_create_csv(dir_path: str, csv_file: str, pdf_prefixes: list = None, append_to_csv: bool = False,
+                              workers: int = 1, executor: str = 'thread', cache_file: str = None,
+                              full_rescan: bool = False, branches: list = None, progress=None, cancel=None,
+                              shard: tuple = None):
+    # With shard=(k, N) only that shard's folders are scanned and csv_file, always written from scratch, gets a
+    # manifest for sharding.merge_partials()
+    return export_project_records(dir_path, _csv_outputs(csv_file, append_to_csv, shard),
+                                  pdf_prefixes, write_to_readme=True, workers=workers, executor=executor,
+                                  cache_file=cache_file, full_rescan=full_rescan, branches=branches, progress=progress,
+                                  cancel=cancel, shard=shard)
+
+
+def scan_repos_and_create_csv_no_write(dir_path: str, csv_file: str, pdf_prefixes: list = None,
+                                       append_to_csv: bool = False, workers: int = 1, executor: str = 'thread',
+                                       cache_file: str = None, full_rescan: bool = False, branches: list = None,
+                                       progress=None, cancel=None, shard: tuple = None):
+    # This function is similar to scan_repos_and_create_csv, but it doesn't write to the README.md files
+    return export_project_records(dir_path, _csv_outputs(csv_file, append_to_csv, shard),
+                                  pdf_prefixes, write_to_readme=False, workers=workers, executor=executor,
+                                  cache_file=cache_file, full_rescan=full_rescan, branches=branches, progress=progress,
+                                  cancel=cancel, shard=shard)
+
+
+def extract_field_from_readme(repo_path: str, field: str) -> Optional[str]:
+    return parse_readme(repo_path).get(field)
 
 
 def extract_status_from_readme(repo_path: str) -> Optional[str]:
-    readme_path = os.path.join(repo_path, 'README.md')
-    encodings = ['windows-1252', 'utf-8', 'ISO-8859-1']  # Add more encodings if needed
-    for encoding in encodings:
-        try:
-            if os.path.exists(readme_path):
-                with open(readme_path, 'r', encoding=encoding) as f:
-                    lines = f.readlines()
-                    for i, line in enumerate(lines):
-                        if line.strip() == "### Status":
-                            return lines[i+1].strip() if i+1 < len(lines) else None
-
-        except UnicodeDecodeError:
-            continue
-        except FileNotFoundError:
-            print(f"{readme_path} Not Found")
-            return None
+    return parse_readme(repo_path).status
 
-def update_readme_files_from_csv(dir_path: str, csv_file: str):
-    encodings = ['utf-8', 'ISO-8859-1', 'windows-1252']
-    for encoding in encodings:
+def read_csv_rows(csv_file: str):
+    """
+    Read scan results once, returning (headers, rows).
+
+    csv_file is a CSV written by the scans or a SQLite project index (.sqlite/.db).
+    """
+    if is_index_path(csv_file):
+        index = ProjectIndex(csv_file)
         try:
-            with open(csv_file, 'r', encoding=encoding) as file:
-                reader = csv.reader(file)
-                headers = next(reader)
-                status_index = headers.index("Status")
-                for row in reader:
-                    folder = row[0]
-                    status = row[status_index]
-                    readme_path = os.path.join(dir_path, folder, 'README.md')
-                    if os.path.exists(readme_path):
-                        for readme_encoding in encodings:
-                            try:
-                                with open(readme_path, 'r', encoding=readme_encoding) as f:
-                                    lines = f.readlines()
-                                status_exists = any(line.strip() == "### Status" for line in lines)
-                                if status_exists:
-                                    for i, line in enumerate(lines):
-                                        if line.strip() == "### Status":
-                                            if status is not None:
-                                                if i + 1 < len(lines):
-                                                    lines[i + 1] = status + '\n\n'
-                                                else:
-                                                    lines.append(status + '\n\n')
-                                            break
-                                else:
-                                    if status is not None:
-                                        lines.insert(2, "### Status\n")
-                                        lines.insert(3, status + '\n\n')
-                                with open(readme_path, 'w', encoding='utf-8') as f:
-                                    f.writelines(lines)
-                                break
-                            except UnicodeDecodeError:
-                                continue
-                break
-        except UnicodeDecodeError:
-            continue
+            return index.headers_and_rows()
+        finally:
+            index.close()
+    text, encoding, raw = text_decoding.read_text(csv_file)
+    reader = csv.reader(io.StringIO(text, newline=''))
+    headers = next(reader, None)
+    if headers is None:
+        raise ValueError(f"{csv_file} is empty")
+    return headers, list(reader)
+
+
+def status_column(headers):
+    for name in ("Status", "Project Status"):
+        if name in headers:
+            return headers.index(name)
+    raise ValueError(f"No Status column in {headers}")
+
+
+def report_non_utf8_readmes(dir_path: str):
+    """
+    Print and return (path, encoding) of every README.md under dir_path that is not UTF-8.
+    """
+    for folder in sorted(os.listdir(dir_path)):
+        readme_path = os.path.join(dir_path, folder, 'README.md')
+        if os.path.isfile(readme_path):
+            text_decoding.read_text(readme_path)
+    readmes = [(path, encoding) for path, encoding in text_decoding.non_utf8_files()
+               if os.path.dirname(os.path.dirname(path)) == os.path.abspath(dir_path)]
+    for path, encoding in readmes:
+        print(f"{path} is not UTF-8 ({encoding})")
+    return readmes
+
+
+def write_status_to_readme(dir_path: str, folder: str, status: str) -> bool:
+    """Set the status of one folder's README.md, returning True if the file was rewritten."""
+    repo_path = os.path.join(dir_path, folder)
+    if not os.path.isdir(repo_path):
+        return False
+    edits = ReadmeEdits(repo_path)
+    edits.set_status(status)
+    return edits.apply()
+
+
+def update_readme_files_from_csv(dir_path: str, csv_file: str, progress=None, cancel=None):
+    """
+    Write the Status column of a scan CSV (or SQLite project index) back to each folder's README.md.
+
+    Only READMEs whose status actually changes are rewritten. progress and cancel work as
+    in iter_project_records(), one step per CSV row.
+
+    Returns:
+        int: The number of README.md files rewritten.
+    """
+    headers, rows = read_csv_rows(csv_file)
+    status_index = status_column(headers)
+    written = 0
+    for done, row in enumerate(rows, 1):
+        folder = row[0]
+        written += write_status_to_readme(dir_path, folder, row[status_index])
+        if progress is not None:
+            progress(done, len(rows), folder)
+        if cancel is not None and cancel.is_set():
+            break
+    return written
 
 # Usage
 # scan_repos_and_create_csv('/path/to/your/folder', 'output.csv')
\ No newline at end of file
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict
+import pdf_signature
+from file_keys import fast_key
+
+# Persistent, content-addressed cache of PDF inspections.
+#
+# The same SSPT/PSPT/Dictamen PDF is often copied into several repositories
+# ("... - còpia.pdf"), and unchanged PDFs are inspected again on every scan. Results are
+# stored by the SHA-256 of the file's content, so every copy is parsed once across the
+# whole root and across runs. Hashing still reads the file, so a (size, mtime, inode)
+# key remembers which content a file had the last time it was seen; while that key
+# matches, neither the hash nor the parse is redone and the lookup costs one stat().
+#
+#     with PdfInspectionCache('pdf-cache.json'):
+#         main.scan_repos_and_create_csv_no_write(dir_path, csv_file)
+#
+# While the cache is in use pdf_signature.is_pdf_signed() goes through it. Both maps are
+# bounded and evict the least recently used entries.
+
+DEFAULT_MAX_ENTRIES = 20000
+
+
+def content_hash(file_path):
+    with open(file_path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+class PdfInspectionCache:
+    """
+    LRU bounded {content hash: PdfInspection} cache, saved as JSON.
+
+    A plain signed/unsigned check stores the cheap inspection; the signature details are
+    parsed the first time a caller asks for them and then replace it, serving both kinds of call.
+
+    Args:
+        path (str): Cache file, loaded if it exists and written on save() (or when leaving the with block).
+            None keeps the cache in memory only.
+        max_entries (int): Inspections (and file keys) kept; the least recently used are dropped first.
+    """
+    VERSION = 3
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.inspections = OrderedDict()
+        self.files = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._previous = None
+        # (file key, digest, inspection or None) added since take_new(), kept in worker processes only
+        self._new = None
+        if path is None:
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (ValueError, OSError) as e:
+            print(f"Could not read PDF cache {path}. Exception: {str(e)}. Inspecting all PDFs...")
+            return
+        if data.get('version') == self.VERSION:
+            self.inspections.update((digest, pdf_signature.PdfInspection.from_dict(inspection))
+                                    for digest, inspection in data.get('inspections', []))
+            self.files.update(data.get('files', []))
+
+    def __enter__(self):
+        self._previous = pdf_signature._cache
+        pdf_signature._cache = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pdf_signature._cache = self._previous
+        if self.path is not None:
+            self.save()
+
+    def _put(self, entries, key, value):
+        # Caller holds the lock
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def inspect(self, file_path, details=False):
+        """Return pdf_signature.inspect_pdf(file_path, details), from the cache when the content was seen before."""
+        try:
+            key = fast_key(os.stat(file_path))
+        except OSError as e:
+            return pdf_signature.PdfInspection(error=str(e))
+        with self._lock:
+            digest = self.files.get(key)
+            inspection = self.inspections.get(digest) if digest is not None else None
+            if inspection is not None and self._serves(inspection, details):
+                self.files.move_to_end(key)
+                self.inspections.move_to_end(digest)
+                self.hits += 1
+                return inspection
+        try:
+            digest = content_hash(file_path)
+        except OSError as e:
+            return pdf_signature.PdfInspection(error=str(e))
+        with self._lock:
+            inspection = self.inspections.get(digest)
+            if inspection is not None and self._serves(inspection, details):
+                self._put(self.files, key, digest)
+                if self._new is not None:
+                    self._new.append((key, digest, None))
+                self.inspections.move_to_end(digest)
+                self.hits += 1
+                return inspection
+        # Parsed outside the lock; two threads meeting the same new content both parse it
+        inspection = pdf_signature.inspect_pdf(file_path, details)
+        with self._lock:
+            self.misses += 1
+            self._put(self.files, key, digest)
+            self._put(self.inspections, digest, inspection)
+            if self._new is not None:
+                self._new.append((key, digest, inspection))
+        return inspection
+
+    def take_new(self):
+        """Return and forget the entries added since the last call, see merge()."""
+        with self._lock:
+            new, self._new = self._new or [], []
+        return new
+
+    def merge(self, entries):
+        """Add the take_new() entries of another cache, e.g. one in a worker process."""
+        with self._lock:
+            for key, digest, inspection in entries:
+                known = self.inspections.get(digest)
+                if inspection is not None and (known is None or known.signatures is None):
+                    self._put(self.inspections, digest, inspection)
+                if digest in self.inspections:
+                    self._put(self.files, key, digest)
+
+    @staticmethod
+    def _serves(inspection, details):
+        # Encrypted and unreadable files have no details to add
+        return not details or inspection.signatures is not None or inspection.encrypted or inspection.error is not None
+
+    def save(self):
+        with self._lock:
+            data = {'version': self.VERSION,
+                    'inspections': [[digest, asdict(inspection)] for digest, inspection in self.inspections.items()],
+                    'files': list(self.files.items())}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+
+_worker_cache = None
+
+
+def use_in_worker(path):
+    # ProcessPoolExecutor initializer; the parent merges what take_worker_entries() hands back
+    global _worker_cache
+    _worker_cache = PdfInspectionCache(path)
+    _worker_cache._new = []
+    _worker_cache.__enter__()
+
+
+def take_worker_entries():
+    """The entries the worker process's cache added since the last call, [] outside a worker."""
+    return [] if _worker_cache is None else _worker_cache.take_new()
@@ -0,0 +1,449 @@
+import hashlib
+import mmap
+import re
+from dataclasses import dataclass
+from typing import Optional
+import instrumentation
+
+# Fast signature detection for the SSPT/PSPT/Dictamen PDFs.
+#
+# A signed PDF only needs its trailer, the catalog and the AcroForm dictionary to be
+# answered, so instead of building a full document model the file is memory-mapped
+# and those objects are resolved straight from the cross-reference tables found
+# from the tail of the file. Files that use cross-reference streams (compressed
+# xref) or that cannot be resolved this way fall back to a full pdfreader parse; pdfreader
+# is only imported when that happens.
+
+_WHITESPACE = re.compile(rb'(?:[\x00\t\n\x0c\r ]+|%[^\r\n]*)*')
+_NUMBER = re.compile(rb'[+-]?(?:\d+\.?\d*|\.\d+)')
+_REFERENCE = re.compile(rb'(\d+)[\x00\t\n\x0c\r ]+(\d+)[\x00\t\n\x0c\r ]+R(?![^\x00\t\n\x0c\r /<>\[\]()%])')
+_NAME = re.compile(rb'/([^\x00\t\n\x0c\r /<>\[\]()%{}]*)')
+_KEYWORD = re.compile(rb'[A-Za-z]+')
+_OBJECT_HEADER = re.compile(rb'(\d+)[\x00\t\n\x0c\r ]+(\d+)[\x00\t\n\x0c\r ]+obj')
+_SUBSECTION = re.compile(rb'(\d+)[ ]+(\d+)')
+_XREF_ENTRY = re.compile(rb'(\d{10}) (\d{5}) ([nf])')
+_STARTXREF = re.compile(rb'startxref[\x00\t\n\x0c\r ]+(\d+)')
+_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f'}
+
+# How far from the end of the file "startxref" is searched for
+_TAIL_SIZE = 4096
+
+
+class FastPathUnavailable(Exception):
+    """The file needs a full parse (compressed xref, broken offsets, ...)."""
+
+
+class Name(str):
+    pass
+
+
+class Reference(tuple):
+    @property
+    def number(self):
+        return self[0]
+
+
+class PdfFile:
+    """
+    Minimal reader over a memory-mapped PDF: cross-reference tables and direct objects.
+
+    Only classic "xref" tables are understood, including the /Prev chain of
+    incremental updates. Anything else raises FastPathUnavailable. Only the regions
+    parsed (the tail, the xref sections and the objects resolved) are counted as read.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.sections = []
+        self.trailer = {}
+        self._read_xref_chain()
+
+    def _skip(self, pos):
+        return _WHITESPACE.match(self.data, pos).end()
+
+    def _read_xref_chain(self):
+        tail_start = max(0, len(self.data) - _TAIL_SIZE)
+        pos = self.data.rfind(b'startxref', tail_start)
+        # rfind scans back from the end, so only the bytes after the match are touched
+        instrumentation.count(bytes_read=len(self.data) - (pos if pos >= 0 else tail_start))
+        match = _STARTXREF.match(self.data, pos) if pos >= 0 else None
+        if match is None:
+            raise FastPathUnavailable('startxref not found')
+        offset = int(match.group(1))
+        visited = set()
+        while offset is not None:
+            if offset in visited or offset >= len(self.data):
+                raise FastPathUnavailable(f'invalid xref offset {offset}')
+            visited.add(offset)
+            subsections, trailer = self._read_xref_section(offset)
+            self.sections.append((subsections, trailer))
+            for key, value in trailer.items():
+                self.trailer.setdefault(key, value)
+            offset = trailer.get('Prev')
+
+    def _read_xref_section(self, offset):
+        if self.data[offset:offset + 4] != b'xref':
+            raise FastPathUnavailable('cross-reference stream')
+        pos = self._skip(offset + 4)
+        subsections = []
+        while True:
+            if self.data[pos:pos + 7] == b'trailer':
+                break
+            match = _SUBSECTION.match(self.data, pos)
+            if match is None:
+                raise FastPathUnavailable(f'malformed xref subsection at {pos}')
+            start, count = int(match.group(1)), int(match.group(2))
+            entries = self._skip(match.end())
+            subsections.append((start, count, entries))
+            pos = self._skip(entries + count * 20)
+        trailer, pos = self.parse_object(pos + 7)
+        instrumentation.count(bytes_read=pos - offset)
+        if not isinstance(trailer, dict):
+            raise FastPathUnavailable('malformed trailer')
+        return subsections, trailer
+
+    def object_offset(self, number):
+        for subsections, trailer in self.sections:
+            for start, count, entries in subsections:
+                if start <= number < start + count:
+                    match = _XREF_ENTRY.match(self.data, entries + (number - start) * 20)
+                    if match is None:
+                        raise FastPathUnavailable(f'malformed xref entry for object {number}')
+                    return int(match.group(1)) if match.group(3) == b'n' else None
+            if 'XRefStm' in trailer:
+                # Hybrid file: the object may live in a compressed object stream
+                raise FastPathUnavailable(f'object {number} not in xref table')
+        # Free entries are null objects; one missing from every section means a damaged table
+        raise FastPathUnavailable(f'object {number} not in xref table')
+
+    def resolve(self, value):
+        """Return the direct object behind an indirect reference."""
+        seen = set()
+        while isinstance(value, Reference):
+            if value in seen:
+                raise FastPathUnavailable(f'reference loop at object {value.number}')
+            seen.add(value)
+            offset = self.object_offset(value.number)
+            if offset is None:
+                return None
+            match = _OBJECT_HEADER.match(self.data, self._skip(offset))
+            if match is None or int(match.group(1)) != value.number:
+                raise FastPathUnavailable(f'object {value.number} not found at offset {offset}')
+            value, pos = self.parse_object(match.end())
+            instrumentation.count(bytes_read=pos - offset)
+        return value
+
+    def parse_object(self, pos):
+        """Parse the direct object at pos and return (value, end position)."""
+        data = self.data
+        pos = self._skip(pos)
+        head = data[pos:pos + 1]
+        if data[pos:pos + 2] == b'<<':
+            result = {}
+            pos += 2
+            while True:
+                pos = self._skip(pos)
+                if data[pos:pos + 2] == b'>>':
+                    return result, pos + 2
+                key, pos = self.parse_object(pos)
+                if not isinstance(key, Name):
+                    raise FastPathUnavailable(f'dictionary key expected at {pos}')
+                result[str(key)], pos = self.parse_object(pos)
+        if head == b'[':
+            result = []
+            pos += 1
+            while True:
+                pos = self._skip(pos)
+                if data[pos:pos + 1] == b']':
+                    return result, pos + 1
+                value, pos = self.parse_object(pos)
+                result.append(value)
+        if head == b'/':
+            match = _NAME.match(data, pos)
+            return Name(re.sub(rb'#([0-9A-Fa-f]{2})', lambda m: bytes([int(m.group(1), 16)]),
+                               match.group(1)).decode('latin-1')), match.end()
+        if head == b'(':
+            return self._parse_literal_string(pos)
+        if head == b'<':
+            end = data.find(b'>', pos)
+            if end < 0:
+                raise FastPathUnavailable(f'unterminated hex string at {pos}')
+            digits = re.sub(rb'[^0-9A-Fa-f]', b'', data[pos + 1:end])
+            return bytes.fromhex((digits + b'0' * (len(digits) % 2)).decode('ascii')), end + 1
+        match = _REFERENCE.match(data, pos)
+        if match is not None:
+            return Reference((int(match.group(1)), int(match.group(2)))), match.end()
+        match = _NUMBER.match(data, pos)
+        if match is not None:
+            text = match.group()
+            return (float(text) if b'.' in text else int(text)), match.end()
+        match = _KEYWORD.match(data, pos)
+        if match is not None:
+            keyword = match.group()
+            if keyword in (b'true', b'false', b'null'):
+                return {b'true': True, b'false': False, b'null': None}[keyword], match.end()
+        raise FastPathUnavailable(f'unexpected token at {pos}')
+
+    def _parse_literal_string(self, pos):
+        data = self.data
+        depth = 0
+        out = bytearray()
+        pos += 1
+        while pos < len(data):
+            char = data[pos:pos + 1]
+            if char == b'\\':
+                escaped = data[pos + 1:pos + 2]
+                octal = re.match(rb'[0-7]{1,3}', data[pos + 1:pos + 4])
+                if octal:
+                    out.append(int(octal.group(), 8) & 0xFF)
+                    pos += 1 + len(octal.group())
+                    continue
+                if escaped not in (b'\r', b'\n'):
+                    out += _ESCAPES.get(escaped, escaped)
+                pos += 2
+                continue
+            if char == b'(':
+                depth += 1
+            elif char == b')':
+                if depth == 0:
+                    return bytes(out), pos + 1
+                depth -= 1
+            out += char
+            pos += 1
+        raise FastPathUnavailable('unterminated literal string')
+
+    @property
+    def is_encrypted(self):
+        return 'Encrypt' in self.trailer
+
+    def catalog(self):
+        catalog = self.resolve(self.trailer.get('Root'))
+        if not isinstance(catalog, dict):
+            raise FastPathUnavailable('catalog not found')
+        return catalog
+
+    def acro_form(self):
+        acro_form = self.resolve(self.catalog().get('AcroForm'))
+        return acro_form if isinstance(acro_form, dict) else None
+
+
+# Values of SignatureInfo.byte_range
+WHOLE_FILE = 'whole file'  # the signature covers every byte but its own /Contents
+PARTIAL = 'partial'  # bytes were appended after signing (an incremental update: edits or a later signature)
+INVALID = 'invalid'
+# Values of SignatureInfo.digest
+MATCH = 'match'
+MISMATCH = 'mismatch'  # the signed bytes were changed after signing
+
+# DER of the CMS messageDigest attribute type (1.2.840.113549.1.9.4); its value is the
+# digest of the signed byte ranges, so integrity can be checked without verifying the signature
+_MESSAGE_DIGEST_OID = bytes.fromhex('06092a864886f70d010904')
+_DIGESTS_BY_SIZE = {20: 'sha1', 32: 'sha256', 48: 'sha384', 64: 'sha512'}
+_PDF_DATE = re.compile(rb"D:(\d{4})(\d{2})?(\d{2})?(\d{2})?(\d{2})?(\d{2})?(?:([Zz+-])(\d{2})?'?(\d{2})?)?")
+
+
+@dataclass
+class SignatureInfo:
+    """One signature field of a signed PDF."""
+    field: Optional[str] = None
+    signer: Optional[str] = None
+    signed_at: Optional[str] = None  # "YYYY-MM-DD HH:MM:SS+HH:MM"
+    sub_filter: Optional[str] = None
+    byte_range: str = INVALID
+    digest: Optional[str] = None  # MATCH, MISMATCH or None when no messageDigest could be found
+
+
+@dataclass
+class PdfInspection:
+    """What a scan needs to know about a PDF; plain values so results can be cached as JSON."""
+    signed: bool = False
+    encrypted: bool = False
+    error: Optional[str] = None  # set when the file could not be read or parsed
+    signatures: Optional[list] = None  # SignatureInfo per signature field, None if not inspected
+
+    @classmethod
+    def from_dict(cls, values):
+        values = dict(values)
+        if values.get('signatures') is not None:
+            values['signatures'] = [SignatureInfo(**signature) for signature in values['signatures']]
+        return cls(**values)
+
+
+def _text(value):
+    # PDF text strings are UTF-16BE with a byte order mark or (close enough to) Latin-1
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        if value.startswith(b'\xfe\xff'):
+            return value[2:].decode('utf-16-be', 'replace')
+        if value.startswith(b'\xef\xbb\xbf'):
+            return value[3:].decode('utf-8', 'replace')
+        return value.decode('latin-1')
+    return str(value)
+
+
+def _pdf_date(value):
+    match = _PDF_DATE.match(value) if isinstance(value, bytes) else None
+    if match is None:
+        return _text(value)
+    year, month, day, hour, minute, second, sign, tz_hour, tz_minute = (
+        group.decode('ascii') if group else None for group in match.groups())
+    text = f"{year}-{month or '01'}-{day or '01'} {hour or '00'}:{minute or '00'}:{second or '00'}"
+    if sign in ('Z', 'z'):
+        return text + '+00:00'
+    if sign:
+        return text + f"{sign}{tz_hour or '00'}:{tz_minute or '00'}"
+    return text
+
+
+def _message_digest(contents):
+    # SET { OCTET STRING digest } right after the attribute type; digests are short-form DER lengths
+    pos = contents.find(_MESSAGE_DIGEST_OID)
+    if pos < 0:
+        return None
+    pos += len(_MESSAGE_DIGEST_OID)
+    if contents[pos:pos + 1] != b'\x31' or contents[pos + 2:pos + 3] != b'\x04':
+        return None
+    size = contents[pos + 3]
+    digest = bytes(contents[pos + 4:pos + 4 + size])
+    return digest if len(digest) == size and size in _DIGESTS_BY_SIZE else None
+
+
+def _check_byte_range(data, byte_range, contents):
+    """Return (SignatureInfo.byte_range, SignatureInfo.digest) of one signature over the mapped file."""
+    if (not isinstance(byte_range, list) or len(byte_range) != 4 or not all(isinstance(n, int) for n in byte_range)
+            or byte_range[0] != 0):
+        return INVALID, None
+    start1, length1, start2, length2 = byte_range
+    if length1 < 0 or length2 < 0 or start2 < start1 + length1 or start2 + length2 > len(data):
+        return INVALID, None
+    coverage = WHOLE_FILE if start2 + length2 == len(data) else PARTIAL
+    expected = _message_digest(contents) if isinstance(contents, bytes) else None
+    if expected is None:
+        return coverage, None
+    digest = hashlib.new(_DIGESTS_BY_SIZE[len(expected)])
+    # Slices of a memoryview over the map are zero-copy: the signed bytes are hashed in place
+    with memoryview(data) as view:
+        digest.update(view[start1:start1 + length1])
+        digest.update(view[start2:start2 + length2])
+    instrumentation.count(bytes_read=length1 + length2)
+    return coverage, MATCH if digest.digest() == expected else MISMATCH
+
+
+def _signature_fields(fields, resolve, inherited_type=None, depth=0):
+    # Terminal fields of the AcroForm field tree whose (possibly inherited) type is /Sig
+    if not isinstance(fields, list) or depth > 32:
+        return
+    for index in range(len(fields)):
+        field = resolve(fields[index])
+        if not isinstance(field, dict):
+            continue
+        field_type = resolve(field['FT']) if 'FT' in field else inherited_type
+        if 'Kids' in field:
+            yield from _signature_fields(resolve(field['Kids']), resolve, field_type, depth + 1)
+        elif field_type == 'Sig':
+            yield field
+
+
+def _signatures(acro_form, resolve, data):
+    signatures = []
+    fields = resolve(acro_form['Fields']) if 'Fields' in acro_form else None
+    for field in _signature_fields(fields, resolve):
+        value = resolve(field['V']) if 'V' in field else None
+        info = SignatureInfo(field=_text(resolve(field['T'])) if 'T' in field else None)
+        if isinstance(value, dict):
+            get = lambda key: resolve(value[key]) if key in value else None
+            contents = get('Contents')
+            if isinstance(contents, str):
+                # pdfreader hands hex strings over as their hex digits
+                contents = bytes.fromhex(contents)
+            byte_range = get('ByteRange')
+            info.signer = _text(get('Name'))
+            info.signed_at = _pdf_date(get('M'))
+            info.sub_filter = _text(get('SubFilter'))
+            info.byte_range, info.digest = _check_byte_range(
+                data, [resolve(n) for n in byte_range] if isinstance(byte_range, list) else None, contents)
+        signatures.append(info)
+    return signatures
+
+
+def _inspect_fast(file_path, details=False):
+    with open(file_path, 'rb') as fd:
+        with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            instrumentation.count(bytes_read=5, files=1)
+            if data[:5] != b'%PDF-':
+                raise FastPathUnavailable('missing %PDF header')
+            pdf = PdfFile(data)
+            if pdf.is_encrypted:
+                return PdfInspection(encrypted=True)
+            acro_form = pdf.acro_form()
+            if acro_form is None:
+                return PdfInspection(signatures=[] if details else None)
+            sig_flags = pdf.resolve(acro_form.get('SigFlags', 0))
+            signed = sig_flags is not None and sig_flags != 0
+            return PdfInspection(signed=signed,
+                                 signatures=_signatures(acro_form, pdf.resolve, data) if details else None)
+
+
+def _inspect_full(file_path, details=False):
+    from pdfreader import PDFDocument
+    with open(file_path, 'rb') as fd:
+        doc = PDFDocument(fd)
+        if doc.encrypt:
+            return PdfInspection(encrypted=True)
+        acro_form = doc.root['AcroForm'] if 'AcroForm' in doc.root else None
+        signed = acro_form is not None and acro_form.get("SigFlags", 0) != 0
+        if not details:
+            return PdfInspection(signed=signed)
+        if acro_form is None:
+            return PdfInspection(signed=signed, signatures=[])
+        # pdfreader resolves references itself; the ranges are hashed over a map of the file
+        with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return PdfInspection(signed=signed, signatures=_signatures(acro_form, lambda value: value, data))
+
+
+def inspect_pdf(file_path, details=False) -> PdfInspection:
+    """
+    Parse a PDF, on the fast path when possible. Never raises: failures are reported in .error.
+
+    With details, .signatures lists every signature field with its signer, signing time,
+    SubFilter, how much of the file its /ByteRange covers and whether the digest of the
+    signed ranges matches the one in the signature.
+    """
+    try:
+        try:
+            return _inspect_fast(file_path, details)
+        except (FastPathUnavailable, ValueError, RecursionError):
+            # ValueError: empty files cannot be memory-mapped
+            return _inspect_full(file_path, details)
+    except Exception as e:
+        return PdfInspection(error=str(e))
+
+
+# Set while a pdf_cache.PdfInspectionCache is in use, see pdf_cache.py
+_cache = None
+
+
+def inspect_signatures(file_path) -> PdfInspection:
+    """inspect_pdf(file_path, details=True), through the PDF cache when one is in use."""
+    cache = _cache
+    return inspect_pdf(file_path, details=True) if cache is None else cache.inspect(file_path, details=True)
+
+
+def is_pdf_signed(file_path):
+    """
+    Check if a PDF file is signed, i.e. its AcroForm has non-zero /SigFlags.
+
+    Args:
+        file_path (str): The path to the PDF file.
+
+    Returns:
+        bool: True if the PDF is signed, False otherwise (also for encrypted or unreadable files).
+    """
+    cache = _cache
+    inspection = inspect_pdf(file_path) if cache is None else cache.inspect(file_path)
+    if inspection.encrypted:
+        print(f"PDF file at {file_path} is encrypted. Skipping...")
+    elif inspection.error is not None:
+        print(f"Exception occurred when checking signature in PDF file at {file_path}. Exception: {inspection.error}. Skipping...")
+    return inspection.signed
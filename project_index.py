@@ -0,0 +1,191 @@
+import csv
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime, timezone
+from sinks import Sink
+
+# SQLite store of scan results: one row per project folder, upserted on every scan,
+# so repeated scans never duplicate a folder and lookups by folder, Codi, status or
+# document status are index lookups instead of reading the whole CSV.
+
+# The first header of every row is the folder, stored in the "folder" primary key. Writers
+# pass the headers stored under a fixed column name (for scans, the ProjectRecord attribute of
+# the column, see main.index_options()); any other header (SSPT, PSPT, ...) gets a sanitized
+# column added on first use. Codi, Status and the status_columns headers are indexed.
+INDEXED_HEADERS = ("Codi", "Status")
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+class ProjectIndex(Sink):
+    """
+    Scan results in a SQLite database, usable as an output sink of export_project_records().
+
+    Records are upserted by folder in batched transactions. Codi, Status and the document
+    status columns (status_columns headers) are indexed, and each folder keeps the time it
+    was first and last scanned. Given the scanned root, a folder renamed since the last scan
+    keeps its row: a new folder takes over the row of the one folder with the same Codi that
+    no longer exists under root. Without root rows are never reconciled.
+    """
+
+    def __init__(self, path, batch_size=500, columns=None, status_columns=(), root=None):
+        self.path = path
+        self.root = root
+        self.batch_size = batch_size
+        self.known_columns = dict(columns or {})
+        self.status_columns = status_columns
+        self.conn = sqlite3.connect(path)
+        self.pending = []
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS projects (folder TEXT PRIMARY KEY, first_scanned_at TEXT, "
+                              "scanned_at TEXT)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS projects_scanned_at ON projects (scanned_at)")
+        self.columns = self._load_columns()
+
+    def _load_columns(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'columns'").fetchone()
+        return [tuple(pair) for pair in json.loads(row[0])] if row else []
+
+    def _existing_columns(self):
+        return {info[1].lower() for info in self.conn.execute("PRAGMA table_info(projects)")}
+
+    def _column_for(self, header, used, known):
+        for known_header, column in self.columns:
+            if known_header == header:
+                return column
+        if header in known:
+            return known[header]
+        column = base = re.sub(r'\W+', '_', header.lower()).strip('_') or 'column'
+        n = 2
+        while column.lower() in used or column in known.values():
+            column = f'{base}_{n}'
+            n += 1
+        return column
+
+    def open(self, headers):
+        super().open(headers)
+        existing = self._existing_columns()
+        used = set(existing)
+        columns = []
+        known = {**self.known_columns, self.headers[0]: 'folder'}
+        with self.conn:
+            for header in self.headers:
+                column = self._column_for(header, used, known)
+                if column.lower() not in existing:
+                    self.conn.execute(f"ALTER TABLE projects ADD COLUMN {_quote(column)} TEXT")
+                    existing.add(column.lower())
+                used.add(column.lower())
+                columns.append((header, column))
+            for header, column in columns:
+                if header in INDEXED_HEADERS or header in self.status_columns:
+                    self.conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote('projects_' + column)} "
+                                      f"ON projects ({_quote(column)})")
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('columns', ?) "
+                              "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (json.dumps(columns),))
+        self.columns = columns
+        names = [column for header, column in columns]
+        self._folder_index = names.index('folder')
+        self._codi = next((column for header, column in columns if header == "Codi"), None)
+        updates = ', '.join(f'{_quote(c)} = excluded.{_quote(c)}' for c in names if c != 'folder')
+        self._upsert = (f"INSERT INTO projects ({', '.join(map(_quote, names))}, first_scanned_at, scanned_at) "
+                        f"VALUES ({', '.join('?' * (len(names) + 2))}) ON CONFLICT(folder) DO UPDATE SET "
+                        f"{updates}{', ' if updates else ''}scanned_at = excluded.scanned_at")
+
+    def write(self, values):
+        now = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        self.pending.append([None if value is None else str(value) for value in values] + [now, now])
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            with self.conn:
+                self._reconcile_renamed()
+                self.conn.executemany(self._upsert, self.pending)
+            self.pending = []
+
+    def _reconcile_renamed(self):
+        # A new folder takes over the row of the only folder with its Codi that is gone from root
+        if self.root is None or self._codi is None:
+            return
+        codi_index = [column for header, column in self.columns].index(self._codi)
+        for row in self.pending:
+            folder, codi = row[self._folder_index], row[codi_index]
+            if not codi or self.conn.execute("SELECT 1 FROM projects WHERE folder = ?", (folder,)).fetchone():
+                continue
+            query = f"SELECT folder FROM projects WHERE {_quote(self._codi)} = ?"
+            renamed = [old for old, in self.conn.execute(query, (codi,))
+                       if not os.path.isdir(os.path.join(self.root, old))]
+            if len(renamed) == 1:
+                self.conn.execute("UPDATE projects SET folder = ? WHERE folder = ?", (folder, renamed[0]))
+
+    def close(self):
+        if self.conn is not None:
+            self.flush()
+            self.conn.close()
+            self.conn = None
+
+    def _column(self, header):
+        for known_header, column in self.columns:
+            if known_header == header:
+                return column
+        raise KeyError(f"No column {header!r} in {self.path}")
+
+    def headers_and_rows(self):
+        """Return (headers, rows) of every project in folder order, as the scan CSV would hold them."""
+        if not self.columns:
+            # Nothing exported into the index yet
+            return [], []
+        names = ', '.join(_quote(column) for header, column in self.columns)
+        rows = self.conn.execute(f"SELECT {names} FROM projects ORDER BY folder").fetchall()
+        return [header for header, column in self.columns], [list(row) for row in rows]
+
+    def get(self, folder):
+        names = ', '.join(_quote(column) for header, column in self.columns)
+        row = self.conn.execute(f"SELECT {names} FROM projects WHERE folder = ?", (folder,)).fetchone()
+        return dict(zip((header for header, column in self.columns), row)) if row else None
+
+    def find(self, header, value):
+        """Folders whose header column equals value, e.g. find("Codi", "22011")."""
+        query = f"SELECT folder FROM projects WHERE {_quote(self._column(header))} IS ? ORDER BY folder"
+        return [row[0] for row in self.conn.execute(query, (value,))]
+
+    def missing_signed(self, header):
+        """Folders whose header document (e.g. "PSPT") is missing or not signed."""
+        query = (f"SELECT folder FROM projects WHERE {_quote(self._column(header))} IS NOT 'SIGNED' "
+                 f"ORDER BY folder")
+        return [row[0] for row in self.conn.execute(query)]
+
+    def folders(self):
+        return [row[0] for row in self.conn.execute("SELECT folder FROM projects ORDER BY folder")]
+
+    def delete(self, folders):
+        """Remove the rows of folders that no longer exist."""
+        with self.conn:
+            self.conn.executemany("DELETE FROM projects WHERE folder = ?", [(folder,) for folder in folders])
+
+    def update(self, folder, header, value):
+        """Update one field of one folder in place."""
+        with self.conn:
+            self.conn.execute(f"UPDATE projects SET {_quote(self._column(header))} = ? WHERE folder = ?",
+                              (value, folder))
+
+    def export_csv(self, csv_file):
+        headers, rows = self.headers_and_rows()
+        with open(csv_file, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(headers)
+            writer.writerows(rows)
+        return len(rows)
+
+
+INDEX_EXTENSIONS = ('.sqlite', '.sqlite3', '.db')
+
+
+def is_index_path(path):
+    return path.lower().endswith(INDEX_EXTENSIONS)
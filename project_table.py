@@ -0,0 +1,130 @@
+import csv
+import io
+import sys
+import main
+from project_index import ProjectIndex, is_index_path
+
+# Backing store of the UI2 table. Rows live here as tuples of interned strings (status
+# columns repeat a handful of values across thousands of projects), and the Treeview only
+# ever holds the rows currently on screen. Sorting and filtering reorder a list of row
+# ids, so no widget is touched until the visible window is drawn again.
+#
+# Edits are journalled by (folder, column) so that saving only touches what changed:
+# the changed rows of a project index, and the READMEs whose Status was edited.
+
+
+class ProjectTable:
+    """
+    Rows of a scan CSV (or SQLite project index) with a sorted, filtered view.
+
+    Row ids are the positions of the rows in the file; the view is the list of row ids
+    that pass the filter, in display order. edits maps (folder, column) to the
+    (saved value, new value) of every cell changed since the last load or save.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.headers = []
+        self.rows = []
+        self.view = []
+        self.sort_column = None
+        self.descending = False
+        self.filter_text = ''
+        self.edits = {}
+
+    def load(self, path):
+        """Replace the contents with the rows of path, clearing sort and filter."""
+        headers, rows = main.read_csv_rows(path)
+        width = len(headers)
+        intern = sys.intern
+        self.path = path
+        self.headers = headers
+        self.rows = [tuple(intern('' if value is None else str(value)) for value in (row + [''] * width)[:width])
+                     for row in rows]
+        self.sort_column = None
+        self.descending = False
+        self.filter_text = ''
+        self.edits = {}
+        self.view = list(range(len(self.rows)))
+
+    def __len__(self):
+        return len(self.view)
+
+    def _refresh(self):
+        needle = self.filter_text.casefold()
+        if needle:
+            view = [row_id for row_id, row in enumerate(self.rows) if needle in '\x1f'.join(row).casefold()]
+        else:
+            view = list(range(len(self.rows)))
+        if self.sort_column is not None:
+            index = self.headers.index(self.sort_column)
+            view.sort(key=lambda row_id: self.rows[row_id][index].casefold(), reverse=self.descending)
+        self.view = view
+
+    def sort(self, column, descending=None):
+        """Sort the view by column; without descending, sorting the same column again reverses it."""
+        if descending is None:
+            descending = column == self.sort_column and not self.descending
+        self.sort_column = column
+        self.descending = descending
+        self._refresh()
+
+    def filter(self, text):
+        """Keep the rows containing text in any column (case-insensitive); '' shows every row."""
+        self.filter_text = text
+        self._refresh()
+
+    def window(self, start, count):
+        """Return [(row id, values)] of view positions start .. start + count."""
+        return [(row_id, self.rows[row_id]) for row_id in self.view[max(start, 0):start + count]]
+
+    def get(self, row_id, column):
+        return self.rows[row_id][self.headers.index(column)]
+
+    def set(self, row_id, column, value):
+        index = self.headers.index(column)
+        row = list(self.rows[row_id])
+        key = (row[0], column)
+        saved = self.edits[key][0] if key in self.edits else row[index]
+        if value == saved:
+            self.edits.pop(key, None)
+        else:
+            self.edits[key] = (saved, value)
+        row[index] = sys.intern(value)
+        self.rows[row_id] = tuple(row)
+
+    def save(self, dir_path=None):
+        """
+        Persist the journalled edits and clear the journal.
+
+        A project index gets one UPDATE per edited cell; a CSV, which cannot be patched in
+        place, is rewritten once (atomically) and only if something changed. With dir_path,
+        edited Status values are written to the README.md of their folders.
+
+        Returns:
+            tuple: (number of changed rows, number of README.md files rewritten).
+        """
+        if not self.edits:
+            return 0, 0
+        if is_index_path(self.path):
+            index = ProjectIndex(self.path)
+            try:
+                for (folder, column), (saved, value) in self.edits.items():
+                    index.update(folder, column, value)
+            finally:
+                index.close()
+        else:
+            text = io.StringIO(newline='')
+            writer = csv.writer(text)
+            writer.writerow(self.headers)
+            writer.writerows(self.rows)
+            main._atomic_write(self.path, text.getvalue().encode('utf-8'))
+        written = 0
+        statuses = {"Status", "Project Status"} & set(self.headers)
+        if dir_path is not None:
+            for (folder, column), (saved, value) in self.edits.items():
+                if column in statuses:
+                    written += main.write_status_to_readme(dir_path, folder, value)
+        changed = len({folder for folder, column in self.edits})
+        self.edits = {}
+        return changed, written
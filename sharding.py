@@ -0,0 +1,201 @@
+import datetime
+import hashlib
+import json
+import os
+import socket
+from dataclasses import dataclass, field
+
+# Splitting one scan of the project root across several machines.
+#
+#   python cli.py scan //server1/Projectes part-1.csv --shard 1/3    # on three machines
+#   python cli.py scan //server2/Projectes part-2.csv --shard 2/3
+#   python cli.py scan //server3/Projectes part-3.csv --shard 3/3
+#   python cli.py merge Projectes.csv part-1.csv part-2.csv part-3.csv
+#
+# A folder's shard depends only on its name, so every machine agrees on the partition
+# without talking to the others, and a folder stays in its shard as others are added.
+# Each partial output gets a manifest next to it (part-1.csv.manifest.json) recording
+# which shard it holds, with which parameters, and whether the scan ran to the end.
+
+MANIFEST_SUFFIX = '.manifest.json'
+MANIFEST_VERSION = 1
+
+
+def parse_shard(text: str):
+    """Parse "k/N" into (k, N), with shards numbered from 1."""
+    try:
+        k, n = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard {text!r}, expected k/N, e.g. 2/4")
+    if not 1 <= k <= n:
+        raise ValueError(f"Invalid shard {text!r}, k must be between 1 and N")
+    return k, n
+
+
+def shard_of(folder: str, shards: int) -> int:
+    """The shard (1 to shards) a folder belongs to. Stable across machines, runs and Python versions."""
+    # Python's hash() of a str is salted per process, so hash the name itself
+    digest = hashlib.sha1(folder.encode('utf-8', 'surrogateescape')).digest()
+    return int.from_bytes(digest[:8], 'big') % shards + 1
+
+
+def select(folders, shard):
+    """The folders of shard (k, N); all of them when shard is None."""
+    if shard is None:
+        return list(folders)
+    k, n = shard
+    return [folder for folder in folders if shard_of(folder, n) == k]
+
+
+def manifest_path(output: str) -> str:
+    return output + MANIFEST_SUFFIX
+
+
+def write_manifest(output: str, shard, dir_path: str, parameters: dict, headers: list, folders: list, complete: bool,
+                   started: datetime.datetime):
+    """Write the manifest of a partial output once it has been closed."""
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'shard': shard[0],
+        'shards': shard[1],
+        'dir_path': os.path.abspath(dir_path),
+        'host': socket.gethostname(),
+        'started': started.isoformat(timespec='seconds'),
+        'finished': datetime.datetime.now().astimezone().isoformat(timespec='seconds'),
+        'parameters': parameters,
+        'headers': headers,
+        'rows': len(folders),
+        'folders': folders,
+        'complete': complete,
+    }
+    path = manifest_path(output)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+# Sorts before every finished partial
+_NOT_FINISHED = datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+
+
+def _finished_at(manifest):
+    # Compared as instants: shards may have run on machines with different UTC offsets
+    return datetime.datetime.fromisoformat(manifest['finished']).astimezone(datetime.timezone.utc)
+
+
+def read_manifest(output: str):
+    """Return the manifest of a partial output, or None if it has none."""
+    try:
+        with open(manifest_path(output), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"{manifest_path(output)} has unsupported version {manifest.get('version')}")
+    return manifest
+
+
+@dataclass
+class MergeReport:
+    rows: int = 0
+    duplicates: int = 0  # identical rows of one folder found in several partials
+    conflicts: dict = field(default_factory=dict)  # folder -> partials whose rows differ, the kept one first
+    missing_shards: list = field(default_factory=list)
+    problems: list = field(default_factory=list)  # incomplete or mismatching partials
+
+    @property
+    def clean(self):
+        return not (self.conflicts or self.missing_shards or self.problems)
+
+    def lines(self):
+        lines = [f"Merged {self.rows} projects ({self.duplicates} duplicates dropped)"]
+        lines += self.problems
+        if self.missing_shards:
+            lines.append(f"Missing shards: {', '.join(map(str, self.missing_shards))}")
+        for folder, partials in self.conflicts.items():
+            lines.append(f"Conflict in {folder}: kept {partials[0]}, differs in {', '.join(partials[1:])}")
+        return lines
+
+
+def merge_partials(partials: list, output):
+    """
+    Merge partial outputs into one output ordered by folder, like a single full scan.
+
+    Rows of a folder found in several partials (overlapping or repeated shard runs) are
+    deduplicated. When they differ, the row of the most recently finished partial is kept
+    and the folder is reported as a conflict. Partials without a manifest are merged but
+    reported, as are incomplete scans, shard counts that disagree and missing shards.
+
+    Args:
+        partials (list): Partial CSVs or SQLite indexes written by sharded scans.
+        output: Output path (the extension picks the format, see sinks.py) or a Sink.
+
+    Returns:
+        MergeReport: What was merged and what looked wrong.
+
+    Raises:
+        ValueError: If the partials do not share the same columns or scan parameters.
+    """
+    import main
+    report = MergeReport()
+    headers = None
+    parameters = None
+    shard_counts = set()
+    shards_seen = set()
+    loaded = []
+    for partial in partials:
+        manifest = read_manifest(partial)
+        partial_headers, rows = main.read_csv_rows(partial)
+        if headers is None:
+            headers = partial_headers
+        elif partial_headers != headers:
+            raise ValueError(f"{partial} has columns {partial_headers}, expected {headers}")
+        if manifest is None:
+            report.problems.append(f"{partial} has no manifest")
+            loaded.append((_NOT_FINISHED, partial, rows))
+            continue
+        if parameters is None:
+            parameters = manifest['parameters']
+        elif manifest['parameters'] != parameters:
+            raise ValueError(f"{partial} was scanned with {manifest['parameters']}, expected {parameters}")
+        if not manifest['complete']:
+            report.problems.append(f"{partial} is an incomplete scan of shard {manifest['shard']}/{manifest['shards']}")
+        if manifest['rows'] != len(rows):
+            report.problems.append(f"{partial} has {len(rows)} rows, its manifest lists {manifest['rows']}")
+        shard_counts.add(manifest['shards'])
+        shards_seen.add(manifest['shard'])
+        loaded.append((_finished_at(manifest), partial, rows))
+    if headers is None:
+        raise ValueError("No partial outputs to merge")
+    if len(shard_counts) > 1:
+        report.problems.append(f"Partials disagree on the number of shards: {sorted(shard_counts)}")
+    elif shard_counts:
+        report.missing_shards = sorted(set(range(1, max(shard_counts) + 1)) - shards_seen)
+
+    # Newest partial first, so the first row kept for a folder is the most recent one
+    loaded.sort(key=lambda item: item[0], reverse=True)
+    merged = {}
+    sources = {}
+    for finished, partial, rows in loaded:
+        for row in rows:
+            folder = row[0]
+            if folder not in merged:
+                merged[folder] = row
+                sources[folder] = [partial]
+            elif row == merged[folder]:
+                report.duplicates += 1
+            else:
+                sources[folder].append(partial)
+                report.conflicts[folder] = sources[folder]
+
+    sink = main.output_sink(output) if isinstance(output, str) else output
+    try:
+        sink.open(headers)
+        for folder in sorted(merged):
+            sink.write(merged[folder])
+    finally:
+        sink.close()
+    report.rows = len(merged)
+    return report
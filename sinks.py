@@ -0,0 +1,177 @@
+import csv
+import json
+
+# Output sinks for project records. A sink receives the header once and then one
+# list of values per project, so a single scan can stream into several formats
+# without holding the rows in memory.
+
+
+class Sink:
+    def open(self, headers):
+        self.headers = list(headers)
+
+    def write(self, values):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CsvSink(Sink):
+    def __init__(self, path, append=False):
+        self.path = path
+        self.append = append
+        self.file = None
+
+    def open(self, headers):
+        super().open(headers)
+        self.file = open(self.path, 'a' if self.append else 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        if not self.append:
+            self.writer.writerow(self.headers)
+
+    def write(self, values):
+        self.writer.writerow(values)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class JsonlSink(Sink):
+    """One JSON object per project, keyed by column header."""
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.append = append
+        self.file = None
+
+    def open(self, headers):
+        super().open(headers)
+        self.file = open(self.path, 'a' if self.append else 'w', encoding='utf-8')
+
+    def write(self, values):
+        self.file.write(json.dumps(dict(zip(self.headers, values)), ensure_ascii=False) + '\n')
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class XlsxSink(Sink):
+    """Streaming .xlsx writer; xlsxwriter's constant_memory mode flushes each row to disk."""
+
+    def __init__(self, path, sheet_name='Projectes'):
+        try:
+            import xlsxwriter
+        except ImportError:
+            raise ImportError("XlsxSink requires the xlsxwriter package (pip install xlsxwriter)")
+        self.workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        self.sheet = self.workbook.add_worksheet(sheet_name)
+        self.row = 0
+
+    def open(self, headers):
+        super().open(headers)
+        self.sheet.write_row(0, 0, self.headers)
+        self.row = 1
+
+    def write(self, values):
+        self.sheet.write_row(self.row, 0, ['' if value is None else value for value in values])
+        self.row += 1
+
+    def close(self):
+        if self.workbook is not None:
+            self.workbook.close()
+            self.workbook = None
+
+
+class ParquetSink(Sink):
+    """Parquet file written in row groups of batch_size projects, all columns as strings."""
+
+    def __init__(self, path, batch_size=1000):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("ParquetSink requires the pyarrow package (pip install pyarrow)")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.batch_size = batch_size
+        self.batch = []
+        self.writer = None
+
+    def open(self, headers):
+        super().open(headers)
+        self.schema = self.pa.schema([(header, self.pa.string()) for header in self.headers])
+        self.writer = self.pq.ParquetWriter(self.path, self.schema)
+
+    def write(self, values):
+        self.batch.append(values)
+        if len(self.batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self.batch:
+            columns = [[None if row[i] is None else str(row[i]) for row in self.batch] for i in range(len(self.headers))]
+            self.writer.write_table(self.pa.Table.from_arrays(columns, schema=self.schema))
+            self.batch = []
+
+    def close(self):
+        if self.writer is not None:
+            self._flush()
+            self.writer.close()
+            self.writer = None
+
+
+class SummarySink(Sink):
+    """
+    Portfolio summary of the scan (see aggregation.py), written when the scan ends.
+
+    Rows are kept until close(), as the summary needs whole columns; .summary.json gets
+    the JSON summary and .summary.txt the printed one.
+    """
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("SummarySink requires the pyarrow package (pip install pyarrow)")
+        self.path = path
+        self.rows = []
+
+    def write(self, values):
+        self.rows.append(list(values))
+
+    def close(self):
+        if self.rows is None:
+            return
+        import aggregation
+        aggregation.write_summary(aggregation.summarize(self.headers, self.rows), self.path)
+        self.rows = None
+
+
+SINKS = {'.csv': CsvSink, '.jsonl': JsonlSink, '.xlsx': XlsxSink, '.parquet': ParquetSink,
+         '.summary.json': SummarySink, '.summary.txt': SummarySink}
+
+
+def sink_for_path(path, **kwargs):
+    """
+    Pick a sink from the file extension (.csv, .jsonl, .xlsx, .parquet, .summary.json / .summary.txt or a
+    SQLite .sqlite/.db index).
+    """
+    from project_index import ProjectIndex, is_index_path
+    if is_index_path(path):
+        return ProjectIndex(path, **kwargs)
+    for extension, sink_class in SINKS.items():
+        if path.lower().endswith(extension):
+            return sink_class(path, **kwargs)
+    raise ValueError(f"No output format for {path}, expected one of {', '.join(SINKS)}")
@@ -0,0 +1,214 @@
+import hashlib
+import os
+import random
+import subprocess
+import sys
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+# Builds synthetic project roots for tests and benchmarks: N project folders that look
+# like the real ones (README.md in several encodings and layouts, dated SSPT/PSPT and
+# Dictamen_CEI PDFs that are signed, unsigned or encrypted, Data Model workbooks, deep
+# document trees, git and non-git folders), generated deterministically from a seed.
+
+
+def build_pdf(objects, trailer=b'', updates=(), xref_stream=False):
+    """Serialize {number: body} objects (plus incremental updates) into PDF bytes."""
+    out = bytearray(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n' + b'% padding\n' * 512)
+    prev = None
+    size = max(objects) + 1
+    for section in [objects] + list(updates):
+        offsets = {}
+        for number, body in sorted(section.items()):
+            offsets[number] = len(out)
+            out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+        size = max(size, max(section) + 1)
+        extra = trailer + (b' /Prev %d' % prev if prev is not None else b'')
+        start = len(out)
+        if xref_stream:
+            offsets[size] = start
+            rows = b''.join(b'\x01' + offsets[n].to_bytes(4, 'big') + b'\x00\x00' for n in sorted(offsets))
+            index = b' '.join(b'%d 1' % n for n in sorted(offsets))
+            data = zlib.compress(rows)
+            out += (b'%d 0 obj\n<< /Type /XRef /Size %d /W [1 4 2] /Index [%s] /Filter /FlateDecode /Length %d %s >>\n'
+                    b'stream\n' % (size, size + 1, index, len(data), extra)) + data + b'\nendstream\nendobj\n'
+        else:
+            out += b'xref\n0 1\n0000000000 65535 f \n'
+            for number in sorted(offsets):
+                out += b'%d 1\n%010d 00000 n \n' % (number, offsets[number])
+            out += b'trailer\n<< /Size %d %s >>\n' % (size, extra)
+        out += b'startxref\n%d\n%%%%EOF\n' % start
+        prev = start
+    return bytes(out)
+
+
+PAGES = {2: b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+         3: b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 7 0 R >>',
+         7: b'<< /Length 8 >>\nstream\nBT ET \n\nendstream'}
+SIGNATURE = (b'<< /FT /Sig /T (Signatura\\051 1) /V << /Type /Sig /Filter /Adobe.PPKLite /SubFilter /adbe.pkcs7.detached '
+             b'/Name (Pau Peric\\340s) /M (D:20240206120000+01\'00\') /ByteRange [0 10 20 30] /Contents <3082> >> >>')
+_BYTE_RANGE_PLACEHOLDER = b'/ByteRange [0 0000000000 0000000000 0000000000]'
+
+
+def signature_field(signer=b'Pau Peric\\340s', signed_at=b"D:20240206120000+01'00'",
+                    sub_filter=b'adbe.pkcs7.detached', contents_size=128):
+    """A signature field whose /ByteRange and /Contents are placeholders for sign_pdf()."""
+    return (b'<< /FT /Sig /T (Signatura 1) /V << /Type /Sig /Filter /Adobe.PPKLite /SubFilter /%s /Name (%s) '
+            b'/M (%s) %s /Contents <%s> >> >>' % (sub_filter, signer, signed_at, _BYTE_RANGE_PLACEHOLDER,
+                                                 b'0' * contents_size * 2))
+
+
+def sign_pdf(data):
+    """
+    Sign the last placeholder signature_field() over the whole file, like a signing tool would.
+
+    /Contents gets a stub CMS structure holding only the messageDigest attribute (SHA-256 of
+    the signed ranges), which is all the integrity check reads; it is not a real signature.
+    """
+    range_pos = data.rindex(_BYTE_RANGE_PLACEHOLDER)
+    contents_start = data.index(b'/Contents <', range_pos) + len(b'/Contents ')
+    contents_end = data.index(b'>', contents_start) + 1
+    byte_range = b'/ByteRange [0 %010d %010d %010d]' % (contents_start, contents_end, len(data) - contents_end)
+    data = data[:range_pos] + byte_range + data[range_pos + len(byte_range):]
+    digest = hashlib.sha256(data[:contents_start] + data[contents_end:]).digest()
+    attribute = bytes.fromhex('06092a864886f70d010904') + b'\x31\x22\x04\x20' + digest
+    cms = (b'\x30' + bytes([len(attribute)]) + attribute).hex().encode()
+    contents = b'<' + cms.ljust(contents_end - contents_start - 2, b'0') + b'>'
+    return data[:contents_start] + contents + data[contents_end:]
+
+
+# The PDF variants a generated document can take, with the status a scan reports for them
+PDF_VARIANTS = {
+    'unsigned': (build_pdf({1: b'<< /Type /Catalog /Pages 2 0 R >>', **PAGES}, b'/Root 1 0 R'), 'YES'),
+    'signed': (sign_pdf(build_pdf({1: b'<< /Type /Catalog /Pages 2 0 R /AcroForm << /Fields [4 0 R] /SigFlags 3 >> >>',
+                                   **PAGES, 4: signature_field()}, b'/Root 1 0 R')), 'SIGNED'),
+    'encrypted': (build_pdf({1: b'<< /Type /Catalog /Pages 2 0 R /AcroForm << /SigFlags 3 >> >>', **PAGES,
+                             6: b'<< /Filter /Standard /V 1 /R 2 /O <00> /U <00> /P -4 >>'},
+                            b'/Root 1 0 R /Encrypt 6 0 R'), 'YES'),
+}
+
+README_ENCODINGS = ['utf-8', 'utf-8-sig', 'windows-1252']
+
+_GIT_ENV = {'GIT_AUTHOR_NAME': 'Pau', 'GIT_AUTHOR_EMAIL': 'pau@idisba.es', 'GIT_COMMITTER_NAME': 'Pau',
+            'GIT_COMMITTER_EMAIL': 'pau@idisba.es', 'GIT_AUTHOR_DATE': '2024-02-06T10:00:00+01:00',
+            'GIT_COMMITTER_DATE': '2024-02-06T10:00:00+01:00'}
+
+
+def write_readme(repo_path, fields, status=None, encoding='utf-8', newline='\n', title='Projecte'):
+    """Write a README.md in the layout of the real projects from [(label, value)] pairs."""
+    lines = [f'# {title}', '']
+    if status is not None:
+        lines += ['### Status', status, '']
+    lines += ['### Dades del projecte']
+    for label, value in fields:
+        indent = '\t' if label in ('- Nom:', '- Correu:') else ''
+        lines.append(f'{indent}{label} {value}'.rstrip())
+    with open(os.path.join(repo_path, 'README.md'), 'w', encoding=encoding, newline=newline) as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def build_xlsx(path, variables, filled=True):
+    """Write a minimal Data Model workbook: a Variables sheet with one row per variable."""
+    rows = [['Variable', 'Descripció', 'Tipus']]
+    rows += [[f'var_{i}', f'Variable {i}' if filled else '', 'numèric' if filled else ''] for i in range(variables)]
+
+    def cell(column, row, value):
+        return f'<c r="{column}{row}" t="inlineStr"><is><t>{escape(value)}</t></is></c>' if value else ''
+
+    sheet_rows = ''.join(f'<row r="{r}">' + ''.join(cell('ABC'[c], r, v) for c, v in enumerate(values)) + '</row>'
+                         for r, values in enumerate(rows, 1))
+    main_ns = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    rel_ns = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    package_rel_ns = 'http://schemas.openxmlformats.org/package/2006/relationships'
+    parts = {
+        '[Content_Types].xml':
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/></Types>',
+        '_rels/.rels':
+            f'<Relationships xmlns="{package_rel_ns}"><Relationship Id="rId1" Target="xl/workbook.xml" '
+            f'Type="{rel_ns}/officeDocument"/></Relationships>',
+        'xl/workbook.xml':
+            f'<workbook xmlns="{main_ns}" xmlns:r="{rel_ns}"><sheets>'
+            f'<sheet name="Variables" sheetId="1" r:id="rId1"/></sheets></workbook>',
+        'xl/_rels/workbook.xml.rels':
+            f'<Relationships xmlns="{package_rel_ns}"><Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+            f'Type="{rel_ns}/worksheet"/></Relationships>',
+        'xl/worksheets/sheet1.xml': f'<worksheet xmlns="{main_ns}"><sheetData>{sheet_rows}</sheetData></worksheet>',
+    }
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as workbook:
+        for name, xml in parts.items():
+            workbook.writestr(name, '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n' + xml)
+
+
+def _git(repo_path, *args):
+    subprocess.run(['git', '-C', repo_path] + list(args), check=True, capture_output=True,
+                   env=dict(os.environ, **_GIT_ENV))
+
+
+def build_synthetic_root(dir_path, count, seed=0, git_every=2, max_depth=4, filler_files=5):
+    """
+    Create count project folders under dir_path and return their names.
+
+    Every git_every-th folder is a git repository with one commit (0 disables git). Documents
+    are placed up to max_depth directories deep among filler_files unrelated files per folder.
+    The same seed always produces the same root.
+    """
+    rng = random.Random(seed)
+    os.makedirs(dir_path, exist_ok=True)
+    folders = []
+    for i in range(count):
+        codi = f'{22000 + i:05d}'
+        folder = f'PRISIB-{codi}'
+        repo_path = os.path.join(dir_path, folder)
+        os.makedirs(repo_path)
+        folders.append(folder)
+        layout = rng.choice(['standard', 'standard', 'crlf', 'no_status', 'no_codi', 'no_readme'])
+        documents = {}
+        for prefix in ('SSPT', 'PSPT', 'Dictamen_CEI'):
+            variant = rng.choice(['absent', 'unsigned', 'signed', 'encrypted'])
+            if variant == 'absent':
+                continue
+            depth = rng.randint(0, max_depth)
+            directory = os.path.join(repo_path, *[f'nivell{level}' for level in range(depth)])
+            os.makedirs(directory, exist_ok=True)
+            name = f'{prefix}_2024{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}_PRISIB.pdf'
+            if prefix == 'Dictamen_CEI':
+                name = f'Dictamen_CEI_{codi}.pdf'
+            with open(os.path.join(directory, name), 'wb') as f:
+                f.write(PDF_VARIANTS[variant][0])
+            documents[prefix] = name
+        if rng.random() < 0.7:
+            build_xlsx(os.path.join(repo_path, f'Data Model {codi}.xlsx'), rng.randint(1, 40), rng.random() < 0.8)
+        for n in range(filler_files):
+            directory = os.path.join(repo_path, *[f'annex{level}' for level in range(rng.randint(0, max_depth))])
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, f'nota_{n}.txt'), 'w', encoding='utf-8') as f:
+                f.write('Notes del projecte\n' * rng.randint(1, 50))
+        if layout != 'no_readme':
+            fields = [('- Codi:', f'PRISIB {codi}'), ('- Data inici:', f'{rng.randint(1, 28):02d}/01/2023'),
+                      ('- Sol·licitud:', documents.get('SSPT', '')), ('- Pressupost:', documents.get('PSPT', '')),
+                      ('- Data Model:', ''), ('- Dictamen CEIB:', ''), ('- Nom:', f'Investigador{i}'),
+                      ('- Correu:', f'investigador{i}@idisba.es')]
+            if layout == 'no_codi':
+                fields = fields[1:]
+            write_readme(repo_path, fields, None if layout == 'no_status' else rng.choice(['En curs', 'Tancat']),
+                         encoding=rng.choice(README_ENCODINGS), newline='\r\n' if layout == 'crlf' else '\n',
+                         title=f'Projecte {i} - investigació')
+        if git_every and i % git_every == 0:
+            _git(repo_path, 'init', '-q')
+            _git(repo_path, 'add', '-A')
+            _git(repo_path, 'commit', '-q', '-m', f'Projecte {codi}')
+    with open(os.path.join(dir_path, 'llegeix-me.txt'), 'w', encoding='utf-8') as f:
+        f.write('Fitxer solt a l\'arrel, no és un projecte\n')
+    return folders
+
+
+if __name__ == '__main__':
+    # python synthetic_root.py <dir_path> <count> [seed]
+    build_synthetic_root(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]) if len(sys.argv) > 3 else 0)
@@ -0,0 +1,88 @@
+import os
+import threading
+
+# Shared decoding of the text files the scans read (README.md, CSV exports).
+#
+# Files are tried as strict UTF-8 first, which is what new READMEs are written in and
+# which never mistakes a UTF-8 "Sol·licitud" for Windows-1252 mojibake. Only files that
+# are not valid UTF-8 go through chardet, and only over a bounded prefix. The encoding
+# found for a file is memoized per (path, size, mtime), and every file that turned out
+# not to be UTF-8 is remembered so it can be reported and normalised.
+
+# Bytes sampled by chardet when a file is not valid UTF-8
+DETECT_PREFIX = 64 * 1024
+# Tried in order after the detected encoding; ISO-8859-1 decodes any byte string
+FALLBACK_ENCODINGS = ['windows-1252', 'ISO-8859-1']
+MEMO_SIZE = 4096
+
+_memo = {}
+_non_utf8 = {}
+_lock = threading.Lock()
+
+
+def _decode_detected(raw: bytes):
+    # (text, encoding) of the first encoding that decodes raw; each attempt's text is kept
+    try:
+        text = raw.decode('utf-8')
+        if raw.startswith(b'\xef\xbb\xbf'):
+            return text[1:], 'utf-8-sig'
+        return text, 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    import chardet  # imported on first use: most files never need it
+    detected = chardet.detect(raw[:DETECT_PREFIX])['encoding']
+    for encoding in ([detected] if detected else []) + FALLBACK_ENCODINGS:
+        try:
+            return raw.decode(encoding), encoding
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return raw.decode('ISO-8859-1'), 'ISO-8859-1'
+
+
+def detect_encoding(raw: bytes) -> str:
+    """Return the encoding to decode raw with."""
+    return _decode_detected(raw)[1]
+
+
+def decode_bytes(raw: bytes, encoding: str = None):
+    """
+    Decode raw, returning (text, encoding).
+
+    A known encoding (e.g. a memoized one) is tried first and detection runs only if it fails.
+    The text of the attempt that succeeds is returned, so no file is decoded twice.
+    """
+    if encoding is not None:
+        try:
+            return raw.decode(encoding), encoding
+        except (UnicodeDecodeError, LookupError):
+            pass
+    return _decode_detected(raw)
+
+
+def read_text(path: str):
+    """
+    Read and decode a file, returning (text, encoding, raw bytes).
+
+    Raises FileNotFoundError (and other OSErrors) like open().
+    """
+    with open(path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        raw = f.read()
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    text, encoding = decode_bytes(raw, _memo.get(key))
+    with _lock:
+        if key not in _memo:
+            if len(_memo) >= MEMO_SIZE:
+                del _memo[next(iter(_memo))]
+            _memo[key] = encoding
+        if encoding in ('utf-8', 'utf-8-sig'):
+            _non_utf8.pop(key[0], None)
+        else:
+            _non_utf8[key[0]] = encoding
+    return text, encoding, raw
+
+
+def non_utf8_files():
+    """Return sorted (path, encoding) pairs of the files read so far that are not UTF-8."""
+    with _lock:
+        return sorted(_non_utf8.items())
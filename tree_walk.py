@@ -0,0 +1,56 @@
+import fnmatch
+import os
+
+# os.scandir based walk of a project folder. Unlike os.walk it never enters .git, skips
+# directories matching exclude globs (virtualenvs, caches, data dumps, ...) and can stop
+# at a maximum depth, so the tens of thousands of files those hold are never listed.
+# The DirEntry objects are handed out as they are, so callers get file types (and on
+# Windows sizes and mtimes) without another stat call.
+
+# Never entered: git internals can hold more files than the whole project
+ALWAYS_PRUNED = {'.git'}
+# Directory globs skipped unless the caller passes its own exclude list
+DEFAULT_EXCLUDES = ('.venv', 'venv', 'node_modules', '__pycache__', '.ipynb_checkpoints', '.tox', '.mypy_cache',
+                    '.pytest_cache')
+
+
+def _excluded(name, relpath, exclude):
+    # A glob matches the directory name ("venv") or its path inside the repo ("datasets/raw*")
+    return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relpath, pattern) for pattern in exclude)
+
+
+def walk_tree(root: str, exclude=None, max_depth: int = None):
+    """
+    Walk root top-down like os.walk, yielding (dirpath, relpath, dirs, files).
+
+    dirs and files are lists of os.DirEntry sorted by name, so the walk order, and with it
+    the first match of a document rule, does not depend on the file system. Pruned directories (.git, exclude matches,
+    anything below max_depth, symlinks to directories) are left out of dirs. max_depth=0
+    lists root only; None has no limit. Unreadable directories are skipped like os.walk does.
+    """
+    exclude = DEFAULT_EXCLUDES if exclude is None else tuple(exclude)
+    stack = [(root, '', 0)]
+    while stack:
+        dirpath, relpath, depth = stack.pop()
+        try:
+            with os.scandir(dirpath) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        dirs = []
+        files = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                files.append(entry)
+            elif entry.name not in ALWAYS_PRUNED and not _excluded(
+                    entry.name, os.path.join(relpath, entry.name) if relpath else entry.name, exclude):
+                dirs.append(entry)
+        yield dirpath, relpath, dirs, files
+        if max_depth is None or depth < max_depth:
+            for entry in reversed(dirs):
+                if not entry.is_symlink():
+                    stack.append((entry.path, os.path.join(relpath, entry.name) if relpath else entry.name, depth + 1))
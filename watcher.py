@@ -0,0 +1,243 @@
+import os
+import queue
+import tempfile
+import threading
+import time
+import main
+from project_index import ProjectIndex, is_index_path
+from sinks import sink_for_path
+
+# Watch mode: keep an output (CSV, JSONL, ..., or a SQLite project index) current while
+# the project root changes. Filesystem events are mapped to the top-level project folder
+# they happened in, bursts are debounced, and only the affected folders are rescanned.
+#
+# Events come from watchdog (inotify on Linux, FSEvents on macOS, ReadDirectoryChangesW
+# on Windows) when it is installed; otherwise every folder's repo_fingerprint() is polled.
+
+# Changes inside .git that can move the last commit; objects, index and logs are ignored
+_GIT_TRIGGERS = ('HEAD', 'refs', 'packed-refs')
+
+
+def folder_for_event(dir_path: str, path: str):
+    """Return the project folder an event path belongs to, or None if the event is irrelevant."""
+    rel = os.path.relpath(os.path.abspath(path), os.path.abspath(dir_path))
+    if rel == '.' or rel.startswith('..'):
+        return None
+    parts = rel.split(os.sep)
+    if '.git' in parts[1:]:
+        inside = parts[parts.index('.git') + 1:]
+        if not inside or inside[0] not in _GIT_TRIGGERS or inside[-1].endswith('.lock'):
+            return None
+    elif parts[-1].endswith('.tmp') and parts[-1].startswith('.'):
+        # Temporary file of an atomic write; its rename produces the event that matters
+        return None
+    return parts[0]
+
+
+class PollingWatcher:
+    """
+    Reports folders whose repo_fingerprint() changed, checking every interval seconds.
+
+    Every check walks each project tree and stats its files (as the scan cache does), so one
+    check costs about as much as a cached scan of the whole root; the constructor takes the
+    first fingerprints, before the initial scan, so changes made during it are seen. Prefer
+    watchdog events on large roots, or a longer interval. A folder that cannot be read (a file
+    deleted mid-walk, a network share that dropped out) keeps its previous fingerprint.
+    """
+
+    def __init__(self, dir_path, events, interval=2.0):
+        self.dir_path = dir_path
+        self.events = events
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.fingerprints = {}
+        self.fingerprints = self._fingerprints()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _fingerprints(self):
+        try:
+            folders = main.list_project_folders(self.dir_path)
+        except OSError as e:
+            print(f"Could not list {self.dir_path}. Exception: {e}. Keeping the previous fingerprints...")
+            return self.fingerprints
+        fingerprints = {}
+        for folder in folders:
+            try:
+                fingerprints[folder] = main.repo_fingerprint(os.path.join(self.dir_path, folder))
+            except OSError as e:
+                print(f"Could not fingerprint {folder}. Exception: {e}. Keeping the previous fingerprint...")
+                if folder in self.fingerprints:
+                    fingerprints[folder] = self.fingerprints[folder]
+        return fingerprints
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            fingerprints = self._fingerprints()
+            for folder in set(fingerprints) | set(self.fingerprints):
+                if fingerprints.get(folder) != self.fingerprints.get(folder):
+                    self.events.put(folder)
+            self.fingerprints = fingerprints
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+class EventWatcher:
+    """Reports the folders touched by watchdog filesystem events."""
+
+    def __init__(self, dir_path, events):
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.event_type in ('opened', 'closed_no_write'):
+                    return
+                for path in (event.src_path, getattr(event, 'dest_path', '')):
+                    folder = folder_for_event(watcher.dir_path, os.fsdecode(path)) if path else None
+                    if folder is not None:
+                        watcher.events.put(folder)
+
+        self.dir_path = dir_path
+        self.events = events
+        self.observer = Observer()
+        self.observer.schedule(Handler(), dir_path, recursive=True)
+
+    def start(self):
+        self.observer.start()
+
+    def stop(self):
+        self.observer.stop()
+        self.observer.join()
+
+
+class LiveOutput:
+    """
+    An output kept in sync with a dict of rows by folder.
+
+    A project index is updated in place, one upsert or delete per changed folder. Other
+    formats cannot be patched, so they are rewritten from the rows into a temporary file
+    that replaces the output. Given root, a rename (the old folder gone, a new one with its
+    Codi created) moves the index row instead of replacing it.
+    """
+
+    def __init__(self, path, headers, root=None):
+        self.path = path
+        self.headers = headers
+        self.root = root
+        self.rows = {}
+
+    def replace_all(self, rows):
+        self.rows = dict(rows)
+        if is_index_path(self.path):
+            self._upsert(self.rows)
+            with ProjectIndex(self.path) as index:
+                index.delete([folder for folder in index.folders() if folder not in self.rows])
+        else:
+            self._rewrite()
+
+    def update(self, changes):
+        """Apply {folder: row, or None for a folder that is gone}."""
+        for folder, row in changes.items():
+            if row is None:
+                self.rows.pop(folder, None)
+            else:
+                self.rows[folder] = row
+        if is_index_path(self.path):
+            self._upsert({folder: row for folder, row in changes.items() if row is not None})
+            with ProjectIndex(self.path) as index:
+                index.delete([folder for folder, row in changes.items() if row is None])
+        else:
+            self._rewrite()
+
+    def _upsert(self, rows):
+        with main.output_sink(self.path, self.root) as index:
+            index.open(self.headers)
+            for folder in sorted(rows):
+                index.write(rows[folder])
+
+    def _rewrite(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        extension = os.path.splitext(self.path)[1]
+        fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(self.path) + '.', suffix=extension,
+                                        dir=directory)
+        os.close(fd)
+        try:
+            with sink_for_path(tmp_path) as sink:
+                sink.open(self.headers)
+                for folder in sorted(self.rows):
+                    sink.write(self.rows[folder])
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def watch(dir_path: str, output: str, pdf_prefixes: list = None, write_to_readme: bool = False,
+          branches: list = None, debounce: float = 1.0, interval: float = 2.0, polling: bool = False,
+          stop: threading.Event = None, on_update=None):
+    """
+    Scan dir_path into output once, then keep output current until stop is set (or Ctrl+C).
+
+    Args:
+        dir_path (str): The root directory holding the project folders.
+        output (str): Output path; the extension picks the format as in export_project_records().
+        debounce (float): Seconds without new events before the touched folders are rescanned.
+        interval (float): Seconds between checks of the polling watcher.
+        polling (bool): Poll even when watchdog is installed (e.g. on network shares).
+        stop (threading.Event): Ends the watch when set.
+        on_update (callable): Called with the set of rescanned folders after each update.
+    """
+    if pdf_prefixes is None:
+        pdf_prefixes = main.DEFAULT_PDF_PREFIXES
+    stop = stop or threading.Event()
+    events = queue.Queue()
+    watcher = None
+    if not polling:
+        try:
+            watcher = EventWatcher(dir_path, events)
+        except ImportError:
+            print("watchdog is not installed, polling for changes instead (pip install watchdog)")
+    if watcher is None:
+        watcher = PollingWatcher(dir_path, events, interval)
+    # Subscribe before the initial scan so changes made during it are not lost
+    watcher.start()
+    live = LiveOutput(output, main.record_headers(pdf_prefixes), dir_path)
+    try:
+        live.replace_all({record.folder: record.to_row(pdf_prefixes) for record in
+                          main.iter_project_records(dir_path, pdf_prefixes, write_to_readme=write_to_readme,
+                                                    branches=branches)})
+        pending = set()
+        last_event = 0.0
+        while not stop.is_set():
+            try:
+                folder = events.get(timeout=min(debounce, 0.5))
+            except queue.Empty:
+                folder = None
+            if folder is not None:
+                # Top-level files (including output itself) are neither projects nor rows
+                if folder in live.rows or os.path.isdir(os.path.join(dir_path, folder)):
+                    pending.add(folder)
+                    last_event = time.monotonic()
+                continue
+            if pending and time.monotonic() - last_event >= debounce:
+                changes = {}
+                for folder in sorted(pending):
+                    record = main.scan_folder(dir_path, folder, pdf_prefixes, write_to_readme, branches)
+                    changes[folder] = record.to_row(pdf_prefixes) if record is not None else None
+                live.update(changes)
+                print(f"Rescanned {', '.join(sorted(pending))}")
+                if on_update is not None:
+                    on_update(set(pending))
+                pending = set()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()